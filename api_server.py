@@ -0,0 +1,593 @@
+# -*- coding: utf-8 -*-
+# Headless HTTP/WebSocket API
+"""
+Asyncio API server sharing one set of models across all clients
+
+Run from the project root:
+    python api_server.py [--host 0.0.0.0] [--port 8600]
+
+Endpoints:
+    GET  /health                 Component status
+    POST /sessions               Create a session            -> {"session_id"}
+    POST /chat                   {"text", "session_id"?, "audio_path"?} -> {"session_id", "response"}
+    GET  /ws/chat                WebSocket, streams tokens (see handle_chat_socket)
+    POST /transcribe             Audio file body (wav/flac/ogg/mp3; webm/m4a with ffmpeg)
+                                 -> {"text", "segments", "audio_path"}; ?stream=1 for NDJSON segments
+    GET  /audio/{audio_path}     Stored turn audio (FLAC/Opus, Range requests supported)
+    POST /tts                    {"text"} -> streamed audio/wav, one sentence at a time
+    POST /tts/streams            {"text", "format"?, "session_id"?} -> {"stream_id", "url"} (shared stream)
+    GET  /tts/streams/{id}       Chunked Ogg Opus or WAV; any number of listeners
+
+With TTS_PLAYBACK=browser, /chat and the WebSocket "done" message also
+carry an "audio_url" for the reply's stream. Spoken replies are kept in
+the audio store and linked to their turn (metadata "reply_audio_path").
+"""
+import argparse
+import asyncio
+import contextlib
+import json
+import os
+import sys
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, List, Optional, Tuple
+
+os.environ['PYTHONIOENCODING'] = 'utf-8'
+
+# Add components to path
+sys.path.append(os.path.join(os.path.dirname(__file__), 'components'))
+
+from aiohttp import web, WSMsgType
+
+from speech_to_text import SpeechToText
+from llm_handler import LLMHandler
+from text_to_speach import TextToSpeech, split_sentences
+from memory_manager import MemoryManager
+from long_term_memory import get_long_term_memory
+from inference_scheduler import SchedulerBusy, get_scheduler
+from quality_monitor import quality_stats
+from audio_buffers import allocation_stats
+from audio_decode import WHISPER_RATE, AudioDecodeError, ClipKeeper
+from audio_stream import (CONTENT_TYPES, AudioStream, get_audio_stream_hub, start_speech_stream,
+                          to_pcm16, wav_stream_header)
+from load_controller import get_load_controller
+from audio_store import get_audio_store
+from profiler import get_profiler
+from config import Config
+
+
+class BotServices:
+    """Model instances shared by every client of this process"""
+
+    def __init__(self):
+        """Load all components once"""
+        self.memory = MemoryManager()
+        self.llm = LLMHandler()
+        if not self.llm.ensure_model_ready():
+            print("⚠️ Language model not ready (pulling in the background if Ollama is up); "
+                  "/chat will return errors until it is available")
+        # With the scheduler, models live in worker process pools
+        self.stt = SpeechToText(get_scheduler('stt'))
+        self.tts = TextToSpeech(get_scheduler('tts'))
+        self.long_term_memory = get_long_term_memory()
+        self.audio_store = get_audio_store()
+
+        # In-process Whisper and Coqui models are not safe to call from several
+        # threads; the scheduler does its own queueing
+        self.stt_lock = contextlib.nullcontext() if self.stt.scheduler else threading.Lock()
+        self.tts_lock = contextlib.nullcontext() if self.tts.scheduler else threading.Lock()
+        self.executor = ThreadPoolExecutor(max_workers=Config.API_WORKER_THREADS,
+                                           thread_name_prefix="api-worker")
+
+    async def run(self, func: Callable, *args):
+        """Run a blocking call on the worker pool"""
+        return await asyncio.get_running_loop().run_in_executor(self.executor, func, *args)
+
+    def chat(self, session_id: str, text: str, on_token: Callable[[str], None] = None,
+             audio_path: str = None, on_reset: Callable[[], None] = None) -> str:
+        """
+        Generate, persist and return a reply (blocking)
+
+        Args:
+            session_id: Session identifier
+            text: User input
+            on_token: Streaming callback (optional)
+            audio_path: Audio store path of the spoken input (from /transcribe)
+            on_reset: Called when the streamed chunks so far are discarded (optional)
+
+        Returns:
+            Cleaned bot response
+        """
+        history = self.memory.get_conversation_history(session_id)
+        long_term_context = None
+        if self.long_term_memory:
+            long_term_context = self.long_term_memory.retrieve(text, exclude_session=session_id)
+
+        response = self.llm.generate_response(text, history, long_term_context,
+                                              on_token=on_token, on_reset=on_reset,
+                                              session_id=session_id)
+        if response:
+            if audio_path and not (self.audio_store and self.audio_store.contains(audio_path)):
+                audio_path = None  # Only paths this store handed out
+            self.memory.save_conversation(session_id, text, response, audio_file_path=audio_path)
+            if self.long_term_memory:
+                self.long_term_memory.schedule()
+        return response
+
+    def transcribe(self, path: str,
+                   on_segment: Callable[[dict], None] = None) -> Tuple[str, List[dict], Optional[str]]:
+        """
+        Decode and transcribe an uploaded audio file chunk by chunk (blocking)
+
+        Args:
+            path: Spooled upload
+            on_segment: Called with each segment as soon as its chunk is transcribed
+
+        Returns:
+            Tuple (text, segments, audio store path of the upload or None)
+        """
+        keeper = ClipKeeper() if self.audio_store else None
+        segments = []
+        with self.stt_lock:
+            for segment in self.stt.transcribe_stream(path, on_chunk=keeper):
+                segments.append(segment)
+                if on_segment:
+                    on_segment(segment)
+        audio_path = None
+        if keeper and keeper.samples() is not None:
+            audio_path = self.audio_store.submit_recording(keeper.samples(), WHISPER_RATE)
+        return " ".join(segment['text'] for segment in segments).strip(), segments, audio_path
+
+    def synthesize(self, sentence: str):
+        """Synthesize one sentence (blocking)"""
+        with self.tts_lock:
+            return self.tts.synthesize(sentence)
+
+    def speak(self, text: str, fmt: str = None, session_id: str = None) -> Optional[AudioStream]:
+        """
+        Start streaming a reply's speech for browser playback
+
+        Args:
+            text: Reply text
+            fmt: Stream format (defaults to Config.TTS_STREAM_FORMAT)
+            session_id: Session whose latest turn gets the stored audio (optional)
+
+        Returns:
+            Stream being filled in the background, or None when speech is
+            unavailable or paused by the load controller
+        """
+        if not text or not self.tts or not self.tts.is_available():
+            return None
+        if not get_load_controller().current()['tts']:
+            return None
+        on_finished = None
+        if self.audio_store:
+            def on_finished(samples, sample_rate):
+                path = self.audio_store.submit_reply(text, samples, sample_rate)
+                if path and session_id:
+                    self.memory.set_reply_audio(session_id, text, path)
+        return start_speech_stream(text, self.synthesize, fmt, on_finished)
+
+
+def _services(request: web.Request) -> BotServices:
+    return request.app['services']
+
+
+async def handle_health(request: web.Request) -> web.Response:
+    services = _services(request)
+    pull = services.llm.pull_status()
+    llm_ready = await services.run(services.llm.check_model_availability)
+    return web.json_response({
+        'status': 'ok',
+        'llm_model': services.llm.model,
+        'llm_ready': llm_ready,
+        'model_pull': pull.as_dict() if pull else None,
+        'stt_available': bool(services.stt and services.stt.available),
+        'tts_available': bool(services.tts and services.tts.is_available()),
+        'tts_frontend': services.tts.frontend_stats() if services.tts else None,
+        'ollama_backends': services.llm.pool.stats(),
+        'routing': services.llm.router.stats(),
+        'quality': quality_stats(),
+        'audio_allocations': allocation_stats(),
+        'turn_cache': services.memory.turns.stats(),
+        'load': get_load_controller().status(),
+        'audio_streams': get_audio_stream_hub().stats(),
+        'audio_store': services.audio_store.stats() if services.audio_store else None,
+        'resources': get_profiler().resources() if Config.PROFILING_ENABLED else None,
+    })
+
+
+def _check_body(body: object) -> str:
+    """
+    Validate a JSON request body: an object whose fields are strings
+
+    Returns:
+        The stripped 'text' (may be empty)
+
+    Raises:
+        ValueError: With a message for the client
+    """
+    if not isinstance(body, dict):
+        raise ValueError("Expected a JSON object")
+    for field in ('text', 'session_id', 'audio_path', 'format', 'type'):
+        if body.get(field) is not None and not isinstance(body[field], str):
+            raise ValueError(f"'{field}' must be a string")
+    return (body.get('text') or '').strip()
+
+
+async def _read_body(request: web.Request) -> Tuple[dict, str]:
+    """
+    Parse and validate a JSON request body (see _check_body)
+
+    Returns:
+        Tuple (body, stripped text)
+
+    Raises:
+        web.HTTPBadRequest: If the body is not JSON or fails validation
+    """
+    try:
+        body = await request.json()
+    except json.JSONDecodeError:
+        raise web.HTTPBadRequest(text="Expected a JSON body")
+    try:
+        return body, _check_body(body)
+    except ValueError as e:
+        raise web.HTTPBadRequest(text=str(e))
+
+
+def _audio_url(services: BotServices, response: str, session_id: str = None) -> dict:
+    """{"audio_url": ...} for a reply in browser playback mode, else {}"""
+    if Config.TTS_PLAYBACK != 'browser':
+        return {}
+    stream = services.speak(response, session_id=session_id)
+    return {'audio_url': f"/tts/streams/{stream.stream_id}"} if stream else {}
+
+
+async def handle_create_session(request: web.Request) -> web.Response:
+    services = _services(request)
+    session_id = await services.run(services.memory.create_session)
+    return web.json_response({'session_id': session_id})
+
+
+async def handle_chat(request: web.Request) -> web.Response:
+    services = _services(request)
+    body, text = await _read_body(request)
+    if not text:
+        raise web.HTTPBadRequest(text="'text' is required")
+
+    session_id = body.get('session_id')
+    if session_id:
+        # Turns of an unknown session would have no session row
+        if not await services.run(services.memory.session_exists, session_id):
+            raise web.HTTPNotFound(text=f"Unknown session: {session_id}")
+    else:
+        session_id = await services.run(services.memory.create_session)
+    response = await services.run(services.chat, session_id, text, None, body.get('audio_path'))
+    return web.json_response({'session_id': session_id, 'response': response,
+                              **_audio_url(services, response, session_id)})
+
+
+async def handle_chat_socket(request: web.Request) -> web.WebSocketResponse:
+    """
+    Streamed chat over WebSocket
+
+    Client sends:  {"type": "chat", "text": "...", "session_id": "..."?}
+    Server sends:  {"type": "session", "session_id"} for a new session,
+                   {"type": "token", "text"} per chunk,
+                   {"type": "reset"} when the tokens so far are discarded (the reply
+                   was escalated or retried; the new attempt's tokens follow),
+                   {"type": "done", "session_id", "text", "audio_url"?} with the cleaned reply,
+                   {"type": "error", "message"} on bad input
+    """
+    services = _services(request)
+    ws = web.WebSocketResponse(heartbeat=30)
+    await ws.prepare(request)
+    loop = asyncio.get_running_loop()
+    session_id = None
+
+    async for message in ws:
+        if message.type != WSMsgType.TEXT:
+            continue
+        try:
+            payload = json.loads(message.data)
+        except json.JSONDecodeError:
+            await ws.send_json({'type': 'error', 'message': 'invalid JSON'})
+            continue
+        try:
+            text = _check_body(payload)
+        except ValueError as e:
+            await ws.send_json({'type': 'error', 'message': str(e)})
+            continue
+
+        if payload.get('type') != 'chat' or not text:
+            await ws.send_json({'type': 'error', 'message': "expected {'type': 'chat', 'text': ...}"})
+            continue
+
+        if payload.get('session_id'):
+            if not await services.run(services.memory.session_exists, payload['session_id']):
+                await ws.send_json({'type': 'error', 'message': f"unknown session: {payload['session_id']}"})
+                continue
+            session_id = payload['session_id']
+        elif session_id is None:
+            session_id = await services.run(services.memory.create_session)
+            await ws.send_json({'type': 'session', 'session_id': session_id})
+
+        # Tokens arrive on a worker thread; hand them to the event loop
+        events = asyncio.Queue()
+
+        def on_token(chunk: str):
+            loop.call_soon_threadsafe(events.put_nowait, {'type': 'token', 'text': chunk})
+
+        def on_reset():
+            loop.call_soon_threadsafe(events.put_nowait, {'type': 'reset'})
+
+        generation = asyncio.ensure_future(services.run(services.chat, session_id, text, on_token,
+                                                        None, on_reset))
+        generation.add_done_callback(lambda _: loop.call_soon_threadsafe(events.put_nowait, None))
+
+        while True:
+            event = await events.get()
+            if event is None:
+                break
+            await ws.send_json(event)
+
+        response = await generation
+        await ws.send_json({'type': 'done', 'session_id': session_id, 'text': response,
+                            **_audio_url(services, response, session_id)})
+
+    return ws
+
+
+async def _spool_upload(request: web.Request) -> str:
+    """
+    Write the request's audio to a temporary file as it arrives
+
+    Returns:
+        Path of the file (the caller removes it)
+    """
+    if request.content_type.startswith('multipart/'):
+        reader = await request.multipart()
+        part = await reader.next()
+        read_chunk = part.read_chunk if part else None
+    else:
+        read_chunk = request.content.readany
+
+    limit = Config.API_MAX_UPLOAD_MB * 1024 * 1024
+    size = 0
+    # Closed before decoding, so ffmpeg/libsndfile can reopen it on every platform
+    spool = tempfile.NamedTemporaryFile(prefix="upload-", delete=False)
+    try:
+        with spool:
+            while read_chunk:
+                chunk = await read_chunk()
+                if not chunk:
+                    break
+                size += len(chunk)
+                if size > limit:
+                    raise web.HTTPRequestEntityTooLarge(max_size=limit, actual_size=size)
+                spool.write(chunk)
+        if not size:
+            raise web.HTTPBadRequest(text="Empty audio upload")
+        return spool.name
+    except BaseException:
+        os.unlink(spool.name)
+        raise
+
+
+async def handle_transcribe(request: web.Request) -> web.StreamResponse:
+    """
+    Transcribe an uploaded file or browser recording
+
+    The body is spooled to disk, then decoded and transcribed in chunks.
+    With ?stream=1 the reply is NDJSON: {"type": "segment", "start", "end",
+    "text"} per segment as each chunk is done, then {"type": "done", "text",
+    "audio_path"} (or {"type": "error", "message"}).
+    """
+    services = _services(request)
+    if not services.stt or not services.stt.available:
+        raise web.HTTPServiceUnavailable(text="Speech-to-text not available")
+
+    path = await _spool_upload(request)
+    try:
+        if request.query.get('stream') != '1':
+            try:
+                text, segments, audio_path = await services.run(services.transcribe, path)
+            except SchedulerBusy:
+                raise web.HTTPServiceUnavailable(text="Speech-to-text busy, retry later",
+                                                 headers={'Retry-After': '2'})
+            except AudioDecodeError as e:
+                raise web.HTTPBadRequest(text=f"Could not decode audio: {e}")
+            except Exception as e:
+                raise web.HTTPInternalServerError(text=f"Transcription failed: {e}")
+            return web.json_response({'text': text, 'segments': segments, 'audio_path': audio_path})
+
+        # Segments arrive on a worker thread; hand them to the event loop
+        loop = asyncio.get_running_loop()
+        segments = asyncio.Queue()
+
+        def on_segment(segment: dict):
+            loop.call_soon_threadsafe(segments.put_nowait, segment)
+
+        transcription = asyncio.ensure_future(services.run(services.transcribe, path, on_segment))
+        transcription.add_done_callback(lambda _: loop.call_soon_threadsafe(segments.put_nowait, None))
+
+        response = web.StreamResponse(headers={'Content-Type': 'application/x-ndjson',
+                                               'Cache-Control': 'no-store'})
+        response.enable_chunked_encoding()
+        await response.prepare(request)
+        while True:
+            segment = await segments.get()
+            if segment is None:
+                break
+            await response.write((json.dumps({'type': 'segment', **segment}, ensure_ascii=False) + "\n").encode())
+
+        try:
+            text, _, audio_path = await transcription
+            final = {'type': 'done', 'text': text, 'audio_path': audio_path}
+        except SchedulerBusy:
+            final = {'type': 'error', 'message': "Speech-to-text busy, retry later"}
+        except AudioDecodeError as e:
+            final = {'type': 'error', 'message': f"Could not decode audio: {e}"}
+        except Exception as e:
+            final = {'type': 'error', 'message': f"Transcription failed: {e}"}
+        await response.write((json.dumps(final, ensure_ascii=False) + "\n").encode())
+        await response.write_eof()
+        return response
+    finally:
+        os.unlink(path)
+
+
+async def handle_audio(request: web.Request) -> web.FileResponse:
+    """Stored turn audio; Range requests are served for seeking during replay"""
+    services = _services(request)
+    path = services.audio_store.resolve(request.match_info['path']) if services.audio_store else None
+    if path is None:
+        raise web.HTTPNotFound(text="Unknown audio, or still being encoded")
+    content_type = 'audio/flac' if path.endswith('.flac') else 'audio/ogg'
+    return web.FileResponse(path, headers={'Content-Type': content_type,
+                                           'Cache-Control': 'public, max-age=31536000, immutable'})
+
+
+async def handle_tts(request: web.Request) -> web.StreamResponse:
+    services = _services(request)
+    if not services.tts or not services.tts.is_available():
+        raise web.HTTPServiceUnavailable(text="Text-to-speech not available")
+    if not get_load_controller().current()['tts']:
+        raise web.HTTPServiceUnavailable(text="Text-to-speech paused under load (text-only tier)",
+                                         headers={'Retry-After': str(Config.LOAD_RECOVER_SECONDS)})
+
+    _, text = await _read_body(request)
+    sentences = split_sentences(text)
+    if not sentences:
+        raise web.HTTPBadRequest(text="'text' is required")
+
+    response = web.StreamResponse(headers={'Content-Type': 'audio/wav'})
+    response.enable_chunked_encoding()
+
+    # Synthesize sentence by sentence so playback starts after the first one
+    header_sent = False
+    for sentence in sentences:
+        try:
+            result = await services.run(services.synthesize, sentence)
+        except SchedulerBusy:
+            if header_sent:
+                break
+            raise web.HTTPServiceUnavailable(text="Text-to-speech busy, retry later", headers={'Retry-After': '2'})
+        if result is None:
+            continue
+        samples, sample_rate = result
+        if not header_sent:
+            await response.prepare(request)
+            await response.write(wav_stream_header(sample_rate))
+            header_sent = True
+        await response.write(to_pcm16(samples))
+
+    if not header_sent:
+        raise web.HTTPInternalServerError(text="Synthesis failed")
+    await response.write_eof()
+    return response
+
+
+async def handle_create_stream(request: web.Request) -> web.Response:
+    services = _services(request)
+    if not services.tts or not services.tts.is_available():
+        raise web.HTTPServiceUnavailable(text="Text-to-speech not available")
+    body, text = await _read_body(request)
+    fmt = body.get('format') or Config.TTS_STREAM_FORMAT
+    if not text:
+        raise web.HTTPBadRequest(text="'text' is required")
+    if fmt not in CONTENT_TYPES:
+        raise web.HTTPBadRequest(text=f"'format' must be one of {sorted(CONTENT_TYPES)}")
+
+    stream = services.speak(text, fmt, body.get('session_id'))
+    if stream is None:
+        raise web.HTTPServiceUnavailable(text="Text-to-speech paused under load (text-only tier)",
+                                         headers={'Retry-After': str(Config.LOAD_RECOVER_SECONDS)})
+    return web.json_response({'stream_id': stream.stream_id, 'format': stream.format,
+                              'url': f"/tts/streams/{stream.stream_id}"})
+
+
+async def handle_stream_audio(request: web.Request) -> web.StreamResponse:
+    """
+    Play a speech stream (usable directly as an <audio> src)
+
+    Every listener gets the stream header, then chunks as they are
+    encoded; the encoded bytes are shared, not re-encoded per listener.
+    """
+    stream = get_audio_stream_hub().get(request.match_info['stream_id'])
+    if stream is None:
+        raise web.HTTPNotFound(text="Unknown or expired stream")
+
+    loop = asyncio.get_running_loop()
+    ready = asyncio.Event()
+
+    def notify():
+        loop.call_soon_threadsafe(ready.set)
+
+    stream.add_listener(notify)
+    try:
+        # Wait for the first sentence so synthesis errors can still be reported
+        while not stream.header and not stream.closed:
+            await ready.wait()
+            ready.clear()
+        if not stream.header:
+            raise web.HTTPInternalServerError(text=stream.error or "Synthesis failed")
+
+        response = web.StreamResponse(headers={'Content-Type': stream.content_type,
+                                               'Cache-Control': 'no-store'})
+        response.enable_chunked_encoding()
+        await response.prepare(request)
+        await response.write(stream.header)
+
+        cursor = 0
+        while True:
+            ready.clear()
+            chunks, cursor, finished = stream.read(cursor)
+            for chunk in chunks:
+                await response.write(chunk)
+            if finished:
+                break
+            if not chunks:
+                await ready.wait()
+        await response.write_eof()
+        return response
+    finally:
+        stream.remove_listener(notify)
+
+
+def create_app(services: BotServices = None) -> web.Application:
+    """
+    Build the aiohttp application
+
+    Args:
+        services: Shared components (created if not given)
+
+    Returns:
+        Configured application
+    """
+    app = web.Application(client_max_size=Config.API_MAX_UPLOAD_MB * 1024 * 1024)
+    app['services'] = services or BotServices()
+    app.router.add_get('/health', handle_health)
+    app.router.add_post('/sessions', handle_create_session)
+    app.router.add_post('/chat', handle_chat)
+    app.router.add_get('/ws/chat', handle_chat_socket)
+    app.router.add_post('/transcribe', handle_transcribe)
+    app.router.add_post('/tts', handle_tts)
+    app.router.add_post('/tts/streams', handle_create_stream)
+    app.router.add_get('/tts/streams/{stream_id}', handle_stream_audio)
+    app.router.add_get('/audio/{path:.+}', handle_audio)
+    return app
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Super Kamen Bot API server")
+    parser.add_argument("--host", default=Config.API_HOST)
+    parser.add_argument("--port", type=int, default=Config.API_PORT)
+    args = parser.parse_args()
+
+    web.run_app(create_app(), host=args.host, port=args.port)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,219 @@
+# Audio buffers
+# Preallocated per-session ring buffers for capture, reused across sessions
+import atexit
+import threading
+from multiprocessing.shared_memory import SharedMemory
+from typing import Dict, Optional, Tuple
+
+import numpy as np
+
+from config import Config
+
+_alloc_stats = {'buffers_allocated': 0, 'buffer_bytes': 0, 'buffers_reused': 0,
+                'acquisitions': 0, 'copies': 0, 'copy_bytes': 0}
+_alloc_lock = threading.Lock()
+
+
+def count_copy(nbytes: int):
+    """Record a large temporary array made while handling audio"""
+    with _alloc_lock:
+        _alloc_stats['copies'] += 1
+        _alloc_stats['copy_bytes'] += nbytes
+
+
+def allocation_stats() -> Dict[str, int]:
+    """
+    Process-wide audio allocation counters
+
+    Returns:
+        Dictionary with buffers_allocated, buffer_bytes, buffers_reused,
+        acquisitions, copies and copy_bytes
+    """
+    with _alloc_lock:
+        return dict(_alloc_stats)
+
+
+class AudioRingBuffer:
+    """
+    Fixed-capacity float32 sample buffer
+
+    Capture restarts at offset 0 on reset(), so a turn that fits the
+    capacity is one contiguous region and view() returns a slice of the
+    buffer itself. Longer captures wrap, keeping the most recent audio.
+
+    With shared=True the samples live in a shared-memory segment, which
+    the inference scheduler's workers read in place.
+    """
+
+    def __init__(self, capacity: int, shared: bool = False):
+        """
+        Args:
+            capacity: Samples held
+            shared: Back the buffer with multiprocessing shared memory
+        """
+        self.capacity = capacity
+        self.shm: Optional[SharedMemory] = None
+        if shared:
+            self.shm = SharedMemory(create=True, size=capacity * 4)
+            self.samples = np.ndarray((capacity,), dtype=np.float32, buffer=self.shm.buf)
+        else:
+            self.samples = np.empty(capacity, dtype=np.float32)
+        self.lock = threading.Lock()
+        self.position = 0   # Next write index
+        self.filled = 0     # Valid samples (at most capacity)
+
+        with _alloc_lock:
+            _alloc_stats['buffers_allocated'] += 1
+            _alloc_stats['buffer_bytes'] += capacity * 4
+
+    @property
+    def shared_name(self) -> Optional[str]:
+        return self.shm.name if self.shm else None
+
+    @property
+    def wrapped(self) -> bool:
+        return self.filled == self.capacity and self.position != 0
+
+    def reset(self):
+        with self.lock:
+            self.position = 0
+            self.filled = 0
+
+    def write(self, chunk: np.ndarray) -> int:
+        """
+        Append samples (called from the audio callback thread)
+
+        Args:
+            chunk: 1-D samples; only the last `capacity` are kept if larger
+
+        Returns:
+            Samples written
+        """
+        with self.lock:
+            count = len(chunk)
+            if count > self.capacity:
+                chunk = chunk[-self.capacity:]
+                count = self.capacity
+            first = min(count, self.capacity - self.position)
+            self.samples[self.position:self.position + first] = chunk[:first]
+            if first < count:
+                self.samples[:count - first] = chunk[first:]
+            self.position = (self.position + count) % self.capacity
+            self.filled = min(self.filled + count, self.capacity)
+            return count
+
+    def frames(self, count: int) -> np.ndarray:
+        """
+        Writable (count, 1) view from offset 0, for sd.rec(out=...)
+
+        Marks the region as filled; capture into it replaces any content.
+        """
+        count = min(count, self.capacity)
+        with self.lock:
+            self.position = count % self.capacity
+            self.filled = count
+        return self.samples[:count].reshape(count, 1)
+
+    def view(self) -> np.ndarray:
+        """
+        Captured samples, oldest first, without copying
+
+        A wrapped buffer is first rotated in place (counted as a copy).
+        """
+        with self.lock:
+            if self.wrapped:
+                count_copy(self.capacity * 4)
+                self.samples[:] = np.roll(self.samples, -self.position)
+                self.position = 0
+            return self.samples[:self.filled]
+
+    def shared_ref(self) -> Optional[Tuple[str, int]]:
+        """
+        Shared-memory reference to view()
+
+        Returns:
+            Tuple (segment name, sample count), or None if not shared
+        """
+        if self.shm is None:
+            return None
+        return self.shm.name, len(self.view())
+
+    def close(self):
+        if self.shm is not None:
+            self.samples = None
+            self.shm.close()
+            self.shm.unlink()
+            self.shm = None
+
+
+class AudioBufferPool:
+    """Hands out ring buffers per session and recycles released ones"""
+
+    def __init__(self, seconds: float = None, max_buffers: int = None, shared: bool = None):
+        """
+        Args:
+            seconds: Capacity of each buffer (defaults to Config.AUDIO_BUFFER_SECONDS)
+            max_buffers: Buffers kept for reuse (defaults to Config.AUDIO_BUFFER_MAX)
+            shared: Use shared memory (defaults to Config.INFERENCE_SCHEDULER_ENABLED)
+        """
+        seconds = seconds or Config.AUDIO_BUFFER_SECONDS
+        self.capacity = int(seconds * Config.SAMPLE_RATE)
+        self.max_buffers = max_buffers or Config.AUDIO_BUFFER_MAX
+        self.shared = Config.INFERENCE_SCHEDULER_ENABLED if shared is None else shared
+        self._in_use: Dict[str, AudioRingBuffer] = {}
+        self._free = []
+        self._lock = threading.Lock()
+
+    def acquire(self, session_key: str) -> AudioRingBuffer:
+        """
+        Get the buffer for a session, reusing a released one when possible
+
+        The session keeps the same buffer until release(); it is reset for
+        each capture by the caller.
+        """
+        with self._lock:
+            with _alloc_lock:
+                _alloc_stats['acquisitions'] += 1
+            buffer = self._in_use.get(session_key)
+            if buffer is None:
+                if self._free:
+                    buffer = self._free.pop()
+                    with _alloc_lock:
+                        _alloc_stats['buffers_reused'] += 1
+                else:
+                    buffer = AudioRingBuffer(self.capacity, self.shared)
+                self._in_use[session_key] = buffer
+            return buffer
+
+    def release(self, session_key: str):
+        """Return a session's buffer; buffers beyond max_buffers are freed"""
+        with self._lock:
+            buffer = self._in_use.pop(session_key, None)
+            if buffer is None:
+                return
+            if len(self._in_use) + len(self._free) < self.max_buffers:
+                self._free.append(buffer)
+            else:
+                buffer.close()
+
+    def close(self):
+        with self._lock:
+            for buffer in list(self._in_use.values()) + self._free:
+                buffer.close()
+            self._in_use.clear()
+            self._free.clear()
+
+
+_pool: Optional[AudioBufferPool] = None
+_pool_lock = threading.Lock()
+
+
+def get_audio_buffer_pool() -> AudioBufferPool:
+    """Get the process-wide buffer pool"""
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = AudioBufferPool()
+            # Shared-memory segments outlive the process unless unlinked
+            atexit.register(_pool.close)
+        return _pool
@@ -0,0 +1,299 @@
+# Audio decoding
+# Uploaded audio decoded block by block and resampled to 16 kHz mono float32
+import os
+import shutil
+import subprocess
+import threading
+from collections import deque
+from typing import BinaryIO, Iterable, Iterator, List, Optional, Tuple, Union
+
+import numpy as np
+
+try:
+    import soundfile as sf
+except ImportError:
+    sf = None
+
+from config import Config
+
+# Whisper's input rate
+WHISPER_RATE = 16000
+
+# Path or binary file object (e.g. a Streamlit UploadedFile)
+AudioSource = Union[str, BinaryIO]
+
+PIPE_CHUNK_BYTES = 64 * 1024
+
+
+class AudioDecodeError(Exception):
+    """Raised when neither libsndfile nor ffmpeg can decode an upload"""
+
+
+class StreamResampler:
+    """
+    Linear-interpolation resampler that keeps its position across blocks
+
+    When downsampling, a windowed-sinc low-pass runs first (its history
+    carried between blocks too), so 44.1/48 kHz uploads do not fold
+    content above 8 kHz back into the speech band. Block boundaries leave
+    no clicks or gaps: the output is the same as resampling in one go.
+    """
+
+    TAPS = 63
+
+    def __init__(self, source_rate: int, target_rate: int = WHISPER_RATE):
+        self.step = source_rate / target_rate
+        self._position = 0.0  # Next output sample, in input samples from the start of _carry
+        self._carry = np.zeros(0, dtype=np.float32)
+        self._filter = None
+        if source_rate > target_rate:
+            cutoff = 0.45 * target_rate / source_rate  # Cycles per input sample, under the new Nyquist
+            n = np.arange(self.TAPS) - (self.TAPS - 1) / 2
+            taps = 2 * cutoff * np.sinc(2 * cutoff * n) * np.hamming(self.TAPS)
+            self._filter = (taps / taps.sum()).astype(np.float32)
+            self._history = np.zeros(self.TAPS - 1, dtype=np.float32)
+
+    def process(self, block: np.ndarray) -> np.ndarray:
+        """
+        Resample the next block of mono float32 samples
+
+        Returns:
+            Resampled samples (may be empty for very short blocks)
+        """
+        if self.step == 1.0:
+            return block
+        if self._filter is not None:
+            padded = np.concatenate([self._history, block])
+            self._history = padded[len(padded) - (self.TAPS - 1):]
+            block = np.convolve(padded, self._filter, mode='valid').astype(np.float32)
+
+        data = np.concatenate([self._carry, block])
+        last = len(data) - 1
+        if last < self._position:
+            self._carry = data
+            return np.zeros(0, dtype=np.float32)
+        count = int((last - self._position) // self.step) + 1
+        positions = self._position + np.arange(count) * self.step
+        out = np.interp(positions, np.arange(len(data)), data).astype(np.float32)
+        # The last input sample is the left neighbour of the next output position
+        self._position += count * self.step - last
+        self._carry = data[last:]
+        return out
+
+
+class AudioDecoder:
+    """
+    Decode an audio file or upload to 16 kHz mono float32, one block at a time
+
+    libsndfile (WAV, FLAC, Ogg Vorbis/Opus, MP3) reads blocks straight from
+    the source; other containers (WebM/Opus from the browser's
+    MediaRecorder, M4A/AAC, ...) are piped through ffmpeg, which also
+    resamples. Only one block is held in memory, whatever the length.
+
+    Use as a context manager, or call close() when done.
+    """
+
+    def __init__(self, source: AudioSource, block_seconds: float = None):
+        """
+        Args:
+            source: File path or binary file object
+            block_seconds: Audio per block (defaults to Config.UPLOAD_DECODE_BLOCK_SECONDS)
+
+        Raises:
+            AudioDecodeError: If the format is not supported
+        """
+        self.source = source
+        self.block_seconds = block_seconds or Config.UPLOAD_DECODE_BLOCK_SECONDS
+        self.backend = None
+        self.source_rate = None
+        self.duration: Optional[float] = None  # Seconds, when the container says
+        self._file = None
+        self._process = None
+
+        if isinstance(source, str) and not os.path.isfile(source):
+            raise AudioDecodeError(f"no such file: {source}")
+        if sf is not None:
+            try:
+                self._file = sf.SoundFile(source)
+                self.backend = 'soundfile'
+                self.source_rate = self._file.samplerate
+                if self._file.frames > 0:
+                    self.duration = self._file.frames / self._file.samplerate
+            except RuntimeError:
+                # Not a libsndfile format; ffmpeg reads the source from the start
+                if hasattr(source, 'seek'):
+                    source.seek(0)
+
+        if self._file is None:
+            self._ffmpeg = shutil.which(Config.UPLOAD_FFMPEG)
+            if self._ffmpeg is None:
+                raise AudioDecodeError("unsupported audio format (install ffmpeg for WebM, M4A and AAC)")
+            self.backend = 'ffmpeg'
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def __iter__(self) -> Iterator[np.ndarray]:
+        return self.blocks()
+
+    def blocks(self) -> Iterator[np.ndarray]:
+        """
+        Yields:
+            Blocks of 16 kHz mono float32 samples
+
+        Raises:
+            AudioDecodeError: If ffmpeg fails before producing any audio
+        """
+        if self.backend == 'soundfile':
+            return self._soundfile_blocks()
+        return self._ffmpeg_blocks()
+
+    def _soundfile_blocks(self) -> Iterator[np.ndarray]:
+        resampler = StreamResampler(self.source_rate)
+        frames = int(self.block_seconds * self.source_rate)
+        for block in self._file.blocks(blocksize=frames, dtype='float32', always_2d=True):
+            mono = block[:, 0] if block.shape[1] == 1 else block.mean(axis=1, dtype=np.float32)
+            out = resampler.process(mono)
+            if len(out):
+                yield out
+
+    def _ffmpeg_blocks(self) -> Iterator[np.ndarray]:
+        from_path = isinstance(self.source, str)
+        command = [self._ffmpeg, '-hide_banner', '-v', 'error']
+        command += ['-nostdin', '-i', self.source] if from_path else ['-i', 'pipe:0']
+        command += ['-f', 'f32le', '-ac', '1', '-ar', str(WHISPER_RATE), 'pipe:1']
+        self._process = subprocess.Popen(command, stdin=None if from_path else subprocess.PIPE,
+                                         stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+        # Both side pipes get their own thread, so neither can fill up and stall ffmpeg
+        errors = deque(maxlen=5)
+        drain = threading.Thread(target=self._drain, args=(errors,), daemon=True)
+        drain.start()
+        if not from_path:
+            threading.Thread(target=self._feed, daemon=True).start()
+
+        block_bytes = int(self.block_seconds * WHISPER_RATE) * 4
+        decoded = 0
+        while True:
+            data = self._process.stdout.read(block_bytes)
+            if not data:
+                break
+            usable = len(data) - len(data) % 4
+            decoded += usable
+            yield np.frombuffer(data[:usable], dtype=np.float32)
+
+        returncode = self._process.wait()
+        drain.join(timeout=1)
+        if returncode != 0 and not decoded:
+            raise AudioDecodeError(errors[-1] if errors else "ffmpeg could not decode the audio")
+        self.duration = decoded / 4 / WHISPER_RATE
+
+    def _drain(self, errors: deque):
+        for line in self._process.stderr:
+            errors.append(line.decode('utf-8', 'replace').strip())
+
+    def _feed(self):
+        """Copy the source into ffmpeg's stdin"""
+        try:
+            while True:
+                chunk = self.source.read(PIPE_CHUNK_BYTES)
+                if not chunk:
+                    break
+                self._process.stdin.write(chunk)
+        except (BrokenPipeError, ValueError, OSError):
+            pass  # ffmpeg exited early (bad input) or the decoder was closed
+        finally:
+            try:
+                self._process.stdin.close()
+            except OSError:
+                pass
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+        if self._process is not None and self._process.poll() is None:
+            self._process.kill()
+            self._process.wait()
+
+
+def iter_chunks(blocks: Iterable[np.ndarray], chunk_seconds: float = None,
+                split_search_seconds: float = None,
+                rate: int = WHISPER_RATE) -> Iterator[Tuple[float, np.ndarray]]:
+    """
+    Regroup decoded blocks into transcription chunks
+
+    Each full chunk ends at the quietest 20 ms of its last
+    split_search_seconds, so words are rarely cut in two; the rest
+    carries over to the next chunk.
+
+    Args:
+        blocks: Mono float32 blocks at `rate`
+        chunk_seconds: Chunk length (defaults to Config.UPLOAD_CHUNK_SECONDS)
+        split_search_seconds: Tail searched for a split point
+                              (defaults to Config.UPLOAD_SPLIT_SEARCH_SECONDS)
+        rate: Sample rate
+
+    Yields:
+        Tuples (offset in seconds, samples); the samples are a view into a
+        reused buffer, valid until the next chunk is requested
+    """
+    size = int((chunk_seconds or Config.UPLOAD_CHUNK_SECONDS) * rate)
+    frame = rate // 50
+    search = min(int((split_search_seconds or Config.UPLOAD_SPLIT_SEARCH_SECONDS) * rate), size // 2)
+    search -= search % frame
+    buffer = np.empty(size, dtype=np.float32)
+    filled = 0
+    offset = 0
+
+    for block in blocks:
+        while len(block):
+            take = min(len(block), size - filled)
+            buffer[filled:filled + take] = block[:take]
+            filled += take
+            block = block[take:]
+            if filled < size:
+                continue
+
+            cut = size
+            if search:
+                tail = buffer[size - search:].reshape(-1, frame)
+                quietest = int(np.argmin(np.einsum('ij,ij->i', tail, tail)))
+                cut = size - search + quietest * frame + frame // 2
+            yield offset / rate, buffer[:cut]
+            offset += cut
+            filled = size - cut
+            buffer[:filled] = buffer[cut:size]
+
+    # Skip a trailing fragment too short to hold a word
+    if filled >= frame * 5:
+        yield offset / rate, buffer[:filled]
+
+
+class ClipKeeper:
+    """
+    Keeps a copy of decoded chunks for the audio store, up to a length
+
+    Pass as the on_chunk callback of SpeechToText.transcribe_stream; uploads
+    longer than max_seconds are not kept.
+    """
+
+    def __init__(self, max_seconds: float = None, rate: int = WHISPER_RATE):
+        self.max_samples = int((max_seconds or Config.UPLOAD_STORE_MAX_SECONDS) * rate)
+        self.rate = rate
+        self._chunks: List[np.ndarray] = []
+        self._samples = 0
+
+    def __call__(self, chunk: np.ndarray):
+        self._samples += len(chunk)
+        if self._samples > self.max_samples:
+            self._chunks = []
+        else:
+            self._chunks.append(chunk.copy())
+
+    def samples(self) -> Optional[np.ndarray]:
+        """The whole clip, or None if it was too long (or empty)"""
+        if not self._chunks or self._samples > self.max_samples:
+            return None
+        return np.concatenate(self._chunks)
@@ -0,0 +1,224 @@
+# Audio store
+# Compressed, content-addressed audio for each turn, encoded on a background thread
+import hashlib
+import io
+import os
+import queue
+import sqlite3
+import threading
+import time
+from typing import Dict, Optional
+
+import numpy as np
+
+try:
+    import soundfile as sf
+except ImportError:
+    sf = None
+
+from config import Config
+from audio_buffers import count_copy
+
+EXTENSIONS = {'flac': 'flac', 'opus': 'ogg'}
+
+KIND_RECORDING = "recording"
+KIND_REPLY = "reply"
+
+
+class AudioStore:
+    """
+    Turn audio written as FLAC or Ogg Opus under AUDIO_STORE_PATH
+
+    Clips are addressed by content: recordings by a hash of their samples,
+    replies by a hash of the TTS model and text, so a reply spoken again
+    (greetings, the fallback apology) is stored once. Files are sharded by
+    date (YYYY/MM/DD/ab/<hash>.ext). The path is decided when a clip is
+    submitted, so it can be saved with the turn right away while encoding
+    happens later on the encoder thread.
+    """
+
+    def __init__(self, root: str = None):
+        """
+        Args:
+            root: Store directory (defaults to Config.AUDIO_STORE_PATH)
+        """
+        self.root = os.path.abspath(root or Config.AUDIO_STORE_PATH)
+        os.makedirs(self.root, exist_ok=True)
+        self.index_path = os.path.join(self.root, 'index.db')
+        with sqlite3.connect(self.index_path) as conn:
+            conn.execute('''
+                CREATE TABLE IF NOT EXISTS clips (
+                    digest TEXT PRIMARY KEY,
+                    path TEXT NOT NULL,
+                    kind TEXT NOT NULL,
+                    bytes INTEGER NOT NULL,
+                    duration REAL NOT NULL,
+                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+                )
+            ''')
+
+        self._queue = queue.Queue(maxsize=Config.AUDIO_STORE_QUEUE)
+        self._pending: Dict[str, str] = {}  # digest -> path, queued but not yet written
+        self._lock = threading.Lock()
+        self._stats = {'submitted': 0, 'deduplicated': 0, 'dropped': 0, 'written': 0,
+                       'failed': 0, 'bytes_written': 0, 'seconds_written': 0.0}
+        self._encoder = threading.Thread(target=self._run, name="audio-store-encoder", daemon=True)
+        self._encoder.start()
+
+    def submit_recording(self, samples: np.ndarray, sample_rate: int) -> Optional[str]:
+        """
+        Queue a user recording (copied, so capture buffers can be reused)
+
+        Returns:
+            Store-relative path to save with the turn, or None if dropped
+        """
+        samples = np.ascontiguousarray(samples, dtype=np.float32)
+        digest = hashlib.sha256(samples.tobytes()).hexdigest()
+        return self._submit(digest, KIND_RECORDING, samples, sample_rate, Config.AUDIO_STORE_RECORDING_FORMAT)
+
+    def submit_reply(self, text: str, samples: np.ndarray, sample_rate: int) -> Optional[str]:
+        """
+        Queue a synthesized reply
+
+        Returns:
+            Store-relative path, or None if dropped
+        """
+        return self._submit(self.reply_digest(text), KIND_REPLY, samples, sample_rate,
+                            Config.AUDIO_STORE_REPLY_FORMAT)
+
+    @staticmethod
+    def reply_digest(text: str) -> str:
+        return hashlib.sha256(f"{Config.TTS_MODEL}\n{text}".encode('utf-8')).hexdigest()
+
+    def _submit(self, digest: str, kind: str, samples: np.ndarray, sample_rate: int, fmt: str) -> Optional[str]:
+        with self._lock:
+            self._stats['submitted'] += 1
+            path = self._pending.get(digest) or self._lookup(digest)
+            if path:
+                self._stats['deduplicated'] += 1
+                return path
+
+            path = f"{time.strftime('%Y/%m/%d', time.gmtime())}/{digest[:2]}/{digest}.{EXTENSIONS[fmt]}"
+            samples = np.array(samples, dtype=np.float32)  # Owned copy for the encoder thread
+            count_copy(samples.nbytes)
+            try:
+                # Never block the turn on encoding; drop the clip instead
+                self._queue.put_nowait((digest, kind, path, samples, sample_rate, fmt))
+            except queue.Full:
+                self._stats['dropped'] += 1
+                print(f"⚠️ Audio store queue full, {kind} not saved")
+                return None
+            self._pending[digest] = path
+            return path
+
+    def _lookup(self, digest: str) -> Optional[str]:
+        with sqlite3.connect(self.index_path) as conn:
+            row = conn.execute('SELECT path FROM clips WHERE digest = ?', (digest,)).fetchone()
+        return row[0] if row else None
+
+    def _run(self):
+        while True:
+            digest, kind, path, samples, sample_rate, fmt = self._queue.get()
+            try:
+                data = self._encode(samples, sample_rate, fmt)
+                full_path = os.path.join(self.root, path)
+                os.makedirs(os.path.dirname(full_path), exist_ok=True)
+                # Readers never see a partial file
+                temp_path = f"{full_path}.tmp"
+                with open(temp_path, 'wb') as f:
+                    f.write(data)
+                os.replace(temp_path, full_path)
+
+                duration = len(samples) / sample_rate
+                with sqlite3.connect(self.index_path) as conn:
+                    conn.execute('''
+                        INSERT OR IGNORE INTO clips (digest, path, kind, bytes, duration)
+                        VALUES (?, ?, ?, ?, ?)
+                    ''', (digest, path, kind, len(data), duration))
+                with self._lock:
+                    self._stats['written'] += 1
+                    self._stats['bytes_written'] += len(data)
+                    self._stats['seconds_written'] += duration
+            except Exception as e:
+                print(f"Error storing {kind} audio: {e}")
+                with self._lock:
+                    self._stats['failed'] += 1
+            finally:
+                with self._lock:
+                    self._pending.pop(digest, None)
+                self._queue.task_done()
+
+    @staticmethod
+    def _encode(samples: np.ndarray, sample_rate: int, fmt: str) -> bytes:
+        if fmt == 'opus':
+            # audio_stream imports text_to_speach, which saves replies here
+            from audio_stream import encode_audio
+            return encode_audio(samples, sample_rate, 'opus')
+        if sf is None:
+            raise RuntimeError("soundfile is required to store audio")
+        buffer = io.BytesIO()
+        sf.write(buffer, samples, sample_rate, format='FLAC', subtype='PCM_16')
+        return buffer.getvalue()
+
+    def reply_path(self, text: str) -> Optional[str]:
+        """Stored (or queued) audio for a reply text, if any (to link it to the turn)"""
+        digest = self.reply_digest(text)
+        with self._lock:
+            return self._pending.get(digest) or self._lookup(digest)
+
+    def contains(self, path: str) -> bool:
+        """Whether a store-relative path was handed out by this store (written or queued)"""
+        digest = os.path.splitext(os.path.basename(path))[0]
+        with self._lock:
+            return (self._pending.get(digest) or self._lookup(digest)) == path
+
+    def resolve(self, path: str) -> Optional[str]:
+        """
+        Absolute file path for a store-relative path
+
+        Returns:
+            Existing file inside the store, or None (unknown, still being
+            encoded, or pointing outside the store)
+        """
+        full_path = os.path.abspath(os.path.join(self.root, path))
+        if not full_path.startswith(self.root + os.sep) or not os.path.isfile(full_path):
+            return None
+        return full_path
+
+    def flush(self):
+        """Wait until every queued clip is written"""
+        self._queue.join()
+
+    def stats(self) -> Dict[str, object]:
+        """
+        Encoder counters plus bytes per stored second of audio
+
+        Returns:
+            Dictionary with submitted, deduplicated, dropped, written,
+            failed, bytes_written, seconds_written, queued and bytes_per_second
+        """
+        with self._lock:
+            stats = dict(self._stats, queued=self._queue.qsize())
+        seconds = stats['seconds_written']
+        stats['bytes_per_second'] = stats['bytes_written'] / seconds if seconds else 0.0
+        return stats
+
+
+_store: Optional[AudioStore] = None
+_store_lock = threading.Lock()
+
+
+def get_audio_store() -> Optional[AudioStore]:
+    """
+    Get the process-wide store
+
+    Returns:
+        AudioStore, or None if disabled in Config
+    """
+    global _store
+    if not Config.AUDIO_STORE_ENABLED:
+        return None
+    with _store_lock:
+        if _store is None:
+            _store = AudioStore()
+        return _store
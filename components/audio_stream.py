@@ -0,0 +1,389 @@
+# Audio streaming
+# Encodes synthesized speech chunk by chunk and fans it out to any number of browser listeners
+import io
+import itertools
+import struct
+import threading
+import time
+import uuid
+from collections import OrderedDict, deque
+from typing import Callable, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+try:
+    import soundfile as sf
+except ImportError:
+    sf = None
+
+from config import Config
+from text_to_speach import split_sentences
+
+CONTENT_TYPES = {
+    'wav': 'audio/wav',
+    'opus': 'audio/ogg; codecs=opus',
+}
+# Opus only takes 8/12/16/24/48 kHz; 24 kHz keeps all of the TTS voice band
+OPUS_SAMPLE_RATE = 24000
+
+
+def wav_stream_header(sample_rate: int, channels: int = 1) -> bytes:
+    """
+    WAV header for 16-bit PCM of unknown length, for progressive playback
+
+    Args:
+        sample_rate: Samples per second
+        channels: Channel count
+
+    Returns:
+        44-byte RIFF header with maximal size fields
+    """
+    byte_rate = sample_rate * channels * 2
+    return (b'RIFF' + struct.pack('<I', 0xFFFFFFFF) + b'WAVE'
+            + b'fmt ' + struct.pack('<IHHIIHH', 16, 1, channels, sample_rate, byte_rate, channels * 2, 16)
+            + b'data' + struct.pack('<I', 0xFFFFFFFF))
+
+
+def to_pcm16(samples: np.ndarray) -> bytes:
+    """Convert float samples in [-1, 1] to little-endian 16-bit PCM"""
+    return (np.clip(samples, -1.0, 1.0) * 32767).astype('<i2').tobytes()
+
+
+def split_ogg_pages(data: bytes) -> List[bytes]:
+    """Split whole Ogg pages (as libsndfile writes them) apart"""
+    pages = []
+    position = 0
+    while position + 27 <= len(data):
+        segments = data[position + 26]
+        table = data[position + 27:position + 27 + segments]
+        size = 27 + segments + sum(table)
+        pages.append(data[position:position + size])
+        position += size
+    return pages
+
+
+class _Sink(io.RawIOBase):
+    """Write-only file object collecting what libsndfile emits"""
+
+    def __init__(self):
+        super().__init__()
+        self.parts = []
+        self.position = 0
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, data) -> int:
+        self.parts.append(bytes(data))
+        self.position += len(data)
+        return len(data)
+
+    def tell(self) -> int:
+        return self.position
+
+    def seek(self, offset: int, whence: int = io.SEEK_SET) -> int:
+        # Ogg is written front to back; libsndfile only asks for the length
+        return self.position
+
+    def take(self) -> bytes:
+        data = b''.join(self.parts)
+        self.parts.clear()
+        return data
+
+
+class ChunkEncoder:
+    """
+    Incremental encoder producing a single continuous stream
+
+    WAV output is a streaming header followed by raw PCM. Opus output is
+    one Ogg stream; pages come out about once per second of audio, so the
+    encoded stream trails synthesis by up to a second until close().
+    """
+
+    def __init__(self, fmt: str, sample_rate: int):
+        """
+        Args:
+            fmt: 'wav' or 'opus'
+            sample_rate: Rate of the samples passed to encode()
+        """
+        if fmt not in CONTENT_TYPES:
+            raise ValueError(f"Unknown stream format: {fmt}")
+        self.format = fmt
+        self.sample_rate = sample_rate
+        self._file = None
+        self._sink = None
+        if fmt == 'opus':
+            if sf is None:
+                raise RuntimeError("soundfile is required for Opus streams")
+            self._sink = _Sink()
+            self._file = sf.SoundFile(self._sink, 'w', samplerate=OPUS_SAMPLE_RATE, channels=1,
+                                      format='OGG', subtype='OPUS')
+
+    def header(self) -> bytes:
+        """Bytes every listener needs first (Opus headers arrive with the first pages)"""
+        return wav_stream_header(self.sample_rate) if self.format == 'wav' else b''
+
+    def encode(self, samples: np.ndarray) -> bytes:
+        if self.format == 'wav':
+            return to_pcm16(samples)
+        if self.sample_rate != OPUS_SAMPLE_RATE:
+            # Simple resampling, as in SpeechToText.transcribe_audio
+            samples = np.interp(
+                np.linspace(0, len(samples), int(len(samples) * OPUS_SAMPLE_RATE / self.sample_rate)),
+                np.arange(len(samples)),
+                samples
+            ).astype(np.float32)
+        self._file.write(samples)
+        return self._sink.take()
+
+    def close(self) -> bytes:
+        if self._file is None:
+            return b''
+        self._file.close()
+        self._file = None
+        return self._sink.take()
+
+
+class AudioStream:
+    """
+    Encoded audio for one reply, buffered for concurrent listeners
+
+    Chunks are encoded once and shared by every listener. The buffer keeps
+    at most `max_bytes` of chunks; a listener that falls further behind
+    skips ahead to the oldest chunk still held. Stream headers (the WAV
+    header, or the Opus header pages) are kept separately so listeners
+    joining late can still decode.
+    """
+
+    def __init__(self, fmt: str, max_bytes: int):
+        self.stream_id = uuid.uuid4().hex
+        self.format = fmt
+        self.content_type = CONTENT_TYPES[fmt]
+        self.max_bytes = max_bytes
+        self.header = b''
+        self.created = time.time()
+        self.closed_at: Optional[float] = None
+        self.error: Optional[str] = None
+        self._chunks = deque()  # (sequence, bytes)
+        self._bytes = 0
+        self._sequence = itertools.count()
+        self._listeners: List[Callable[[], None]] = []
+        self._lock = threading.Lock()
+        self.dropped = 0
+
+    @property
+    def closed(self) -> bool:
+        return self.closed_at is not None
+
+    def add_listener(self, notify: Callable[[], None]):
+        """Register a callback run (on the producer thread) after each append/close"""
+        with self._lock:
+            self._listeners.append(notify)
+
+    def remove_listener(self, notify: Callable[[], None]):
+        with self._lock:
+            if notify in self._listeners:
+                self._listeners.remove(notify)
+
+    @property
+    def listeners(self) -> int:
+        with self._lock:
+            return len(self._listeners)
+
+    def _notify(self):
+        with self._lock:
+            listeners = list(self._listeners)
+        for notify in listeners:
+            notify()
+
+    def set_header(self, header: bytes):
+        with self._lock:
+            self.header = header
+        self._notify()
+
+    def append(self, data: bytes):
+        if not data:
+            return
+        with self._lock:
+            self._chunks.append((next(self._sequence), data))
+            self._bytes += len(data)
+            while self._bytes > self.max_bytes and len(self._chunks) > 1:
+                _, old = self._chunks.popleft()
+                self._bytes -= len(old)
+                self.dropped += 1
+        self._notify()
+
+    def close(self, error: str = None):
+        with self._lock:
+            self.error = error
+            self.closed_at = time.time()
+        self._notify()
+
+    def read(self, cursor: int) -> Tuple[List[bytes], int, bool]:
+        """
+        Chunks from a listener's position (non-blocking)
+
+        Args:
+            cursor: Next sequence number the listener wants (0 to start)
+
+        Returns:
+            Tuple (chunks, new cursor, finished) where finished means the
+            stream is closed and the listener has everything
+        """
+        with self._lock:
+            chunks = [data for sequence, data in self._chunks if sequence >= cursor]
+            if self._chunks:
+                cursor = max(cursor, self._chunks[0][0]) + len(chunks)
+            return chunks, cursor, self.closed and not chunks
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                'stream_id': self.stream_id,
+                'format': self.format,
+                'buffered_bytes': self._bytes,
+                'dropped_chunks': self.dropped,
+                'listeners': len(self._listeners),
+                'closed': self.closed,
+                'error': self.error,
+            }
+
+
+class AudioStreamHub:
+    """Live and recently finished streams, looked up by id"""
+
+    def __init__(self, max_streams: int = None, ttl: float = None):
+        """
+        Args:
+            max_streams: Streams kept (defaults to Config.TTS_STREAM_MAX_STREAMS)
+            ttl: Seconds a finished stream stays readable (defaults to Config.TTS_STREAM_TTL)
+        """
+        self.max_streams = max_streams or Config.TTS_STREAM_MAX_STREAMS
+        self.ttl = ttl or Config.TTS_STREAM_TTL
+        self._streams: "OrderedDict[str, AudioStream]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _expire(self):
+        now = time.time()
+        for stream_id, stream in list(self._streams.items()):
+            if stream.closed and now - stream.closed_at > self.ttl:
+                del self._streams[stream_id]
+        # Over the cap, drop the oldest finished streams first, then the oldest
+        while len(self._streams) > self.max_streams:
+            finished = next((stream_id for stream_id, stream in self._streams.items() if stream.closed), None)
+            self._streams.pop(finished or next(iter(self._streams)))
+
+    def create(self, fmt: str = None) -> AudioStream:
+        stream = AudioStream(fmt or Config.TTS_STREAM_FORMAT, Config.TTS_STREAM_MAX_BUFFER_KB * 1024)
+        with self._lock:
+            self._streams[stream.stream_id] = stream
+            self._expire()
+        return stream
+
+    def get(self, stream_id: str) -> Optional[AudioStream]:
+        with self._lock:
+            self._expire()
+            return self._streams.get(stream_id)
+
+    def stats(self) -> dict:
+        with self._lock:
+            streams = list(self._streams.values())
+        return {
+            'streams': len(streams),
+            'live': sum(1 for stream in streams if not stream.closed),
+            'listeners': sum(stream.listeners for stream in streams),
+        }
+
+
+def encode_sentences(stream: AudioStream, sentences: Iterable[str],
+                     synthesize: Callable[[str], Optional[Tuple[np.ndarray, int]]],
+                     on_finished: Callable[[np.ndarray, int], None] = None):
+    """
+    Synthesize and encode sentences into a stream, closing it at the end (blocking)
+
+    Args:
+        stream: Target stream
+        sentences: Text to speak, one synthesis call each
+        synthesize: Returns (float32 samples, sample rate) or None for a sentence
+        on_finished: Called with the whole clip once every sentence is synthesized
+    """
+    encoder = None
+    clip = []
+    try:
+        for sentence in sentences:
+            result = synthesize(sentence)
+            if result is None:
+                continue
+            samples, sample_rate = result
+            if on_finished:
+                clip.append(samples)
+            if encoder is None:
+                encoder = ChunkEncoder(stream.format, sample_rate)
+                stream.set_header(encoder.header())
+            data = encoder.encode(samples)
+            if stream.format == 'opus' and not stream.header:
+                data = _take_opus_header(stream, data)
+            stream.append(data)
+        if encoder is None:
+            stream.close("synthesis failed")
+            return
+        data = encoder.close()
+        if stream.format == 'opus' and not stream.header:
+            data = _take_opus_header(stream, data)
+        stream.append(data)
+        stream.close()
+        if on_finished:
+            on_finished(np.concatenate(clip), encoder.sample_rate)
+    except Exception as e:
+        print(f"Error streaming speech: {e}")
+        stream.close(str(e))
+
+
+def _take_opus_header(stream: AudioStream, data: bytes) -> bytes:
+    """Move the leading Ogg header pages (granule position 0) into stream.header"""
+    pages = split_ogg_pages(data)
+    header = []
+    while pages and struct.unpack('<q', pages[0][6:14])[0] == 0:
+        header.append(pages.pop(0))
+    if header:
+        stream.set_header(b''.join(header))
+    return b''.join(pages)
+
+
+def start_speech_stream(text: str, synthesize: Callable[[str], Optional[Tuple[np.ndarray, int]]],
+                        fmt: str = None, on_finished: Callable[[np.ndarray, int], None] = None) -> AudioStream:
+    """
+    Create a stream and fill it from a background thread
+
+    Args:
+        text: Reply to speak
+        synthesize: Sentence synthesis callable (e.g. TextToSpeech.synthesize)
+        fmt: 'wav' or 'opus' (defaults to Config.TTS_STREAM_FORMAT)
+        on_finished: Passed to encode_sentences
+
+    Returns:
+        Stream that listeners can attach to right away
+    """
+    stream = get_audio_stream_hub().create(fmt)
+    threading.Thread(target=encode_sentences, args=(stream, split_sentences(text), synthesize, on_finished),
+                     name=f"tts-stream-{stream.stream_id[:8]}", daemon=True).start()
+    return stream
+
+
+def encode_audio(samples: np.ndarray, sample_rate: int, fmt: str = None) -> bytes:
+    """Encode a whole clip in one go (same formats as the streams)"""
+    encoder = ChunkEncoder(fmt or Config.TTS_STREAM_FORMAT, sample_rate)
+    return encoder.header() + encoder.encode(samples) + encoder.close()
+
+
+_hub: Optional[AudioStreamHub] = None
+_hub_lock = threading.Lock()
+
+
+def get_audio_stream_hub() -> AudioStreamHub:
+    """Get the process-wide stream registry"""
+    global _hub
+    with _hub_lock:
+        if _hub is None:
+            _hub = AudioStreamHub()
+        return _hub
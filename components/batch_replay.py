@@ -0,0 +1,434 @@
+# Batch replay
+# Regenerates stored turns with a chosen model, concurrently and resumably
+import heapq
+import json
+import os
+import pathlib
+import sqlite3
+import time
+import uuid
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from config import Config
+from conversation_shards import ConversationShards, get_conversation_shards
+from conversation_transfer import ProgressCallback
+from llm_handler import FALLBACK_RESPONSE, LLMHandler
+from ollama_pool import NoBackendAvailable, get_ollama_pool
+
+# (session_id, conversation id): the scan order and checkpoint key
+ReplayKey = Tuple[str, int]
+
+RESULT_COLUMNS = ['conversation_id', 'session_id', 'user_input', 'original_response', 'replay_response',
+                  'raw_response', 'error', 'latency', 'prompt_tokens', 'completion_tokens', 'eval_seconds']
+
+
+def install_replay_schema(cursor: sqlite3.Cursor):
+    """Create the run and result tables (replay database only)"""
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS replay_runs (
+            run_id TEXT PRIMARY KEY,
+            model TEXT NOT NULL,
+            source_db TEXT NOT NULL,
+            options TEXT NOT NULL,
+            history_turns INTEGER NOT NULL,
+            checkpoint_session TEXT NOT NULL DEFAULT '',
+            checkpoint_id INTEGER NOT NULL DEFAULT 0,
+            done INTEGER NOT NULL DEFAULT 0,
+            failed INTEGER NOT NULL DEFAULT 0,
+            elapsed REAL NOT NULL DEFAULT 0,
+            finished INTEGER NOT NULL DEFAULT 0,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS replay_results (
+            run_id TEXT NOT NULL,
+            conversation_id INTEGER NOT NULL,
+            session_id TEXT NOT NULL,
+            user_input TEXT NOT NULL,
+            original_response TEXT NOT NULL,
+            replay_response TEXT,
+            raw_response TEXT,
+            error TEXT,
+            latency REAL,
+            prompt_tokens INTEGER,
+            completion_tokens INTEGER,
+            eval_seconds REAL,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            PRIMARY KEY (run_id, conversation_id)
+        )
+    ''')
+
+
+class BatchReplay:
+    """
+    Replays stored conversation turns through the LLM
+
+    Turns are read in (session_id, id) order in short read-only chunks,
+    so the interactive database is never locked for more than one chunk.
+    Each turn is prompted with the system prompt and the session's
+    preceding turns as they were stored (the original replies), like
+    LLMHandler builds it live; long-term context is not replayed since
+    the vector index reflects today's data, not the data at the time.
+
+    Results and run progress go to a separate database. The checkpoint is
+    the last key below which every turn has a stored result, so a run
+    interrupted at any point resumes without repeating or skipping turns.
+    """
+
+    def __init__(self, shards: ConversationShards = None, replay_db_path: str = None):
+        """
+        Args:
+            shards: Conversation database shards (defaults to the shared layout)
+            replay_db_path: Results database (defaults to Config.REPLAY_DATABASE_PATH)
+        """
+        self.shards = shards or get_conversation_shards()
+        self.replay_db_path = replay_db_path or Config.REPLAY_DATABASE_PATH
+        self.batch_size = Config.REPLAY_BATCH_SIZE
+        self.pool = get_ollama_pool()
+        self.llm = LLMHandler()
+
+        os.makedirs(os.path.dirname(os.path.abspath(self.replay_db_path)), exist_ok=True)
+        with sqlite3.connect(self.replay_db_path) as conn:
+            install_replay_schema(conn.cursor())
+
+    def _read_source(self, path: str) -> sqlite3.Connection:
+        """Read-only connection: the replay can never write to or lock out the live database"""
+        uri = pathlib.Path(os.path.abspath(path)).as_uri() + "?mode=ro"
+        return sqlite3.connect(uri, uri=True)
+
+    # --- runs -------------------------------------------------------------
+
+    def create_run(self, model: str, temperature: float = None, seed: int = None,
+                   history_turns: int = None) -> str:
+        """
+        Register a new run
+
+        Generation options are fixed here and reused on resume, so every
+        turn of a run is generated the same way regardless of load tier.
+
+        Returns:
+            Run ID
+        """
+        options = self.llm._generation_options(temperature)
+        options['num_predict'] = Config.LLM_MAX_TOKENS
+        if seed is not None:
+            options['seed'] = seed
+        run_id = f"replay_{time.strftime('%Y%m%d_%H%M%S')}_{uuid.uuid4().hex[:6]}"
+        with sqlite3.connect(self.replay_db_path) as conn:
+            conn.execute('''
+                INSERT INTO replay_runs (run_id, model, source_db, options, history_turns)
+                VALUES (?, ?, ?, ?, ?)
+            ''', (run_id, model, os.path.abspath(self.shards.base_path), json.dumps(options),
+                  history_turns or Config.REPLAY_HISTORY_TURNS))
+        return run_id
+
+    def get_run(self, run_id: str) -> Optional[Dict[str, object]]:
+        with sqlite3.connect(self.replay_db_path) as conn:
+            conn.row_factory = sqlite3.Row
+            row = conn.execute('SELECT * FROM replay_runs WHERE run_id = ?', (run_id,)).fetchone()
+        if row is None:
+            return None
+        run = dict(row)
+        run['options'] = json.loads(run['options'])
+        return run
+
+    def list_runs(self, limit: int = 20) -> List[Tuple]:
+        """
+        Returns:
+            List of tuples (run_id, model, done, failed, finished, updated_at), newest first
+        """
+        with sqlite3.connect(self.replay_db_path) as conn:
+            return conn.execute('''
+                SELECT run_id, model, done, failed, finished, updated_at
+                FROM replay_runs
+                ORDER BY created_at DESC
+                LIMIT ?
+            ''', (limit,)).fetchall()
+
+    # --- reading ----------------------------------------------------------
+
+    def _count_turns(self) -> Optional[int]:
+        """Total turns from the statistics rollups (O(1) per shard)"""
+        total = 0
+        try:
+            for path in self._source_paths():
+                with self._read_source(path) as conn:
+                    row = conn.execute('SELECT total_conversations FROM stats_totals WHERE id = 1').fetchone()
+                    total += row[0] if row else 0
+        except sqlite3.Error:
+            return None
+        return total
+
+    def _source_paths(self) -> List[str]:
+        return [path for path in self.shards.paths if os.path.exists(path)]
+
+    def _iter_turns(self, after: ReplayKey, history_turns: int) -> Iterator[Tuple[Tuple, List[Dict[str, str]]]]:
+        """
+        Stream turns after a key with the history each one was answered with
+
+        Shards are merged on (session_id, id), so the checkpoint key means
+        the same thing whatever the shard count.
+
+        Yields:
+            Tuples ((id, session_id, user_input, bot_response), history messages)
+        """
+        streams = [self._iter_shard_turns(path, after, history_turns) for path in self._source_paths()]
+        previous = None
+        for row, messages in heapq.merge(*streams, key=lambda item: (item[0][1], item[0][0])):
+            key = (row[1], row[0])
+            if key == previous:
+                continue  # Same turn seen on two shards mid-move
+            previous = key
+            yield row, messages
+
+    def _iter_shard_turns(self, path: str, after: ReplayKey,
+                          history_turns: int) -> Iterator[Tuple[Tuple, List[Dict[str, str]]]]:
+        session_id = None
+        history = deque(maxlen=history_turns)
+        while True:
+            with self._read_source(path) as conn:
+                cursor = conn.cursor()
+                cursor.execute('''
+                    SELECT id, session_id, user_input, bot_response
+                    FROM conversations
+                    WHERE (session_id, id) > (?, ?)
+                    ORDER BY session_id, id
+                    LIMIT ?
+                ''', (after[0], after[1], self.batch_size))
+                rows = cursor.fetchall()
+
+                # Seed the history of sessions entered mid-way (on resume) or anew
+                prepared = []
+                for row in rows:
+                    if row[1] != session_id:
+                        session_id = row[1]
+                        history.clear()
+                        cursor.execute('''
+                            SELECT user_input, bot_response
+                            FROM conversations
+                            WHERE session_id = ? AND id < ?
+                            ORDER BY id DESC
+                            LIMIT ?
+                        ''', (row[1], row[0], history_turns))
+                        history.extend(reversed(cursor.fetchall()))
+                    prepared.append((row, list(history)))
+                    history.append((row[2], row[3]))
+
+            # The read transaction is closed before any generation starts
+            for row, turns in prepared:
+                messages = []
+                for user_input, bot_response in turns:
+                    messages.append({'role': 'user', 'content': user_input})
+                    messages.append({'role': 'assistant', 'content': bot_response})
+                yield row, messages
+            if len(rows) < self.batch_size:
+                return
+            after = (rows[-1][1], rows[-1][0])
+
+    # --- generation -------------------------------------------------------
+
+    def _generate(self, model: str, options: Dict[str, object], row: Tuple,
+                  history: List[Dict[str, str]]) -> Tuple:
+        """Generate one reply (worker thread); returns a replay_results row"""
+        conversation_id, session_id, user_input, bot_response = row
+        messages = self.llm._build_messages(user_input, history)
+        started = time.perf_counter()
+        try:
+            # Session affinity keeps a session's turns on one host's prompt cache
+            response = self.pool.chat(model, messages, session_id=session_id, options=options)
+        except NoBackendAvailable:
+            raise
+        except Exception as e:
+            return (conversation_id, session_id, user_input, bot_response, None, None, str(e),
+                    time.perf_counter() - started, None, None, None)
+        latency = time.perf_counter() - started
+        raw_text = response['message']['content'].strip()
+        eval_duration = response.get('eval_duration')
+        return (conversation_id, session_id, user_input, bot_response, self.llm._clean_response(raw_text),
+                raw_text, None, latency, response.get('prompt_eval_count'), response.get('eval_count'),
+                eval_duration / 1e9 if eval_duration else None)
+
+    def default_concurrency(self, model: str) -> int:
+        """Requests in flight: each healthy host serving the model runs REPLAY_PARALLEL_PER_BACKEND"""
+        backends = sum(1 for backend in self.pool.backends if backend.can_serve(model))
+        return max(backends, 1) * Config.REPLAY_PARALLEL_PER_BACKEND
+
+    def run(self, run_id: str, concurrency: int = None, limit: int = None,
+            progress: ProgressCallback = None) -> Dict[str, int]:
+        """
+        Run (or resume) a replay
+
+        Args:
+            run_id: Run from create_run()
+            concurrency: Generations in flight (defaults to default_concurrency())
+            limit: Stop after this many turns in this call (optional)
+            progress: Optional progress callback (turns done in the run, total turns)
+
+        Returns:
+            Dictionary with done (this call), failed (this call) and finished
+
+        Raises:
+            NoBackendAvailable: No host serves the model; progress so far is kept
+        """
+        run = self.get_run(run_id)
+        if run is None:
+            raise ValueError(f"Unknown replay run: {run_id}")
+        model, options = run['model'], run['options']
+        concurrency = concurrency or self.default_concurrency(model)
+        checkpoint: ReplayKey = (run['checkpoint_session'], run['checkpoint_id'])
+
+        with sqlite3.connect(self.replay_db_path) as conn:
+            # Turns finished past the checkpoint before an interruption
+            already_done = {row[0] for row in conn.execute('''
+                SELECT conversation_id FROM replay_results
+                WHERE run_id = ? AND (session_id, conversation_id) > (?, ?)
+            ''', (run_id, checkpoint[0], checkpoint[1]))}
+        total = self._count_turns()
+        print(f"Replay {run_id}: {model}, {concurrency} in flight, resuming after {checkpoint}"
+              if run['done'] else f"Replay {run_id}: {model}, {concurrency} in flight")
+
+        order = deque()  # Keys in dispatch order, unfinished or not yet checkpointed
+        completed = set()
+        pending_rows = []
+        counts = {'done': 0, 'failed': 0}
+        totals = {'done': run['done'], 'failed': run['failed']}
+        started = time.perf_counter()
+        elapsed_saved = started
+
+        def checkpoint_to(key: ReplayKey):
+            nonlocal elapsed_saved
+            now = time.perf_counter()
+            with sqlite3.connect(self.replay_db_path) as conn:
+                conn.executemany(f'''
+                    INSERT OR REPLACE INTO replay_results (run_id, {', '.join(RESULT_COLUMNS)})
+                    VALUES (?, {', '.join('?' * len(RESULT_COLUMNS))})
+                ''', [(run_id,) + result for result in pending_rows])
+                conn.execute('''
+                    UPDATE replay_runs
+                    SET checkpoint_session = ?, checkpoint_id = ?, done = ?, failed = ?,
+                        elapsed = elapsed + ?, updated_at = CURRENT_TIMESTAMP
+                    WHERE run_id = ?
+                ''', (key[0], key[1], totals['done'], totals['failed'], now - elapsed_saved, run_id))
+            elapsed_saved = now
+            pending_rows.clear()
+
+        def collect(futures_done):
+            nonlocal checkpoint
+            for future in futures_done:
+                result = future.result()
+                pending_rows.append(result)
+                completed.add((result[1], result[0]))
+                counts['done'] += 1
+                totals['done'] += 1
+                if result[6] is not None:
+                    counts['failed'] += 1
+                    totals['failed'] += 1
+            while order and order[0] in completed:
+                checkpoint = order.popleft()
+                completed.discard(checkpoint)
+            if len(pending_rows) >= Config.REPLAY_CHECKPOINT_ROWS:
+                checkpoint_to(checkpoint)
+            if progress:
+                progress(totals['done'], total)
+
+        finished = False
+        in_flight = set()
+        executor = ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix="replay")
+        try:
+            dispatched = 0
+            for row, history in self._iter_turns(checkpoint, run['history_turns']):
+                if row[0] in already_done:
+                    order.append((row[1], row[0]))
+                    completed.add((row[1], row[0]))
+                    continue
+                if limit is not None and dispatched >= limit:
+                    break
+                while len(in_flight) >= concurrency:
+                    done, in_flight = wait(in_flight, return_when=FIRST_COMPLETED)
+                    collect(done)
+                order.append((row[1], row[0]))
+                in_flight.add(executor.submit(self._generate, model, options, row, history))
+                dispatched += 1
+            else:
+                finished = True
+            while in_flight:
+                done, in_flight = wait(in_flight, return_when=FIRST_COMPLETED)
+                collect(done)
+        finally:
+            # Keep whatever finished; anything still running is redone on resume
+            for future in in_flight:
+                future.cancel()
+            executor.shutdown(wait=True)
+            collect([future for future in in_flight if future.done() and not future.cancelled()
+                     and future.exception() is None])
+            checkpoint_to(checkpoint)
+
+        if finished:
+            with sqlite3.connect(self.replay_db_path) as conn:
+                conn.execute('UPDATE replay_runs SET finished = 1 WHERE run_id = ?', (run_id,))
+        print(f"Replay {run_id}: {counts['done']} turns ({counts['failed']} failed) "
+              f"in {time.perf_counter() - started:.1f}s")
+        return dict(counts, finished=finished)
+
+    # --- results ----------------------------------------------------------
+
+    def summary(self, run_id: str) -> Dict[str, object]:
+        """
+        Timing and comparison figures for a run
+
+        Returns:
+            Dictionary with turns, failed, elapsed, turns_per_second, avg/p50/p95
+            latency, tokens_per_second, changed (reply differs from the
+            original), fallback_original, fallback_replay and average lengths
+        """
+        run = self.get_run(run_id)
+        if run is None:
+            return {}
+        with sqlite3.connect(self.replay_db_path) as conn:
+            cursor = conn.cursor()
+            cursor.execute('''
+                SELECT COUNT(*), AVG(latency), SUM(completion_tokens), SUM(eval_seconds),
+                       SUM(replay_response != original_response),
+                       SUM(original_response = ?), SUM(replay_response = ?),
+                       AVG(LENGTH(original_response)), AVG(LENGTH(replay_response))
+                FROM replay_results
+                WHERE run_id = ? AND error IS NULL
+            ''', (FALLBACK_RESPONSE, FALLBACK_RESPONSE, run_id))
+            ok, avg_latency, tokens, eval_seconds, changed, fallback_original, fallback_replay, \
+                original_length, replay_length = cursor.fetchone()
+
+            def latency_at(fraction: float) -> float:
+                if not ok:
+                    return 0.0
+                cursor.execute('''
+                    SELECT latency FROM replay_results
+                    WHERE run_id = ? AND error IS NULL
+                    ORDER BY latency
+                    LIMIT 1 OFFSET ?
+                ''', (run_id, min(int(ok * fraction), ok - 1)))
+                return cursor.fetchone()[0]
+
+            p50, p95 = latency_at(0.5), latency_at(0.95)
+
+        turns = run['done']
+        return {
+            'model': run['model'],
+            'turns': turns,
+            'failed': run['failed'],
+            'finished': bool(run['finished']),
+            'elapsed': run['elapsed'],
+            'turns_per_second': turns / run['elapsed'] if run['elapsed'] else 0.0,
+            'avg_latency': avg_latency or 0.0,
+            'p50_latency': p50,
+            'p95_latency': p95,
+            'tokens_per_second': tokens / eval_seconds if tokens and eval_seconds else 0.0,
+            'changed': changed or 0,
+            'fallback_original': fallback_original or 0,
+            'fallback_replay': fallback_replay or 0,
+            'avg_original_length': original_length or 0.0,
+            'avg_replay_length': replay_length or 0.0,
+        }
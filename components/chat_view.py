@@ -0,0 +1,107 @@
+# Chat rendering
+# Per-turn HTML escaped and cached once, new turns appended without a rerun
+import html
+from datetime import datetime
+from typing import Dict, List
+
+import streamlit as st
+
+# Fragments rerun only the decorated function on widget interaction
+# (Streamlit >= 1.37; experimental name before that). Without them the
+# whole script reruns, which is still correct, just slower.
+fragment = getattr(st, "fragment", None) or getattr(st, "experimental_fragment", None) or (lambda func: func)
+
+
+def _escape(text: str) -> str:
+    """Escape model/user text for the HTML bubbles, keeping line breaks"""
+    return html.escape(text).replace("\n", "<br>")
+
+
+def render_exchange_html(user_text: str, bot_text: str) -> str:
+    """
+    Render one user/bot exchange as chat bubbles
+
+    Args:
+        user_text: User message
+        bot_text: Bot response
+
+    Returns:
+        HTML for both bubbles
+    """
+    return (
+        f'<div class="user-message">{_escape(user_text)}</div>'
+        f'<div class="bot-message">{_escape(bot_text)}</div>'
+    )
+
+
+def make_exchange(user_text: str, bot_text: str, timestamp: datetime = None) -> Dict[str, object]:
+    """
+    Build a conversation_history entry with its HTML rendered once
+
+    Args:
+        user_text: User message
+        bot_text: Bot response
+        timestamp: Time of the exchange (defaults to now)
+
+    Returns:
+        Exchange dictionary (user, bot, timestamp, html)
+    """
+    return {
+        'user': user_text,
+        'bot': bot_text,
+        'timestamp': timestamp or datetime.now(),
+        'html': render_exchange_html(user_text, bot_text)
+    }
+
+
+class ChatView:
+    """Chat area that renders cached history once per run and appends new turns"""
+
+    def __init__(self, max_turns: int = 10, height: int = 400):
+        """
+        Initialize chat view
+
+        Args:
+            max_turns: Number of most recent exchanges to display
+            height: Scrollable area height in pixels
+        """
+        self.max_turns = max_turns
+        self.height = height
+        self.container = None
+
+    def _open_container(self, scrollable: bool):
+        """Create the chat container (fixed-height scroll area when supported)"""
+        if scrollable:
+            try:
+                return st.container(height=self.height)
+            except TypeError:
+                pass  # Streamlit < 1.31 has no fixed-height containers
+        return st.container()
+
+    def render(self, history: List[Dict[str, object]]):
+        """
+        Emit the visible history from cached HTML
+
+        Args:
+            history: st.session_state.conversation_history
+        """
+        self.container = self._open_container(bool(history))
+        for exchange in history[-self.max_turns:]:
+            self._emit(exchange)
+
+    def append(self, exchange: Dict[str, object]):
+        """
+        Show a new exchange in place, without rerunning the script
+
+        Args:
+            exchange: Entry created by make_exchange
+        """
+        if self.container is None:
+            self.container = self._open_container(False)
+        self._emit(exchange)
+
+    def _emit(self, exchange: Dict[str, object]):
+        """Write one exchange into the container, rendering HTML if missing"""
+        if 'html' not in exchange:
+            exchange['html'] = render_exchange_html(exchange['user'], exchange['bot'])
+        self.container.markdown(exchange['html'], unsafe_allow_html=True)
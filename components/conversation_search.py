@@ -0,0 +1,212 @@
+# Conversation search
+# SQLite FTS5 index over conversations (trigram tokenizer for Japanese)
+import sqlite3
+from typing import List, Dict
+
+from conversation_shards import ConversationShards
+
+# Trigram tokenizer indexes every 3-character window, so queries work
+# without word segmentation (Japanese has no spaces between words)
+FTS_TABLE = '''
+    CREATE VIRTUAL TABLE IF NOT EXISTS conversations_fts USING fts5(
+        user_input,
+        bot_response,
+        content='conversations',
+        content_rowid='id',
+        tokenize='trigram'
+    )
+'''
+
+# External-content table: triggers mirror every write on conversations
+FTS_TRIGGERS = [
+    '''
+    CREATE TRIGGER IF NOT EXISTS conversations_fts_insert
+    AFTER INSERT ON conversations
+    BEGIN
+        INSERT INTO conversations_fts (rowid, user_input, bot_response)
+        VALUES (NEW.id, NEW.user_input, NEW.bot_response);
+    END
+    ''',
+    '''
+    CREATE TRIGGER IF NOT EXISTS conversations_fts_delete
+    AFTER DELETE ON conversations
+    BEGIN
+        INSERT INTO conversations_fts (conversations_fts, rowid, user_input, bot_response)
+        VALUES ('delete', OLD.id, OLD.user_input, OLD.bot_response);
+    END
+    ''',
+    '''
+    CREATE TRIGGER IF NOT EXISTS conversations_fts_update
+    AFTER UPDATE OF user_input, bot_response ON conversations
+    BEGIN
+        INSERT INTO conversations_fts (conversations_fts, rowid, user_input, bot_response)
+        VALUES ('delete', OLD.id, OLD.user_input, OLD.bot_response);
+        INSERT INTO conversations_fts (rowid, user_input, bot_response)
+        VALUES (NEW.id, NEW.user_input, NEW.bot_response);
+    END
+    ''',
+]
+
+# Trigram index can only match terms of at least this many characters
+MIN_TRIGRAM_LENGTH = 3
+
+HIGHLIGHT_START = '【'
+HIGHLIGHT_END = '】'
+
+
+def install_search_schema(cursor: sqlite3.Cursor) -> bool:
+    """
+    Create the FTS5 index and its sync triggers, backfilling existing rows
+
+    Args:
+        cursor: Cursor on a connection where the conversations table exists
+
+    Returns:
+        True if FTS5 is available, False if search must fall back to LIKE
+    """
+    cursor.execute('''
+        SELECT 1 FROM sqlite_master
+        WHERE type = 'table' AND name = 'conversations_fts'
+    ''')
+    exists = cursor.fetchone() is not None
+
+    try:
+        cursor.execute(FTS_TABLE)
+    except sqlite3.OperationalError as e:
+        print(f"⚠️ FTS5 trigram search not available: {e}")
+        print("💡 Conversation search will use slower LIKE scans.")
+        return False
+
+    for statement in FTS_TRIGGERS:
+        cursor.execute(statement)
+
+    if not exists:
+        # Backfill migration for rows written before the index existed
+        cursor.execute("INSERT INTO conversations_fts (conversations_fts) VALUES ('rebuild')")
+        print("Conversation search index built")
+
+    return True
+
+
+def _fts_query(terms: List[str]) -> str:
+    """Quote each term as an FTS5 phrase so user input is never parsed as syntax"""
+    return ' AND '.join('"' + term.replace('"', '""') + '"' for term in terms)
+
+
+class ConversationSearch:
+    """Ranked, paginated search over stored conversations"""
+
+    def __init__(self, shards: ConversationShards, fts_available: bool = True):
+        """
+        Initialize search
+
+        Args:
+            shards: Conversation databases (each with its own FTS5 index)
+            fts_available: Whether the FTS5 index was created
+        """
+        self.shards = shards
+        self.fts_available = fts_available
+
+    def search(self, query: str, limit: int = 10, offset: int = 0,
+               session_id: str = None) -> List[Dict[str, object]]:
+        """
+        Search user inputs and bot responses
+
+        Results are ranked by BM25. Terms shorter than the trigram width
+        cannot use the index and fall back to a LIKE scan, newest first.
+        With several shards, each returns its first offset + limit matches
+        and the page is cut from their merge (BM25 statistics are per shard).
+
+        Args:
+            query: Whitespace-separated search terms (all must match)
+            limit: Page size
+            offset: Number of results to skip
+            session_id: Restrict to one session (optional)
+
+        Returns:
+            List of result dictionaries with a highlighted snippet
+        """
+        terms = query.split()
+        if not terms:
+            return []
+
+        use_fts = self.fts_available and all(len(term) >= MIN_TRIGRAM_LENGTH for term in terms)
+        paths = [self.shards.path_for(session_id)] if session_id else self.shards.paths
+
+        rows = []
+        for path in paths:
+            rows.extend(self._search_shard(path, terms, use_fts, session_id,
+                                           limit if len(paths) == 1 else limit + offset,
+                                           offset if len(paths) == 1 else 0))
+        if len(paths) > 1:
+            if use_fts:
+                rows.sort(key=lambda row: row[7])
+            else:
+                rows.sort(key=lambda row: (row[5], row[0]), reverse=True)
+            rows = rows[offset:offset + limit]
+
+        results = []
+        for row_id, row_session, title, user_input, bot_response, timestamp, snippet, rank in rows:
+            if snippet is None:
+                snippet = self._highlight(user_input, bot_response, terms)
+            results.append({
+                'id': row_id,
+                'session_id': row_session,
+                'title': title,
+                'user_input': user_input,
+                'bot_response': bot_response,
+                'timestamp': timestamp,
+                'snippet': snippet,
+                'rank': rank
+            })
+        return results
+
+    def _search_shard(self, path: str, terms: List[str], use_fts: bool, session_id: str,
+                      limit: int, offset: int) -> List[tuple]:
+        """Matching rows of one shard, best (or newest) first"""
+        with sqlite3.connect(path) as conn:
+            cursor = conn.cursor()
+
+            if use_fts:
+                sql = f'''
+                    SELECT c.id, c.session_id, s.title, c.user_input, c.bot_response, c.timestamp,
+                           snippet(conversations_fts, -1, '{HIGHLIGHT_START}', '{HIGHLIGHT_END}', '…', 24),
+                           bm25(conversations_fts)
+                    FROM conversations_fts
+                    JOIN conversations c ON c.id = conversations_fts.rowid
+                    LEFT JOIN sessions s ON s.session_id = c.session_id
+                    WHERE conversations_fts MATCH ?
+                '''
+                params = [_fts_query(terms)]
+                if session_id:
+                    sql += ' AND c.session_id = ?'
+                    params.append(session_id)
+                sql += ' ORDER BY bm25(conversations_fts) LIMIT ? OFFSET ?'
+            else:
+                sql = '''
+                    SELECT c.id, c.session_id, s.title, c.user_input, c.bot_response, c.timestamp,
+                           NULL, 0.0
+                    FROM conversations c
+                    LEFT JOIN sessions s ON s.session_id = c.session_id
+                    WHERE 1 = 1
+                '''
+                params = []
+                for term in terms:
+                    pattern = '%' + term.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_') + '%'
+                    sql += " AND (c.user_input LIKE ? ESCAPE '\\' OR c.bot_response LIKE ? ESCAPE '\\')"
+                    params.extend([pattern, pattern])
+                if session_id:
+                    sql += ' AND c.session_id = ?'
+                    params.append(session_id)
+                sql += ' ORDER BY c.id DESC LIMIT ? OFFSET ?'
+
+            params.extend([limit, offset])
+            cursor.execute(sql, params)
+            return cursor.fetchall()
+
+    def _highlight(self, user_input: str, bot_response: str, terms: List[str]) -> str:
+        """Build a snippet for LIKE results, which get no FTS5 snippet()"""
+        text = user_input if any(term in user_input for term in terms) else bot_response
+        for term in terms:
+            text = text.replace(term, f"{HIGHLIGHT_START}{term}{HIGHLIGHT_END}")
+        return text
@@ -0,0 +1,520 @@
+# Conversation shards
+# Sessions spread over several SQLite files by hash of session_id, with a catalog DB
+import os
+import sqlite3
+import threading
+import time
+import zlib
+from collections import OrderedDict
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from config import Config
+
+# Conversation ids allocated by a shard carry the shard number in their low bits
+# (id = counter << BITS | shard), so ids stay unique across files and keep their
+# value when a session moves; the counter in the high bits keeps them increasing
+SHARD_ID_BITS = 10
+SHARD_ID_MASK = (1 << SHARD_ID_BITS) - 1
+MAX_SHARDS = 1 << SHARD_ID_BITS
+
+CATALOG_TABLE = '''
+    CREATE TABLE IF NOT EXISTS session_shards (
+        session_id TEXT PRIMARY KEY,
+        shard INTEGER NOT NULL,
+        title TEXT,
+        created_at DATETIME DEFAULT CURRENT_TIMESTAMP
+    )
+'''
+
+SHARD_INFO_TABLE = '''
+    CREATE TABLE IF NOT EXISTS shard_info (
+        id INTEGER PRIMARY KEY CHECK (id = 1),
+        shard INTEGER NOT NULL,
+        last_id INTEGER NOT NULL,
+        base_id INTEGER NOT NULL
+    )
+'''
+
+# Callback receiving (sessions_checked, sessions_moved)
+RebalanceProgress = Callable[[int, int], None]
+
+
+def shard_path(base_path: str, index: int) -> str:
+    """Shard 0 is the classic single database file; data/conversations.db -> data/conversations-1.db, ..."""
+    if index == 0:
+        return base_path
+    root, extension = os.path.splitext(base_path)
+    return f"{root}-{index}{extension}"
+
+
+def id_allocator(conversation_id: int) -> int:
+    """Shard that allocated a conversation id (meaningless for ids up to the base id)"""
+    return conversation_id & SHARD_ID_MASK
+
+
+def max_conversation_id(paths: List[str]) -> int:
+    """Highest conversation id in any of the existing files"""
+    highest = 0
+    for path in paths:
+        if not os.path.exists(path):
+            continue
+        with sqlite3.connect(path) as conn:
+            try:
+                highest = max(highest, conn.execute('SELECT COALESCE(MAX(id), 0) FROM conversations').fetchone()[0])
+            except sqlite3.OperationalError:
+                pass  # Created but not initialized yet
+    return highest
+
+
+def install_shard_schema(cursor: sqlite3.Cursor, shard: int, floor_id: int = 0):
+    """
+    Create the id allocator of one shard
+
+    The allocator starts above floor_id (the highest id in any shard when
+    it is created), so ids from the single-file database, which became
+    shard 0 as is, never collide with allocated ones. That starting point
+    is kept as base_id.
+
+    Args:
+        cursor: Cursor on the shard database (conversations table must exist)
+        shard: Shard index
+        floor_id: Highest conversation id in any shard
+    """
+    cursor.execute(SHARD_INFO_TABLE)
+    cursor.execute('''
+        INSERT OR IGNORE INTO shard_info (id, shard, last_id, base_id)
+        SELECT 1, ?, MAX(?, COALESCE(MAX(id), 0)), MAX(?, COALESCE(MAX(id), 0)) FROM conversations
+    ''', (shard, floor_id, floor_id))
+
+
+def allocate_ids(cursor: sqlite3.Cursor, count: int = 1) -> range:
+    """
+    Reserve `count` increasing conversation ids in the cursor's transaction
+
+    Returns:
+        The reserved ids (MAX_SHARDS apart)
+    """
+    cursor.execute(f'''
+        UPDATE shard_info SET last_id = (((last_id >> {SHARD_ID_BITS}) + ?) << {SHARD_ID_BITS}) | shard
+        WHERE id = 1
+    ''', (count,))
+    cursor.execute('SELECT last_id FROM shard_info WHERE id = 1')
+    last_id = cursor.fetchone()[0]
+    return range(last_id - (count - 1) * MAX_SHARDS, last_id + 1, MAX_SHARDS)
+
+
+def reserve_ids(cursor: sqlite3.Cursor, max_id: int):
+    """
+    Move a shard's allocator past ids inserted with their original value
+    (imports, moved sessions), so later turns of those sessions sort after them
+    """
+    cursor.execute('UPDATE shard_info SET last_id = MAX(last_id, ?) WHERE id = 1', (max_id,))
+
+
+def base_id(path: str) -> Optional[int]:
+    """
+    Highest id allocated before sharding (by AUTOINCREMENT), from shard 0
+
+    Returns:
+        The base id, or None for an unsharded database
+    """
+    with sqlite3.connect(path) as conn:
+        try:
+            row = conn.execute('SELECT base_id FROM shard_info WHERE id = 1').fetchone()
+        except sqlite3.OperationalError:
+            return None
+    return row[0] if row else None
+
+
+class ConversationShards:
+    """
+    Where each session's rows live
+
+    With DATABASE_SHARDS = 1 there is one file and no catalog. With more,
+    a new session is placed on shard crc32(session_id) % DATABASE_SHARDS
+    and recorded in the catalog, which is written once per session (not
+    per turn), so concurrent writers mostly contend on different files.
+    Lookups go through a per-process LRU of session locations.
+
+    A session moved by the rebalancer in another process is found by the
+    fence in MemoryManager: a write whose sessions row is missing from
+    the cached shard re-reads the catalog and retries.
+    """
+
+    def __init__(self, base_path: str = None, count: int = None, catalog_path: str = None):
+        """
+        Args:
+            base_path: Shard 0 file (defaults to Config.DATABASE_PATH)
+            count: Shards new sessions are placed on (defaults to Config.DATABASE_SHARDS)
+            catalog_path: Catalog database (defaults to Config.DATABASE_CATALOG_PATH)
+        """
+        self.base_path = base_path or Config.DATABASE_PATH
+        self.count = max(count or Config.DATABASE_SHARDS, 1)
+        if self.count > MAX_SHARDS:
+            raise ValueError(f"DATABASE_SHARDS must be at most {MAX_SHARDS}")
+        self.sharded = self.count > 1
+        # Files left above `count` after lowering it stay readable until the rebalancer drains them
+        total = self.count
+        while self.sharded and os.path.exists(shard_path(self.base_path, total)):
+            total += 1
+        self.paths = [shard_path(self.base_path, index) for index in range(total)]
+        self.catalog_path = (catalog_path or Config.DATABASE_CATALOG_PATH) if self.sharded else None
+
+        self._locations: "OrderedDict[str, int]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.catalog_created = False
+        if self.sharded:
+            os.makedirs(os.path.dirname(os.path.abspath(self.catalog_path)), exist_ok=True)
+            self.catalog_created = not os.path.exists(self.catalog_path)
+            with sqlite3.connect(self.catalog_path) as conn:
+                conn.execute(CATALOG_TABLE)
+
+    # --- placement --------------------------------------------------------
+
+    def placement(self, session_id: str) -> int:
+        """Shard a session belongs on (stable across processes and restarts)"""
+        if not self.sharded:
+            return 0
+        return zlib.crc32(session_id.encode('utf-8')) % self.count
+
+    def shard_of(self, session_id: str) -> int:
+        """
+        Shard currently holding a session
+
+        Cached; on a miss the catalog is read, then every shard is probed
+        (sessions written before sharding was enabled). Unknown sessions
+        map to their placement.
+        """
+        if not self.sharded:
+            return 0
+        with self._lock:
+            shard = self._locations.get(session_id)
+            if shard is not None:
+                self._locations.move_to_end(session_id)
+                return shard
+
+        with sqlite3.connect(self.catalog_path) as conn:
+            row = conn.execute('SELECT shard FROM session_shards WHERE session_id = ?', (session_id,)).fetchone()
+        if row is not None:
+            shard = row[0]
+        else:
+            shard = self._probe(session_id)
+            if shard is None:
+                shard = self.placement(session_id)
+            else:
+                self.register(session_id, shard)
+        self._remember(session_id, shard)
+        return shard
+
+    def _probe(self, session_id: str) -> Optional[int]:
+        for index in range(len(self.paths)):
+            if self._probe_one(session_id, index):
+                return index
+        return None
+
+    def _remember(self, session_id: str, shard: int):
+        with self._lock:
+            self._locations[session_id] = shard
+            self._locations.move_to_end(session_id)
+            while len(self._locations) > Config.SHARD_LOCATION_CACHE:
+                self._locations.popitem(last=False)
+
+    def path_for(self, session_id: str) -> str:
+        return self.paths[self.shard_of(session_id)]
+
+    def locate(self, session_id: str) -> str:
+        """
+        Path of the shard holding a session, checked against the file
+
+        For rare operations (archive, delete) that must not act on a stale
+        cached location after another process moved the session.
+        """
+        shard = self.shard_of(session_id)
+        if self.sharded and not self._probe_one(session_id, shard):
+            shard = self.refresh(session_id)
+        return self.paths[shard]
+
+    def refresh(self, session_id: str) -> int:
+        """Drop the cached location (after a fence miss) and look it up again"""
+        with self._lock:
+            self._locations.pop(session_id, None)
+        return self.shard_of(session_id)
+
+    def group(self, items: Iterable, session_key: Callable) -> Dict[int, List]:
+        """Split items by the shard of their session"""
+        groups: Dict[int, List] = {}
+        for item in items:
+            groups.setdefault(self.shard_of(session_key(item)), []).append(item)
+        return groups
+
+    # --- catalog ----------------------------------------------------------
+
+    def register(self, session_id: str, shard: int, title: str = None, created_at: str = None):
+        """Record (or move) a session in the catalog"""
+        if not self.sharded:
+            return
+        with sqlite3.connect(self.catalog_path) as conn:
+            conn.execute('''
+                INSERT INTO session_shards (session_id, shard, title, created_at)
+                VALUES (?, ?, ?, COALESCE(?, CURRENT_TIMESTAMP))
+                ON CONFLICT(session_id) DO UPDATE SET
+                    shard = excluded.shard,
+                    title = COALESCE(excluded.title, title)
+            ''', (session_id, shard, title, created_at))
+        self._remember(session_id, shard)
+
+    def register_new(self, sessions: List[Tuple[str, str, str]]):
+        """
+        Catalog sessions that are not catalogued yet on their placement shard
+
+        Args:
+            sessions: Tuples (session_id, title, created_at)
+        """
+        if not self.sharded or not sessions:
+            return
+        with sqlite3.connect(self.catalog_path) as conn:
+            conn.executemany('''
+                INSERT OR IGNORE INTO session_shards (session_id, shard, title, created_at)
+                VALUES (?, ?, ?, COALESCE(?, CURRENT_TIMESTAMP))
+            ''', [(session_id, self.placement(session_id), title, created_at)
+                  for session_id, title, created_at in sessions])
+        with self._lock:
+            for session_id, _, _ in sessions:
+                self._locations.pop(session_id, None)
+
+    def forget(self, session_id: str):
+        """Remove a deleted session from the catalog"""
+        with self._lock:
+            self._locations.pop(session_id, None)
+        if self.sharded:
+            with sqlite3.connect(self.catalog_path) as conn:
+                conn.execute('DELETE FROM session_shards WHERE session_id = ?', (session_id,))
+
+    def sync_catalog(self) -> int:
+        """
+        Catalog every session found in a shard but missing from the catalog
+
+        Run when the catalog is first created, so an existing single-file
+        database becomes shard 0 without a migration step.
+
+        Returns:
+            Number of sessions added
+        """
+        if not self.sharded:
+            return 0
+        added = 0
+        with sqlite3.connect(self.catalog_path) as catalog:
+            for index, path in enumerate(self.paths):
+                if not os.path.exists(path):
+                    continue
+                with sqlite3.connect(path) as conn:
+                    rows = conn.execute('''
+                        SELECT session_id, title, created_at FROM sessions
+                        UNION ALL
+                        SELECT session_id, title, created_at FROM archived_sessions
+                    ''').fetchall()
+                before = catalog.total_changes
+                catalog.executemany('''
+                    INSERT OR IGNORE INTO session_shards (session_id, shard, title, created_at)
+                    VALUES (?, ?, ?, ?)
+                ''', [(session_id, index, title, created_at) for session_id, title, created_at in rows])
+                added += catalog.total_changes - before
+        if added:
+            print(f"Shard catalog: {added} sessions catalogued")
+        return added
+
+    def catalog_counts(self) -> Dict[int, int]:
+        """Sessions per shard according to the catalog"""
+        if not self.sharded:
+            return {}
+        with sqlite3.connect(self.catalog_path) as conn:
+            return dict(conn.execute('SELECT shard, COUNT(*) FROM session_shards GROUP BY shard').fetchall())
+
+    # --- rebalancing ------------------------------------------------------
+
+    def move_session(self, session_id: str, source: int, target: int) -> bool:
+        """
+        Move one session's rows (hot or archived) between shards, online
+
+        The source shard is write-locked for the duration, so no turn can
+        land there after the copy. Rows keep their ids, and the
+        target's allocator is moved past them so the session's next turns
+        still sort last. The order is copy, catalog, delete: a crash leaves a duplicate, never a loss, and the
+        next rebalance removes the stale copy.
+
+        Returns:
+            True if the session was moved
+        """
+        source_conn = sqlite3.connect(self.paths[source], isolation_level=None)
+        try:
+            source_cursor = source_conn.cursor()
+            source_cursor.execute('BEGIN IMMEDIATE')
+            session = source_cursor.execute('''
+                SELECT session_id, created_at, last_activity, title, metadata
+                FROM sessions WHERE session_id = ?
+            ''', (session_id,)).fetchone()
+            archived = source_cursor.execute('''
+                SELECT session_id, title, created_at, last_activity, turn_count, archive_path, archived_at,
+                       metadata, stats_kept
+                FROM archived_sessions WHERE session_id = ?
+            ''', (session_id,)).fetchone()
+            if session is None and archived is None:
+                source_cursor.execute('ROLLBACK')
+                return False
+            turns = source_cursor.execute('''
+                SELECT id, session_id, user_input, bot_response, timestamp, audio_file_path, metadata
+                FROM conversations WHERE session_id = ? ORDER BY id
+            ''', (session_id,)).fetchall()
+
+            with sqlite3.connect(self.paths[target]) as target_conn:
+                if session:
+                    target_conn.execute('''
+                        INSERT OR REPLACE INTO sessions (session_id, created_at, last_activity, title, metadata)
+                        VALUES (?, ?, ?, ?, ?)
+                    ''', session)
+                if archived:
+                    target_conn.execute('''
+                        INSERT OR REPLACE INTO archived_sessions
+                        (session_id, title, created_at, last_activity, turn_count, archive_path, archived_at,
+                         metadata, stats_kept)
+                        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+                    ''', archived)
+                    # Its turns are still counted; totals are summed over shards, but the
+                    # per-session count is read from the session's shard
+                    stats = source_cursor.execute('''
+                        SELECT session_id, turns, bot_chars FROM stats_sessions WHERE session_id = ?
+                    ''', (session_id,)).fetchone()
+                    if stats and session is None:
+                        target_conn.execute('''
+                            INSERT OR REPLACE INTO stats_sessions (session_id, turns, bot_chars)
+                            VALUES (?, ?, ?)
+                        ''', stats)
+                target_conn.executemany('''
+                    INSERT OR IGNORE INTO conversations
+                    (id, session_id, user_input, bot_response, timestamp, audio_file_path, metadata)
+                    VALUES (?, ?, ?, ?, ?, ?, ?)
+                ''', turns)
+                if turns:
+                    reserve_ids(target_conn.cursor(), turns[-1][0])
+
+            title = session[3] if session else archived[1]
+            self.register(session_id, target, title)
+
+            source_cursor.execute('DELETE FROM conversations WHERE session_id = ?', (session_id,))
+            source_cursor.execute('DELETE FROM sessions WHERE session_id = ?', (session_id,))
+            source_cursor.execute('DELETE FROM archived_sessions WHERE session_id = ?', (session_id,))
+            source_cursor.execute('DELETE FROM stats_sessions WHERE session_id = ?', (session_id,))
+            source_cursor.execute('COMMIT')
+            return True
+
+        except Exception:
+            if source_conn.in_transaction:
+                source_conn.execute('ROLLBACK')
+            raise
+        finally:
+            source_conn.close()
+
+    def _drop_copy(self, session_id: str, shard: int):
+        """Delete a stale duplicate left by an interrupted move"""
+        with sqlite3.connect(self.paths[shard]) as conn:
+            conn.execute('DELETE FROM conversations WHERE session_id = ?', (session_id,))
+            conn.execute('DELETE FROM sessions WHERE session_id = ?', (session_id,))
+            conn.execute('DELETE FROM archived_sessions WHERE session_id = ?', (session_id,))
+            conn.execute('DELETE FROM stats_sessions WHERE session_id = ?', (session_id,))
+
+    def _iter_shard_sessions(self, shard: int, batch_size: int = 500) -> Iterator[str]:
+        """Session ids stored in a shard, in short keyset-paginated reads"""
+        last = ''
+        while True:
+            with sqlite3.connect(self.paths[shard]) as conn:
+                rows = conn.execute('''
+                    SELECT session_id FROM (
+                        SELECT session_id FROM sessions WHERE session_id > ?
+                        UNION
+                        SELECT session_id FROM archived_sessions WHERE session_id > ?
+                    ) ORDER BY session_id LIMIT ?
+                ''', (last, last, batch_size)).fetchall()
+            for (session_id,) in rows:
+                yield session_id
+            if len(rows) < batch_size:
+                return
+            last = rows[-1][0]
+
+    def rebalance(self, limit: int = None, dry_run: bool = False,
+                  progress: RebalanceProgress = None) -> Dict[str, int]:
+        """
+        Move sessions that are not on their placement shard
+
+        Needed after changing DATABASE_SHARDS (and to spread a former
+        single-file database). Runs while the bot is serving: each move
+        locks one session's source shard briefly, and moves are paced by
+        Config.SHARD_REBALANCE_PAUSE.
+
+        Args:
+            limit: Maximum sessions to move in this run
+            dry_run: Only count sessions that would move
+            progress: Optional progress callback
+
+        Returns:
+            Dictionary with checked, moved, misplaced, duplicates_removed and catalog_fixed
+        """
+        result = {'checked': 0, 'moved': 0, 'misplaced': 0, 'duplicates_removed': 0, 'catalog_fixed': 0}
+        if not self.sharded:
+            return result
+        self.sync_catalog()
+
+        for shard in range(len(self.paths)):
+            if not os.path.exists(self.paths[shard]):
+                continue
+            for session_id in self._iter_shard_sessions(shard):
+                result['checked'] += 1
+                with sqlite3.connect(self.catalog_path) as conn:
+                    row = conn.execute('SELECT shard FROM session_shards WHERE session_id = ?',
+                                       (session_id,)).fetchone()
+                catalogued = row[0] if row else None
+                if catalogued != shard:
+                    if catalogued is not None and self._probe_one(session_id, catalogued):
+                        # Left behind by an interrupted move
+                        if not dry_run:
+                            self._drop_copy(session_id, shard)
+                        result['duplicates_removed'] += 1
+                        continue
+                    if not dry_run:
+                        self.register(session_id, shard)
+                    result['catalog_fixed'] += 1
+
+                target = self.placement(session_id)
+                if target == shard:
+                    continue
+                result['misplaced'] += 1
+                if dry_run or (limit is not None and result['moved'] >= limit):
+                    continue
+                if self.move_session(session_id, shard, target):
+                    result['moved'] += 1
+                    if progress:
+                        progress(result['checked'], result['moved'])
+                    time.sleep(Config.SHARD_REBALANCE_PAUSE)
+        return result
+
+    def _probe_one(self, session_id: str, shard: int) -> bool:
+        if shard >= len(self.paths) or not os.path.exists(self.paths[shard]):
+            return False
+        with sqlite3.connect(self.paths[shard]) as conn:
+            return conn.execute('''
+                SELECT 1 FROM sessions WHERE session_id = ?
+                UNION ALL
+                SELECT 1 FROM archived_sessions WHERE session_id = ?
+            ''', (session_id, session_id)).fetchone() is not None
+
+
+_shards: Optional[ConversationShards] = None
+_shards_lock = threading.Lock()
+
+
+def get_conversation_shards() -> ConversationShards:
+    """Get the process-wide shard map"""
+    global _shards
+    with _shards_lock:
+        if _shards is None:
+            _shards = ConversationShards()
+        return _shards
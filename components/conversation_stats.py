@@ -0,0 +1,277 @@
+# Conversation statistics
+# Rollup counters kept up to date by SQLite triggers
+import sqlite3
+from collections import Counter
+from datetime import datetime, timedelta
+from typing import List, Dict, Tuple
+
+from conversation_shards import ConversationShards
+
+# Rollup tables: one global row, one row per day, one row per session
+STATS_TABLES = [
+    '''
+    CREATE TABLE IF NOT EXISTS stats_totals (
+        id INTEGER PRIMARY KEY CHECK (id = 1),
+        total_conversations INTEGER NOT NULL DEFAULT 0,
+        total_sessions INTEGER NOT NULL DEFAULT 0,
+        user_chars INTEGER NOT NULL DEFAULT 0,
+        bot_chars INTEGER NOT NULL DEFAULT 0
+    )
+    ''',
+    '''
+    CREATE TABLE IF NOT EXISTS stats_daily (
+        day TEXT PRIMARY KEY,
+        turns INTEGER NOT NULL DEFAULT 0,
+        user_chars INTEGER NOT NULL DEFAULT 0,
+        bot_chars INTEGER NOT NULL DEFAULT 0
+    )
+    ''',
+    '''
+    CREATE TABLE IF NOT EXISTS stats_sessions (
+        session_id TEXT PRIMARY KEY,
+        turns INTEGER NOT NULL DEFAULT 0,
+        bot_chars INTEGER NOT NULL DEFAULT 0
+    )
+    ''',
+    # Holds a row while archiving or rehydrating moves rows out of or back
+    # into the hot tables; the conversations still exist, so nothing is counted
+    '''
+    CREATE TABLE IF NOT EXISTS stats_paused (
+        id INTEGER PRIMARY KEY CHECK (id = 1)
+    )
+    ''',
+]
+
+# Triggers keep the rollups in sync with every write to the source tables
+STATS_TRIGGERS = [
+    '''
+    CREATE TRIGGER IF NOT EXISTS stats_conversations_insert
+    AFTER INSERT ON conversations
+    WHEN NOT EXISTS (SELECT 1 FROM stats_paused)
+    BEGIN
+        UPDATE stats_totals
+        SET total_conversations = total_conversations + 1,
+            user_chars = user_chars + LENGTH(NEW.user_input),
+            bot_chars = bot_chars + LENGTH(NEW.bot_response)
+        WHERE id = 1;
+
+        INSERT INTO stats_daily (day, turns, user_chars, bot_chars)
+        VALUES (DATE(NEW.timestamp), 1, LENGTH(NEW.user_input), LENGTH(NEW.bot_response))
+        ON CONFLICT(day) DO UPDATE SET
+            turns = turns + 1,
+            user_chars = user_chars + excluded.user_chars,
+            bot_chars = bot_chars + excluded.bot_chars;
+
+        INSERT INTO stats_sessions (session_id, turns, bot_chars)
+        VALUES (NEW.session_id, 1, LENGTH(NEW.bot_response))
+        ON CONFLICT(session_id) DO UPDATE SET
+            turns = turns + 1,
+            bot_chars = bot_chars + excluded.bot_chars;
+    END
+    ''',
+    '''
+    CREATE TRIGGER IF NOT EXISTS stats_conversations_delete
+    AFTER DELETE ON conversations
+    WHEN NOT EXISTS (SELECT 1 FROM stats_paused)
+    BEGIN
+        UPDATE stats_totals
+        SET total_conversations = total_conversations - 1,
+            user_chars = user_chars - LENGTH(OLD.user_input),
+            bot_chars = bot_chars - LENGTH(OLD.bot_response)
+        WHERE id = 1;
+
+        UPDATE stats_daily
+        SET turns = turns - 1,
+            user_chars = user_chars - LENGTH(OLD.user_input),
+            bot_chars = bot_chars - LENGTH(OLD.bot_response)
+        WHERE day = DATE(OLD.timestamp);
+
+        UPDATE stats_sessions
+        SET turns = turns - 1,
+            bot_chars = bot_chars - LENGTH(OLD.bot_response)
+        WHERE session_id = OLD.session_id;
+    END
+    ''',
+    '''
+    CREATE TRIGGER IF NOT EXISTS stats_sessions_insert
+    AFTER INSERT ON sessions
+    WHEN NOT EXISTS (SELECT 1 FROM stats_paused)
+    BEGIN
+        UPDATE stats_totals SET total_sessions = total_sessions + 1 WHERE id = 1;
+    END
+    ''',
+    '''
+    CREATE TRIGGER IF NOT EXISTS stats_sessions_delete
+    AFTER DELETE ON sessions
+    WHEN NOT EXISTS (SELECT 1 FROM stats_paused)
+    BEGIN
+        UPDATE stats_totals SET total_sessions = total_sessions - 1 WHERE id = 1;
+        DELETE FROM stats_sessions WHERE session_id = OLD.session_id;
+    END
+    ''',
+]
+
+
+def install_stats_schema(cursor: sqlite3.Cursor):
+    """
+    Create rollup tables and triggers, backfilling from existing rows
+
+    The backfill runs once, in the same transaction that creates the
+    triggers, so no write can be counted twice or missed.
+
+    Args:
+        cursor: Cursor on a connection where conversations/sessions exist
+    """
+    for statement in STATS_TABLES:
+        cursor.execute(statement)
+
+    cursor.execute('SELECT 1 FROM stats_totals WHERE id = 1')
+    if cursor.fetchone() is None:
+        cursor.execute('''
+            INSERT INTO stats_totals (id, total_conversations, total_sessions, user_chars, bot_chars)
+            SELECT 1,
+                   (SELECT COUNT(*) FROM conversations),
+                   (SELECT COUNT(*) FROM sessions),
+                   (SELECT COALESCE(SUM(LENGTH(user_input)), 0) FROM conversations),
+                   (SELECT COALESCE(SUM(LENGTH(bot_response)), 0) FROM conversations)
+        ''')
+        cursor.execute('DELETE FROM stats_daily')
+        cursor.execute('''
+            INSERT INTO stats_daily (day, turns, user_chars, bot_chars)
+            SELECT DATE(timestamp), COUNT(*), SUM(LENGTH(user_input)), SUM(LENGTH(bot_response))
+            FROM conversations
+            GROUP BY DATE(timestamp)
+        ''')
+        cursor.execute('DELETE FROM stats_sessions')
+        cursor.execute('''
+            INSERT INTO stats_sessions (session_id, turns, bot_chars)
+            SELECT session_id, COUNT(*), SUM(LENGTH(bot_response))
+            FROM conversations
+            GROUP BY session_id
+        ''')
+        print("Conversation statistics backfilled")
+
+    # Triggers created before stats_paused existed are replaced
+    cursor.execute('''
+        SELECT name FROM sqlite_master
+        WHERE type = 'trigger' AND name LIKE 'stats_%' AND sql NOT LIKE '%stats_paused%'
+    ''')
+    for (name,) in cursor.fetchall():
+        cursor.execute(f'DROP TRIGGER {name}')
+    for statement in STATS_TRIGGERS:
+        cursor.execute(statement)
+
+
+def pause_stats(cursor: sqlite3.Cursor):
+    """
+    Stop the rollup triggers until resume_stats, in the cursor's transaction
+
+    Args:
+        cursor: Cursor with a write transaction open (other writers wait for it)
+    """
+    cursor.execute('INSERT OR IGNORE INTO stats_paused (id) VALUES (1)')
+
+
+def resume_stats(cursor: sqlite3.Cursor):
+    cursor.execute('DELETE FROM stats_paused')
+
+
+class ConversationStats:
+    """Read side of the conversation statistics rollups (summed over shards)"""
+
+    def __init__(self, shards: ConversationShards):
+        """
+        Initialize statistics reader
+
+        Args:
+            shards: Conversation databases, each holding its own rollup tables
+        """
+        self.shards = shards
+
+    def get_totals(self) -> Dict[str, float]:
+        """
+        Get global counters and today's turn count
+
+        Returns:
+            Dictionary with conversation statistics
+        """
+        total_conversations = total_sessions = user_chars = bot_chars = today = 0
+        for path in self.shards.paths:
+            with sqlite3.connect(path) as conn:
+                cursor = conn.cursor()
+                cursor.execute('''
+                    SELECT total_conversations, total_sessions, user_chars, bot_chars
+                    FROM stats_totals
+                    WHERE id = 1
+                ''')
+                row = cursor.fetchone() or (0, 0, 0, 0)
+                total_conversations += row[0]
+                total_sessions += row[1]
+                user_chars += row[2]
+                bot_chars += row[3]
+
+                cursor.execute("SELECT turns FROM stats_daily WHERE day = DATE('now')")
+                shard_today = cursor.fetchone()
+                today += shard_today[0] if shard_today else 0
+
+        return {
+            'total_conversations': total_conversations,
+            'total_sessions': total_sessions,
+            'conversations_today': today,
+            'avg_user_length': user_chars / total_conversations if total_conversations else 0.0,
+            'avg_reply_length': bot_chars / total_conversations if total_conversations else 0.0,
+        }
+
+    def get_daily_turns(self, days: int = 7) -> List[Tuple[str, int]]:
+        """
+        Get turn counts for the most recent days
+
+        Args:
+            days: Number of days to include, today included
+
+        Returns:
+            List of tuples (day, turns) in chronological order, zero-filled
+        """
+        start = (datetime.utcnow() - timedelta(days=days - 1)).strftime('%Y-%m-%d')
+
+        counts = Counter()
+        for path in self.shards.paths:
+            with sqlite3.connect(path) as conn:
+                cursor = conn.cursor()
+                cursor.execute('''
+                    SELECT day, turns FROM stats_daily
+                    WHERE day >= ?
+                ''', (start,))
+                counts.update(dict(cursor.fetchall()))
+
+        result = []
+        for offset in range(days - 1, -1, -1):
+            day = (datetime.utcnow() - timedelta(days=offset)).strftime('%Y-%m-%d')
+            result.append((day, counts.get(day, 0)))
+        return result
+
+    def get_session_turn_counts(self, session_ids: List[str]) -> Dict[str, int]:
+        """
+        Get the number of turns stored for each session
+
+        Args:
+            session_ids: Sessions to look up
+
+        Returns:
+            Dictionary mapping session_id to turn count (missing sessions are 0)
+        """
+        if not session_ids:
+            return {}
+
+        counts = {}
+        for shard, group in self.shards.group(session_ids, lambda session_id: session_id).items():
+            placeholders = ','.join('?' for _ in group)
+            with sqlite3.connect(self.shards.paths[shard]) as conn:
+                cursor = conn.cursor()
+                cursor.execute(f'''
+                    SELECT session_id, turns FROM stats_sessions
+                    WHERE session_id IN ({placeholders})
+                ''', group)
+                counts.update(cursor.fetchall())
+
+        return {session_id: counts.get(session_id, 0) for session_id in session_ids}
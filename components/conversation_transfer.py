@@ -0,0 +1,331 @@
+# Conversation export / import
+# Streaming JSONL and Parquet transfer with constant memory use
+import gzip
+import json
+import sqlite3
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+    PARQUET_AVAILABLE = True
+except ImportError:
+    PARQUET_AVAILABLE = False
+    pa = None
+    pq = None
+
+from config import Config
+from conversation_shards import ConversationShards, allocate_ids, get_conversation_shards, id_allocator, reserve_ids
+
+# Callback receiving (rows_done, rows_total); total may be None when unknown
+ProgressCallback = Callable[[int, Optional[int]], None]
+
+CONVERSATION_COLUMNS = ['id', 'session_id', 'user_input', 'bot_response',
+                        'timestamp', 'audio_file_path', 'metadata']
+SESSION_COLUMNS = ['session_id', 'created_at', 'last_activity', 'title', 'metadata']
+
+
+def _open_text(path: str, mode: str):
+    """Open plain or gzip-compressed JSONL"""
+    if path.endswith(".gz"):
+        return gzip.open(path, mode + "t", encoding="utf-8")
+    return open(path, mode, encoding="utf-8")
+
+
+def _parquet_schema():
+    """Flat schema: one row per turn, session columns denormalized"""
+    return pa.schema([
+        ('id', pa.int64()),
+        ('session_id', pa.string()),
+        ('user_input', pa.string()),
+        ('bot_response', pa.string()),
+        ('timestamp', pa.string()),
+        ('audio_file_path', pa.string()),
+        ('metadata', pa.string()),
+        ('session_title', pa.string()),
+        ('session_created_at', pa.string()),
+    ])
+
+
+class ConversationTransfer:
+    """Bulk export and import of conversations"""
+
+    def __init__(self, shards: ConversationShards = None, batch_size: int = None):
+        """
+        Initialize transfer
+
+        Args:
+            shards: Conversation databases (defaults to the process-wide shard map)
+            batch_size: Rows per fetchmany/executemany (defaults to Config.TRANSFER_BATCH_SIZE)
+        """
+        self.shards = shards or get_conversation_shards()
+        self.batch_size = batch_size or Config.TRANSFER_BATCH_SIZE
+
+    def _count(self, table: str) -> Optional[int]:
+        """Row count from the statistics rollups (O(1) per shard)"""
+        column = 'total_conversations' if table == 'conversations' else 'total_sessions'
+        total = 0
+        try:
+            for path in self.shards.paths:
+                with sqlite3.connect(path) as conn:
+                    row = conn.execute(f'SELECT {column} FROM stats_totals WHERE id = 1').fetchone()
+                    if row is None:
+                        return None
+                    total += row[0]
+            return total
+        except sqlite3.Error:
+            return None
+
+    def _iter_batches(self, path: str, sql: str, key_index: int, start_key) -> Iterator[List[Tuple]]:
+        """
+        Stream a table in keyset-paginated chunks
+
+        Each chunk is a short read consumed with fetchmany, so memory stays
+        bounded and no read lock is held across the whole export.
+
+        Args:
+            path: Shard database
+            sql: SELECT with a `{key} > ?` predicate, ORDER BY key and LIMIT ?
+            key_index: Position of the key column in each row
+            start_key: Value below every key in the table
+        """
+        last_key = start_key
+        chunk_rows = self.batch_size * 10
+        while True:
+            with sqlite3.connect(path) as conn:
+                cursor = conn.cursor()
+                cursor.execute(sql, (last_key, chunk_rows))
+                fetched = 0
+                while True:
+                    rows = cursor.fetchmany(self.batch_size)
+                    if not rows:
+                        break
+                    fetched += len(rows)
+                    last_key = rows[-1][key_index]
+                    yield rows
+            if fetched < chunk_rows:
+                return
+
+    def _iter_sessions(self) -> Iterator[Tuple[str, List[Tuple]]]:
+        """Yield (shard path, rows) batches, one shard after the other"""
+        for path in self.shards.paths:
+            for rows in self._iter_batches(path, '''
+                SELECT session_id, created_at, last_activity, title, metadata
+                FROM sessions
+                WHERE session_id > ?
+                ORDER BY session_id
+                LIMIT ?
+            ''', 0, ''):
+                yield path, rows
+
+    def _iter_conversations(self) -> Iterator[Tuple[str, List[Tuple]]]:
+        """Yield (shard path, rows) batches, one shard after the other"""
+        for path in self.shards.paths:
+            for rows in self._iter_batches(path, '''
+                SELECT id, session_id, user_input, bot_response, timestamp, audio_file_path, metadata
+                FROM conversations
+                WHERE id > ?
+                ORDER BY id
+                LIMIT ?
+            ''', 0, 0):
+                yield path, rows
+
+    def export_jsonl(self, path: str, progress: ProgressCallback = None) -> int:
+        """
+        Export sessions then turns as JSONL records (gzip if path ends in .gz)
+
+        Args:
+            path: Output file
+            progress: Optional progress callback
+
+        Returns:
+            Number of turns exported
+        """
+        total = self._count('conversations')
+        exported = 0
+        with _open_text(path, "w") as f:
+            for _, rows in self._iter_sessions():
+                for row in rows:
+                    record = dict(zip(SESSION_COLUMNS, row), type='session')
+                    f.write(json.dumps(record, ensure_ascii=False) + "\n")
+            for _, rows in self._iter_conversations():
+                for row in rows:
+                    record = dict(zip(CONVERSATION_COLUMNS, row), type='turn')
+                    f.write(json.dumps(record, ensure_ascii=False) + "\n")
+                exported += len(rows)
+                if progress:
+                    progress(exported, total)
+        return exported
+
+    def export_parquet(self, path: str, progress: ProgressCallback = None) -> int:
+        """
+        Export turns as Parquet, one row group per batch
+
+        Args:
+            path: Output file
+            progress: Optional progress callback
+
+        Returns:
+            Number of turns exported
+        """
+        if not PARQUET_AVAILABLE:
+            raise RuntimeError("pyarrow is required for Parquet export (pip install pyarrow)")
+
+        total = self._count('conversations')
+        schema = _parquet_schema()
+        exported = 0
+        with pq.ParquetWriter(path, schema, compression="zstd") as writer:
+            for shard_path, rows in self._iter_conversations():
+                session_ids = sorted({row[1] for row in rows})
+                placeholders = ','.join('?' for _ in session_ids)
+                with sqlite3.connect(shard_path) as conn:
+                    sessions = {
+                        session_id: (title, created_at)
+                        for session_id, title, created_at in conn.execute(f'''
+                            SELECT session_id, title, created_at FROM sessions
+                            WHERE session_id IN ({placeholders})
+                        ''', session_ids)
+                    }
+                columns = list(zip(*rows))
+                session_info = [sessions.get(row[1], (None, None)) for row in rows]
+                arrays = [pa.array(column, type=field.type) for column, field in zip(columns, schema)]
+                arrays.append(pa.array([info[0] for info in session_info], type=pa.string()))
+                arrays.append(pa.array([info[1] for info in session_info], type=pa.string()))
+                writer.write_table(pa.Table.from_arrays(arrays, schema=schema))
+                exported += len(rows)
+                if progress:
+                    progress(exported, total)
+        return exported
+
+    def import_file(self, path: str, keep_ids: bool = False, progress: ProgressCallback = None) -> int:
+        """
+        Import a JSONL (.jsonl / .jsonl.gz) or Parquet export
+
+        Turns are inserted with executemany in transactions of
+        Config.TRANSFER_TRANSACTION_ROWS rows. Sessions that already exist
+        are kept; their last_activity is advanced if the import is newer.
+        New sessions are placed on shards like live ones.
+
+        Args:
+            path: Input file
+            keep_ids: Preserve turn ids (skip turns whose id already exists)
+            progress: Optional progress callback
+
+        Returns:
+            Number of turns imported
+        """
+        if path.endswith(".parquet"):
+            batches = self._read_parquet(path)
+        else:
+            batches = self._read_jsonl(path)
+
+        if keep_ids or self.shards.sharded:
+            # Sharded: new ids come from each shard's range rather than AUTOINCREMENT
+            turn_sql = f'''
+                INSERT {'OR IGNORE' if keep_ids else ''} INTO conversations
+                (id, session_id, user_input, bot_response, timestamp, audio_file_path, metadata)
+                VALUES (?, ?, ?, ?, ?, ?, ?)
+            '''
+        else:
+            turn_sql = '''
+                INSERT INTO conversations
+                (session_id, user_input, bot_response, timestamp, audio_file_path, metadata)
+                VALUES (?, ?, ?, ?, ?, ?)
+            '''
+        session_sql = '''
+            INSERT INTO sessions (session_id, created_at, last_activity, title, metadata)
+            VALUES (?, ?, ?, ?, ?)
+            ON CONFLICT(session_id) DO UPDATE SET
+                last_activity = MAX(last_activity, excluded.last_activity)
+        '''
+
+        imported = 0
+        pending = 0
+        connections: Dict[int, sqlite3.Connection] = {}
+
+        def cursor_for(shard: int) -> sqlite3.Cursor:
+            if shard not in connections:
+                connections[shard] = sqlite3.connect(self.shards.paths[shard])
+            return connections[shard].cursor()
+
+        try:
+            for sessions, turns in batches:
+                if sessions:
+                    self.shards.register_new([(row[0], row[3], row[1]) for row in sessions])
+                    for shard, group in self.shards.group(sessions, lambda row: row[0]).items():
+                        cursor_for(shard).executemany(session_sql, group)
+                for shard, group in self.shards.group(turns, lambda row: row[1]).items():
+                    cursor = cursor_for(shard)
+                    if keep_ids and self.shards.sharded:
+                        # Move allocators past the kept ids before they land: the one that
+                        # would hand out the same ids, and the target's, so later turns sort last
+                        highest: Dict[int, int] = {}
+                        for turn in group:
+                            owner = id_allocator(turn[0])
+                            highest[owner] = max(highest.get(owner, 0), turn[0])
+                        highest[shard] = max(highest.values())
+                        for owner, max_id in highest.items():
+                            if owner < len(self.shards.paths):
+                                reserve_ids(cursor_for(owner), max_id)
+                    elif self.shards.sharded:
+                        ids = allocate_ids(cursor, len(group))
+                        group = [(conversation_id,) + turn[1:] for conversation_id, turn in zip(ids, group)]
+                    elif not keep_ids:
+                        group = [turn[1:] for turn in group]
+                    cursor.executemany(turn_sql, group)
+                    imported += cursor.rowcount
+                pending += len(turns)
+                if pending >= Config.TRANSFER_TRANSACTION_ROWS:
+                    for conn in connections.values():
+                        conn.commit()
+                    pending = 0
+                    if progress:
+                        progress(imported, None)
+            for conn in connections.values():
+                conn.commit()
+            if progress:
+                progress(imported, imported)
+        except Exception:
+            for conn in connections.values():
+                conn.rollback()
+            raise
+        finally:
+            for conn in connections.values():
+                conn.close()
+
+        return imported
+
+    def _read_jsonl(self, path: str) -> Iterator[Tuple[List[Tuple], List[Tuple]]]:
+        """Yield (sessions, turns) batches from a JSONL export"""
+        sessions, turns = [], []
+        with _open_text(path, "r") as f:
+            for line in f:
+                if not line.strip():
+                    continue
+                record = json.loads(line)
+                if record.get('type') == 'session':
+                    sessions.append(tuple(record.get(column) for column in SESSION_COLUMNS))
+                else:
+                    turns.append(tuple(record.get(column) for column in CONVERSATION_COLUMNS))
+                if len(sessions) + len(turns) >= self.batch_size:
+                    yield sessions, turns
+                    sessions, turns = [], []
+        if sessions or turns:
+            yield sessions, turns
+
+    def _read_parquet(self, path: str) -> Iterator[Tuple[List[Tuple], List[Tuple]]]:
+        """Yield (sessions, turns) batches from a Parquet export"""
+        if not PARQUET_AVAILABLE:
+            raise RuntimeError("pyarrow is required for Parquet import (pip install pyarrow)")
+
+        parquet_file = pq.ParquetFile(path)
+        for batch in parquet_file.iter_batches(batch_size=self.batch_size):
+            data = batch.to_pydict()
+            turns = list(zip(*(data[column] for column in CONVERSATION_COLUMNS)))
+            sessions = {}
+            for session_id, title, created_at, timestamp in zip(
+                    data['session_id'], data['session_title'], data['session_created_at'], data['timestamp']):
+                previous = sessions.get(session_id)
+                last_activity = max(timestamp, previous[2]) if previous else timestamp
+                sessions[session_id] = (session_id, created_at or timestamp, last_activity, title, None)
+            yield list(sessions.values()), turns
@@ -0,0 +1,350 @@
+# Inference scheduler
+# Process pools for Whisper (STT) and Coqui (TTS) with priorities and backpressure
+import heapq
+import itertools
+import multiprocessing
+import os
+import threading
+from concurrent.futures import Future, ProcessPoolExecutor
+from multiprocessing.shared_memory import SharedMemory
+from typing import Dict, Optional, Tuple
+
+import numpy as np
+
+from config import Config
+from load_controller import get_load_controller
+from profiler import get_profiler
+
+# Lower value runs first
+PRIORITY_INTERACTIVE = 0
+PRIORITY_BATCH = 10
+
+
+class SchedulerBusy(Exception):
+    """Raised when a request is rejected by admission control"""
+
+
+# ---------------------------------------------------------------------------
+# Worker process side
+# ---------------------------------------------------------------------------
+
+_worker_model = None
+
+
+def _init_worker(kind: str, threads: int, model_reports=None):
+    """
+    Pin thread counts, then load the model once per worker process
+
+    Model load sizes measured here are sent back on model_reports, since
+    the parent's resource panel cannot see this process's loads.
+    """
+    global _worker_model
+    if model_reports is not None:
+        get_profiler().model_reports = model_reports
+    for variable in ('OMP_NUM_THREADS', 'MKL_NUM_THREADS', 'OPENBLAS_NUM_THREADS'):
+        os.environ[variable] = str(threads)
+    try:
+        import torch
+        torch.set_num_threads(threads)
+        torch.set_num_interop_threads(1)
+    except Exception:
+        pass  # faster-whisper without torch, or interop threads already set
+
+    if kind == 'stt':
+        from speech_to_text import SpeechToText
+        _worker_model = SpeechToText()
+    else:
+        from text_to_speach import TextToSpeech
+        _worker_model = TextToSpeech()
+
+
+def _probe_worker() -> bool:
+    """Report whether this worker's model loaded"""
+    if _worker_model is None:
+        return False
+    if hasattr(_worker_model, 'is_available'):
+        return _worker_model.is_available()
+    return _worker_model.available
+
+
+def _transcribe_worker(shm_name: str, shape: Tuple[int, ...], dtype: str, sample_rate: int,
+                       model_name: Optional[str] = None, segments: bool = False):
+    """Transcribe audio read in place from a shared-memory segment (text, or timed segments)"""
+    shm = SharedMemory(name=shm_name)
+    try:
+        audio = np.ndarray(shape, dtype=dtype, buffer=shm.buf)
+        try:
+            if segments:
+                return _worker_model.transcribe_segments(audio, sample_rate, model_name=model_name)
+            return _worker_model.transcribe_audio(audio, sample_rate, model_name=model_name)
+        finally:
+            del audio
+    finally:
+        shm.close()
+
+
+def _synthesize_worker(text: str) -> Optional[Tuple[str, Tuple[int, ...], int]]:
+    """Synthesize into a new shared-memory segment owned by the caller"""
+    result = _worker_model.synthesize(text)
+    if result is None:
+        return None
+    samples, sample_rate = result
+    shm = SharedMemory(create=True, size=max(samples.nbytes, 1))
+    try:
+        view = np.ndarray(samples.shape, dtype=np.float32, buffer=shm.buf)
+        view[:] = samples
+        del view
+        return shm.name, samples.shape, sample_rate
+    finally:
+        shm.close()
+
+
+# ---------------------------------------------------------------------------
+# Parent process side
+# ---------------------------------------------------------------------------
+
+class InferenceScheduler:
+    """Priority-ordered dispatch of model calls to a dedicated process pool"""
+
+    def __init__(self, kind: str, workers: int, threads_per_worker: int, max_queue: int):
+        """
+        Start worker processes
+
+        Args:
+            kind: 'stt' or 'tts'
+            workers: Number of worker processes (each loads its own model)
+            threads_per_worker: Intra-op threads pinned in each worker
+            max_queue: Pending requests admitted before rejecting
+        """
+        self.kind = kind
+        self.workers = workers
+        self.max_queue = max_queue
+        self.available = False
+
+        context = multiprocessing.get_context('spawn')
+        self._model_reports = context.Queue()
+        self._pool = ProcessPoolExecutor(
+            max_workers=workers,
+            mp_context=context,
+            initializer=_init_worker,
+            initargs=(kind, threads_per_worker, self._model_reports)
+        )
+        self._queue = []
+        self._sequence = itertools.count()
+        self._condition = threading.Condition()
+        self._slots = threading.Semaphore(workers)
+        self._stats = {'submitted': 0, 'completed': 0, 'rejected': 0, 'in_flight': 0}
+
+        self._dispatcher = threading.Thread(target=self._dispatch, name=f"{kind}-dispatcher", daemon=True)
+        self._dispatcher.start()
+        threading.Thread(target=self._collect_model_memory, name=f"{kind}-model-memory", daemon=True).start()
+
+    def start(self) -> bool:
+        """
+        Load the models in every worker and check they are usable
+
+        Returns:
+            True if the workers' models are available
+        """
+        try:
+            probes = [self._pool.submit(_probe_worker) for _ in range(self.workers)]
+            self.available = all(probe.result() for probe in probes)
+        except Exception as e:
+            print(f"❌ {self.kind.upper()} workers failed to start: {e}")
+            self.available = False
+        print(f"{self.kind.upper()} scheduler: {self.workers} workers, available={self.available}")
+        return self.available
+
+    def queue_depth(self) -> int:
+        """Requests waiting for a worker"""
+        with self._condition:
+            return len(self._queue)
+
+    def stats(self) -> Dict[str, int]:
+        """Counters for monitoring"""
+        with self._condition:
+            return dict(self._stats, queued=len(self._queue))
+
+    def _submit(self, func, args: tuple, priority: int, cleanup=None) -> Future:
+        """
+        Queue a call, applying admission control
+
+        Batch work is only admitted while the queue is under half full,
+        which keeps headroom for interactive requests.
+        """
+        limit = self.max_queue if priority <= PRIORITY_INTERACTIVE else self.max_queue // 2
+        future = Future()
+        with self._condition:
+            if len(self._queue) >= limit:
+                self._stats['rejected'] += 1
+                if cleanup:
+                    cleanup()
+                raise SchedulerBusy(f"{self.kind} queue full ({len(self._queue)} pending)")
+            heapq.heappush(self._queue, (priority, next(self._sequence), func, args, future, cleanup))
+            self._stats['submitted'] += 1
+            self._condition.notify()
+        return future
+
+    def _dispatch(self):
+        """Hand the highest-priority request to the pool whenever a worker is free"""
+        while True:
+            self._slots.acquire()
+            with self._condition:
+                while not self._queue:
+                    self._condition.wait()
+                _, _, func, args, future, cleanup = heapq.heappop(self._queue)
+                self._stats['in_flight'] += 1
+
+            if not future.set_running_or_notify_cancel():
+                self._finish(None, cleanup)
+                continue
+
+            try:
+                pool_future = self._pool.submit(func, *args)
+            except Exception as e:
+                future.set_exception(e)
+                self._finish(None, cleanup)
+                continue
+
+            def on_done(done, future=future, cleanup=cleanup):
+                try:
+                    future.set_result(done.result())
+                except Exception as e:
+                    future.set_exception(e)
+                finally:
+                    self._finish(done, cleanup)
+
+            pool_future.add_done_callback(on_done)
+
+    def _collect_model_memory(self):
+        """Record the workers' model load sizes in this process's profiler"""
+        while True:
+            try:
+                pid, name, size = self._model_reports.get()
+            except (EOFError, OSError, ValueError):
+                return  # Queue closed at shutdown
+            get_profiler().record_model(f"{name} ({self.kind} worker {pid})", size)
+
+    def _finish(self, _, cleanup):
+        if cleanup:
+            cleanup()
+        with self._condition:
+            self._stats['in_flight'] -= 1
+            self._stats['completed'] += 1
+        self._slots.release()
+
+    def transcribe(self, audio: np.ndarray, sample_rate: int = None,
+                   priority: int = PRIORITY_INTERACTIVE, model_name: str = None,
+                   segments: bool = False) -> Future:
+        """
+        Queue a transcription; audio is passed through shared memory
+
+        Args:
+            audio: Audio samples
+            sample_rate: Sample rate (defaults to Config.SAMPLE_RATE)
+            priority: PRIORITY_INTERACTIVE or PRIORITY_BATCH
+            model_name: Whisper model size (defaults to Config.WHISPER_MODEL)
+            segments: Resolve to timed segments instead of text
+
+        Returns:
+            Future resolving to the transcribed text, or the list of
+            segments {'start', 'end', 'text'} (or None)
+        """
+        audio = np.ascontiguousarray(audio, dtype=np.float32)
+        shm = SharedMemory(create=True, size=max(audio.nbytes, 1))
+        view = np.ndarray(audio.shape, dtype=np.float32, buffer=shm.buf)
+        view[:] = audio
+        del view
+
+        def cleanup():
+            shm.close()
+            shm.unlink()
+
+        return self._submit(_transcribe_worker,
+                            (shm.name, audio.shape, 'float32', sample_rate or Config.SAMPLE_RATE,
+                             model_name, segments),
+                            priority, cleanup)
+
+    def transcribe_shared(self, shm_name: str, length: int, sample_rate: int = None,
+                          priority: int = PRIORITY_INTERACTIVE, model_name: str = None) -> Future:
+        """
+        Queue a transcription of float32 samples already in shared memory
+        
+        The segment stays owned by the caller (e.g. an AudioRingBuffer) and
+        must not be rewritten before the future resolves.
+        
+        Args:
+            shm_name: Shared-memory segment name
+            length: Samples from the start of the segment
+            sample_rate: Sample rate (defaults to Config.SAMPLE_RATE)
+            priority: PRIORITY_INTERACTIVE or PRIORITY_BATCH
+            model_name: Whisper model size (defaults to Config.WHISPER_MODEL)
+        
+        Returns:
+            Future resolving to the transcribed text (or None)
+        """
+        return self._submit(_transcribe_worker,
+                            (shm_name, (length,), 'float32', sample_rate or Config.SAMPLE_RATE,
+                             model_name),
+                            priority)
+
+    def synthesize(self, text: str, priority: int = PRIORITY_INTERACTIVE) -> Future:
+        """
+        Queue a synthesis
+
+        Args:
+            text: Text to synthesize
+            priority: PRIORITY_INTERACTIVE or PRIORITY_BATCH
+
+        Returns:
+            Future resolving to (float32 samples, sample rate) or None
+        """
+        outer = Future()
+        inner = self._submit(_synthesize_worker, (text,), priority)
+
+        def collect(done):
+            try:
+                result = done.result()
+                if result is None:
+                    outer.set_result(None)
+                    return
+                shm_name, shape, sample_rate = result
+                shm = SharedMemory(name=shm_name)
+                try:
+                    samples = np.ndarray(shape, dtype=np.float32, buffer=shm.buf).copy()
+                finally:
+                    shm.close()
+                    shm.unlink()
+                outer.set_result((samples, sample_rate))
+            except Exception as e:
+                outer.set_exception(e)
+
+        inner.add_done_callback(collect)
+        return outer
+
+    def shutdown(self):
+        self._pool.shutdown(wait=False, cancel_futures=True)
+
+
+_schedulers: Dict[str, InferenceScheduler] = {}
+_schedulers_lock = threading.Lock()
+
+
+def get_scheduler(kind: str) -> Optional[InferenceScheduler]:
+    """
+    Get the process-wide scheduler for 'stt' or 'tts'
+
+    Returns:
+        Started scheduler, or None if disabled in Config
+    """
+    if not Config.INFERENCE_SCHEDULER_ENABLED:
+        return None
+    with _schedulers_lock:
+        if kind not in _schedulers:
+            workers = Config.STT_WORKERS if kind == 'stt' else Config.TTS_WORKERS
+            scheduler = InferenceScheduler(kind, workers, Config.INFERENCE_THREADS_PER_WORKER,
+                                           Config.INFERENCE_MAX_QUEUE)
+            scheduler.start()
+            get_load_controller().add_queue_probe(scheduler.queue_depth)
+            _schedulers[kind] = scheduler
+        return _schedulers[kind]
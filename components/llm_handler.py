@@ -1,8 +1,24 @@
 # TEXT GENERATION
 # LLM Ollama (llama2:7b-chat)
-import ollama
-from typing import List, Dict, Optional
+import re
+import threading
+import time
+from typing import Callable, List, Dict, Optional
 from config import Config
+from ollama_pool import get_ollama_pool
+from model_catalog import PullJob, get_model_catalog
+from model_router import ROUTE_ESCALATED, ROUTE_SMALL, get_model_router
+from quality_monitor import GenerationAborted, QualityMonitor, record_generation
+from load_controller import get_load_controller
+
+# Characters kept in responses: kana, kanji, Japanese punctuation, whitespace
+NON_JAPANESE_PATTERN = re.compile(r'[^\u3040-\u309F\u30A0-\u30FF\u4E00-\u9FAF\u3000-\u303F\s。、！？「」（）]')
+
+# Returned by _clean_response when the generated text is unusable
+FALLBACK_RESPONSE = "申し訳ございませんが、適切な回答を生成できませんでした。もう一度お試しください。"
+
+# Returned by generate_response when generation failed with an error
+ERROR_RESPONSE = "申し訳ございませんが、エラーが発生しました。もう一度お試しください。"
 
 class LLMHandler:
     """LLM Handler using Ollama with Japanese-optimized model"""
@@ -11,66 +27,233 @@ class LLMHandler:
         """Initialize LLM handler"""
         self.model = Config.LLM_MODEL
         self.config = Config.get_ollama_config()
+        self.pool = get_ollama_pool()
+        self.catalog = get_model_catalog()
+        self.router = get_model_router()
+        self.last_route = None  # Route taken by the latest turn
+        self._small_model_notice_shown = False
         print(f"LLM Handler initialized with model: {self.model}")
     
-    def generate_response(self, user_input: str, conversation_history: List[Dict[str, str]] = None) -> Optional[str]:
+    def generate_response(self, user_input: str, conversation_history: List[Dict[str, str]] = None,
+                          long_term_context: List[Dict[str, str]] = None,
+                          on_token: Callable[[str], None] = None,
+                          on_reset: Callable[[], None] = None,
+                          session_id: str = None,
+                          cancel: threading.Event = None) -> Optional[str]:
         """
         Generate Japanese response using Ollama
         
         Args:
             user_input: User's input text in Japanese
             conversation_history: Previous conversation messages
+            long_term_context: Relevant exchanges from earlier sessions (optional)
+            on_token: Called with each streamed chunk (Japanese characters only);
+                      when given, the response is streamed from Ollama
+            on_reset: Called when chunks already sent to on_token belong to an
+                      attempt that was discarded (escalation or retry); the
+                      next attempt's chunks follow, so drop what was shown
+            session_id: Session identifier, keeps the session on one backend
+            cancel: When set, streaming stops and None is returned
             
         Returns:
-            Generated Japanese response or None if error
+            Generated Japanese response, or None if cancelled
         """
         try:
-            # Prepare messages for conversation
-            messages = []
-            
-            # Add system prompt
-            messages.append({
-                'role': 'system',
-                'content': Config.SYSTEM_PROMPT
-            })
-            
-            # Add conversation history if provided
-            if conversation_history:
-                for msg in conversation_history[-10:]:  # Keep last 10 messages for context
-                    messages.append(msg)
-            
-            # Add current user input
-            messages.append({
-                'role': 'user',
-                'content': user_input
-            })
+            messages = self._build_messages(user_input, conversation_history, long_term_context)
             
             print(f"Generating response for: {user_input}")
             
-            # Generate response using Ollama
-            response = ollama.chat(
-                model=self.model,
-                messages=messages,
-                options={
-                    'temperature': Config.LLM_TEMPERATURE,
-                    'num_predict': Config.LLM_MAX_TOKENS,
-                    'stop': ['<|endoftext|>', '\n\n\n'],  # Add stop sequences
-                    'top_p': 0.9,  # Limit token diversity
-                    'repeat_penalty': 1.1  # Reduce repetition
-                }
-            )
+            small_available = Config.LLM_ROUTING_ENABLED and self.catalog.has_model(self.router.small_model)
+            tier = get_load_controller().current()
+            model, route, reason = self.router.route(user_input, small_available, tier['small_llm_only'])
+            print(f"Route: {route} -> {model} ({reason})")
+            started = time.perf_counter()
             
-            generated_text = response['message']['content'].strip()
+            small_chars = large_chars = 0
+            options = self._generation_options()
+            retries = 0
+            aborts = 0
+            streamed = []  # Chunks the current attempt sent to on_token
+            stream = None
+            if on_token:
+                def stream(chunk: str):
+                    streamed.append(chunk)
+                    on_token(chunk)
+            while True:
+                if streamed:
+                    # A discarded attempt was already (partly) shown
+                    streamed.clear()
+                    if on_reset:
+                        on_reset()
+                # The last allowed attempt runs to completion unmonitored
+                monitored = (Config.QUALITY_MONITOR_ENABLED
+                             and (route == ROUTE_SMALL or retries < Config.QUALITY_MAX_RETRIES))
+                try:
+                    raw_text = self._chat(model, messages, session_id, stream, cancel, options, monitored)
+                except GenerationAborted as e:
+                    aborts += 1
+                    if route == ROUTE_SMALL:
+                        small_chars += e.chars
+                        model, route, reason = self.model, ROUTE_ESCALATED, f"small model aborted: {e.reason}"
+                    else:
+                        large_chars += e.chars
+                        retries += 1
+                        # Cooler sampling and an explicit reminder to answer in Japanese
+                        options = self._generation_options(Config.QUALITY_RETRY_TEMPERATURE)
+                        messages = messages[:-1] + [{'role': 'system', 'content': Config.QUALITY_RETRY_PROMPT},
+                                                    messages[-1]]
+                        reason = f"retry {retries}: {e.reason}"
+                    print(f"Route: {route} -> {model} ({reason})")
+                    continue
+                if raw_text is None:
+                    return None
+                generated_text = self._clean_response(raw_text)
+                if route == ROUTE_SMALL:
+                    small_chars += len(raw_text)
+                else:
+                    large_chars += len(raw_text)
+                
+                if route == ROUTE_SMALL and generated_text == FALLBACK_RESPONSE:
+                    # The small model's reply failed the quality check
+                    model, route, reason = self.model, ROUTE_ESCALATED, "small model reply rejected"
+                    print(f"Route: {route} -> {model} ({reason})")
+                    continue
+                break
             
-            # Clean up the response - remove any garbled text
-            generated_text = self._clean_response(generated_text)
+            latency = time.perf_counter() - started
+            record_generation(aborts, generated_text != FALLBACK_RESPONSE)
+            self.router.record(route, latency, small_chars, large_chars)
+            get_load_controller().observe_turn(latency)
+            self.last_route = {'route': route, 'model': model, 'reason': reason, 'aborts': aborts}
             
             print(f"Generated response: {generated_text}")
             return generated_text
             
         except Exception as e:
             print(f"Error generating response: {e}")
-            return "申し訳ございませんが、エラーが発生しました。もう一度お試しください。"
+            return ERROR_RESPONSE
+    
+    def _chat(self, model: str, messages: List[Dict[str, str]], session_id: str = None,
+              on_token: Callable[[str], None] = None, cancel: threading.Event = None,
+              options: Dict[str, object] = None, monitored: bool = False) -> Optional[str]:
+        """
+        Run one chat completion
+        
+        When monitored, the text is checked as it streams in and
+        GenerationAborted is raised as soon as it looks unusable. Chunks
+        for on_token are held back until the monitor has seen enough text
+        to judge, so an early abort shows nothing to the user.
+        
+        Returns:
+            Raw generated text, or None if cancelled
+        """
+        options = options or self._generation_options()
+        if on_token or cancel or monitored:
+            # Stream tokens as they are generated
+            chunks = []
+            held = []
+            monitor = QualityMonitor() if monitored else None
+            for part in self.pool.chat(
+                model,
+                messages,
+                session_id=session_id,
+                options=options,
+                stream=True
+            ):
+                if cancel is not None and cancel.is_set():
+                    # Closing the stream frees the backend slot
+                    print("Generation cancelled")
+                    return None
+                chunk = part['message']['content']
+                chunks.append(chunk)
+                if monitor:
+                    abort_reason = monitor.feed(chunk)
+                    if abort_reason:
+                        raise monitor.abort(abort_reason)
+                visible = NON_JAPANESE_PATTERN.sub('', chunk)
+                if visible and on_token:
+                    held.append(visible)
+                    if monitor is None or monitor.ready:
+                        on_token(''.join(held))
+                        held.clear()
+            if held:
+                on_token(''.join(held))
+            return ''.join(chunks).strip()
+        
+        # Generate response using Ollama
+        response = self.pool.chat(
+            model,
+            messages,
+            session_id=session_id,
+            options=options
+        )
+        return response['message']['content'].strip()
+    
+    def _build_messages(self, user_input: str, conversation_history: List[Dict[str, str]] = None,
+                        long_term_context: List[Dict[str, str]] = None) -> List[Dict[str, str]]:
+        """
+        Prepare messages for conversation
+        
+        Args:
+            user_input: User's input text
+            conversation_history: Previous conversation messages
+            long_term_context: Relevant exchanges from earlier sessions
+            
+        Returns:
+            Chat messages for Ollama
+        """
+        messages = []
+        
+        # Add system prompt
+        messages.append({
+            'role': 'system',
+            'content': Config.SYSTEM_PROMPT
+        })
+        
+        # Add relevant exchanges from earlier sessions
+        if long_term_context:
+            messages.append({
+                'role': 'system',
+                'content': self._format_long_term_context(long_term_context)
+            })
+        
+        # Add conversation history if provided
+        if conversation_history:
+            for msg in conversation_history[-10:]:  # Keep last 10 messages for context
+                messages.append(msg)
+        
+        # Add current user input
+        messages.append({
+            'role': 'user',
+            'content': user_input
+        })
+        return messages
+    
+    def _generation_options(self, temperature: float = None) -> Dict[str, object]:
+        """Sampling options passed to Ollama (reply length follows the load tier)"""
+        return {
+            'temperature': Config.LLM_TEMPERATURE if temperature is None else temperature,
+            'num_predict': get_load_controller().current()['num_predict'] or Config.LLM_MAX_TOKENS,
+            'stop': ['<|endoftext|>', '\n\n\n'],  # Add stop sequences
+            'top_p': 0.9,  # Limit token diversity
+            'repeat_penalty': 1.1  # Reduce repetition
+        }
+    
+    def _format_long_term_context(self, exchanges: List[Dict[str, str]]) -> str:
+        """
+        Format retrieved past exchanges as a system message
+        
+        Args:
+            exchanges: Past exchanges with user_input and bot_response
+            
+        Returns:
+            Context text for the prompt
+        """
+        lines = ["以下は過去の会話の抜粋です。関連がある場合のみ参考にしてください。"]
+        for exchange in exchanges:
+            lines.append(f"ユーザー: {exchange['user_input']}")
+            lines.append(f"アシスタント: {exchange['bot_response']}")
+        return "\n".join(lines)
     
     def _clean_response(self, text: str) -> str:
         """
@@ -82,87 +265,80 @@ class LLMHandler:
         Returns:
             Cleaned response text
         """
-        import re
-        
         # Remove sequences of numbers/random characters
         text = re.sub(r'\b\d{5,}\b', '', text)  # Remove long number sequences
         text = re.sub(r'[a-zA-Z]{10,}', '', text)  # Remove long English sequences
-        text = re.sub(r'[^\u3040-\u309F\u30A0-\u30FF\u4E00-\u9FAF\u3000-\u303F\s。、！？「」（）]', '', text)  # Keep only Japanese chars and basic punctuation
+        text = NON_JAPANESE_PATTERN.sub('', text)  # Keep only Japanese chars and basic punctuation
         
         # Remove multiple spaces and clean up
         text = re.sub(r'\s+', ' ', text).strip()
         
         # If the text is too corrupted, return a fallback
         if len(text) < 10 or not any('\u3040' <= c <= '\u309F' or '\u30A0' <= c <= '\u30FF' or '\u4E00' <= c <= '\u9FAF' for c in text):
-            return "申し訳ございませんが、適切な回答を生成できませんでした。もう一度お試しください。"
+            return FALLBACK_RESPONSE
         
         return text
     
     def check_model_availability(self) -> bool:
         """
-        Check if the required model is available in Ollama
+        Check if the required model is available on any healthy Ollama backend
+        
+        Uses the cached model inventory, so this normally costs no Ollama round trip.
         
         Returns:
             True if model is available, False otherwise
         """
         try:
-            models = ollama.list()
-            available_models = []
-            
-            # Handle different response formats
-            if hasattr(models, 'models'):
-                # New ollama version with object response
-                for model in models.models:
-                    if hasattr(model, 'name'):
-                        available_models.append(model.name)
-                    elif hasattr(model, 'model'):
-                        available_models.append(model.model)
-            elif isinstance(models, dict) and 'models' in models:
-                # Dictionary response format
-                for model in models['models']:
-                    if isinstance(model, dict) and 'name' in model:
-                        available_models.append(model['name'])
-                    elif isinstance(model, dict) and 'model' in model:
-                        available_models.append(model['model'])
-            
-            print(f"Available models: {available_models}")
-            
-            if self.model in available_models:
-                print(f"Model {self.model} is available")
+            if self.catalog.has_model(self.model):
                 return True
-            else:
-                print(f"Model {self.model} not found. Available models: {available_models}")
-                return False
+            print(f"Model {self.model} not found. Available models: {self.catalog.available_models()}")
+            return False
                 
         except Exception as e:
             print(f"Error checking model availability: {e}")
             return False
     
-    def pull_model(self) -> bool:
+    def pull_model(self) -> PullJob:
         """
-        Download/pull the required model if not available
+        Start downloading the required model in the background
         
         Returns:
-            True if successful, False otherwise
+            PullJob reporting progress (shared with any pull already running)
         """
-        try:
-            print(f"Pulling model: {self.model}")
-            ollama.pull(self.model)
-            print(f"Model {self.model} pulled successfully")
-            return True
-            
-        except Exception as e:
-            print(f"Error pulling model: {e}")
-            return False
+        print(f"Pulling model: {self.model}")
+        return self.catalog.start_pull(self.model)
+    
+    def pull_status(self) -> Optional[PullJob]:
+        """Latest background pull of the required model, if any"""
+        return self.catalog.pull_job(self.model)
     
     def ensure_model_ready(self) -> bool:
         """
-        Ensure the model is ready for use
+        Ensure the model is ready for use, without blocking
+        
+        If the model is missing, a background pull is started (or joined);
+        poll pull_status() and call again once it is done.
         
         Returns:
-            True if model is ready, False otherwise
+            True if model is ready now, False otherwise
         """
-        if not self.check_model_availability():
-            print(f"Model {self.model} not available, attempting to pull...")
-            return self.pull_model()
-        return True
+        small_model = self.router.small_model
+        if (Config.LLM_ROUTING_ENABLED and not self.catalog.has_model(small_model)
+                and self.catalog.pull_job(small_model) is None):
+            # Optional: every turn uses the large model until it arrives
+            if Config.LLM_SMALL_MODEL_AUTO_PULL:
+                self.catalog.start_pull(small_model)
+            elif not self._small_model_notice_shown:
+                self._small_model_notice_shown = True
+                print(f"💡 Model routing disabled until {small_model} is pulled "
+                      f"(ollama pull {small_model}, or set LLM_SMALL_MODEL_AUTO_PULL)")
+        if self.check_model_availability():
+            return True
+        job = self.pull_status()
+        if job is None:
+            self.pull_model()
+        elif job.done and job.success:
+            # Pulled, but the cached inventory may predate it
+            self.catalog.refresh()
+            return self.catalog.has_model(self.model)
+        return False
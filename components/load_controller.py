@@ -0,0 +1,133 @@
+# Load controller
+# Steps quality down (smaller models, shorter replies, no speech) when latency SLOs are missed
+import threading
+import time
+from collections import deque
+from typing import Callable, Dict, List, Optional
+
+from config import Config
+
+
+class LoadController:
+    """
+    Picks a degradation tier from recent turn latency and queue depth
+
+    Tiers come from Config.DEGRADATION_TIERS, mildest first. The load score
+    is the worst of: p90 turn latency / SLO, queued inference requests / SLO
+    and LLM requests in flight per backend / SLO. Above 1.0 the controller
+    steps down one tier; it steps back up one tier only after the score has
+    stayed under Config.LOAD_RECOVER_SCORE for Config.LOAD_RECOVER_SECONDS.
+    Each change waits at least Config.LOAD_MIN_DWELL_SECONDS, and only
+    turns finished after the last change count towards the next one.
+    """
+
+    def __init__(self, tiers: List[Dict[str, object]] = None):
+        self.tiers = tiers or Config.DEGRADATION_TIERS
+        self.level = 0
+        self._latencies = deque(maxlen=Config.LOAD_LATENCY_WINDOW)
+        self._queue_probes: List[Callable[[], int]] = []
+        self._in_flight_probes: List[Callable[[], float]] = []
+        self._lock = threading.Lock()
+        self._changed_at = 0.0
+        self._calm_since: Optional[float] = None
+        self._evaluated_at = 0.0
+        self.last_signals: Dict[str, float] = {}
+        self.transitions = deque(maxlen=20)
+
+    def add_queue_probe(self, probe: Callable[[], int]):
+        """Register a callable returning requests waiting for a worker"""
+        self._queue_probes.append(probe)
+
+    def add_in_flight_probe(self, probe: Callable[[], float]):
+        """Register a callable returning LLM requests in flight per backend"""
+        self._in_flight_probes.append(probe)
+
+    def observe_turn(self, seconds: float):
+        """Record the latency of a finished turn"""
+        with self._lock:
+            self._latencies.append((time.time(), seconds))
+
+    def _signals(self) -> Dict[str, float]:
+        with self._lock:
+            # Turns from before the last change say nothing about the current tier
+            cutoff = max(time.time() - Config.LOAD_LATENCY_MAX_AGE, self._changed_at)
+            recent = sorted(seconds for at, seconds in self._latencies if at >= cutoff)
+        p90 = recent[min(len(recent) - 1, int(len(recent) * 0.9))] if recent else 0.0
+        queued = sum(probe() for probe in self._queue_probes)
+        in_flight = max((probe() for probe in self._in_flight_probes), default=0.0)
+        return {
+            'p90_latency': p90,
+            'queued': queued,
+            'in_flight': in_flight,
+            'score': max(p90 / Config.SLO_TURN_LATENCY,
+                         queued / Config.SLO_QUEUE_DEPTH,
+                         in_flight / Config.SLO_LLM_IN_FLIGHT),
+        }
+
+    def evaluate(self):
+        """Re-read the signals and move at most one tier"""
+        now = time.time()
+        signals = self._signals()
+        with self._lock:
+            self.last_signals = signals
+            self._evaluated_at = now
+            score = signals['score']
+            if score < Config.LOAD_RECOVER_SCORE:
+                self._calm_since = self._calm_since or now
+            else:
+                self._calm_since = None
+            if now - self._changed_at < Config.LOAD_MIN_DWELL_SECONDS:
+                return
+
+            if score > 1.0 and self.level < len(self.tiers) - 1:
+                self._move(self.level + 1, signals, now)
+            elif (self.level > 0 and self._calm_since is not None
+                  and now - self._calm_since >= Config.LOAD_RECOVER_SECONDS):
+                self._move(self.level - 1, signals, now)
+                self._calm_since = now
+
+    def _move(self, level: int, signals: Dict[str, float], now: float):
+        old = self.tiers[self.level]['name']
+        self.level = level
+        self._changed_at = now
+        new = self.tiers[level]['name']
+        self.transitions.append({'at': now, 'from': old, 'to': new, **signals})
+        print(f"Load tier: {old} -> {new} (p90 latency {signals['p90_latency']:.1f}s, "
+              f"queued {signals['queued']}, LLM in flight {signals['in_flight']:.1f}, "
+              f"score {signals['score']:.2f})")
+
+    def current(self) -> Dict[str, object]:
+        """
+        The tier to apply now (re-evaluated at most once per second)
+
+        Returns:
+            Tier settings: name, whisper_model, num_predict, small_llm_only, tts
+        """
+        if not Config.LOAD_CONTROL_ENABLED:
+            return self.tiers[0]
+        if time.time() - self._evaluated_at >= 1.0:
+            self.evaluate()
+        return self.tiers[self.level]
+
+    def status(self) -> Dict[str, object]:
+        tier = self.current()
+        with self._lock:
+            return {
+                'tier': tier['name'],
+                'level': self.level,
+                'signals': dict(self.last_signals),
+                'transitions': list(self.transitions),
+            }
+
+
+_controller: Optional[LoadController] = None
+_controller_lock = threading.Lock()
+
+
+def get_load_controller() -> LoadController:
+    """Get the process-wide controller"""
+    global _controller
+    with _controller_lock:
+        if _controller is None:
+            _controller = LoadController()
+        return _controller
@@ -0,0 +1,367 @@
+# Long-term memory
+# Vector index over past turns (memory-mapped float32 matrix, Ollama embeddings)
+import json
+import os
+import sqlite3
+import threading
+from typing import List, Dict, Optional
+
+import numpy as np
+
+from config import Config
+from conversation_shards import SHARD_ID_MASK, ConversationShards, base_id, get_conversation_shards
+from ollama_pool import get_ollama_pool
+
+# Rows scored per matrix product; bounds temporary memory during search
+SEARCH_BLOCK_ROWS = 65536
+
+_instance = None
+_instance_lock = threading.Lock()
+
+
+def estimate_tokens(text: str) -> int:
+    """Rough token estimate: Japanese runs about one token per character"""
+    return len(text)
+
+
+class VectorIndex:
+    """Append-only matrix of unit-norm embeddings stored in memory-mapped files"""
+
+    def __init__(self, index_dir: str):
+        """
+        Open (or create) an index directory
+
+        Args:
+            index_dir: Directory holding vectors.f32, ids.i64 and meta.json
+        """
+        self.index_dir = index_dir
+        self.vectors_path = os.path.join(index_dir, "vectors.f32")
+        self.ids_path = os.path.join(index_dir, "ids.i64")
+        self.meta_path = os.path.join(index_dir, "meta.json")
+        os.makedirs(index_dir, exist_ok=True)
+
+        self.meta = {'model': None, 'dim': 0, 'count': 0, 'capacity': 0, 'last_ids': {}}
+        if os.path.exists(self.meta_path):
+            with open(self.meta_path, "r", encoding="utf-8") as f:
+                self.meta.update(json.load(f))
+        if 'last_id' in self.meta:
+            # Written before sharding: one AUTOINCREMENT sequence
+            self.meta['last_ids'] = {'base': self.meta.pop('last_id')}
+
+        self.vectors = None
+        self.ids = None
+        self._open_maps()
+
+    @property
+    def count(self) -> int:
+        return self.meta['count']
+
+    def last_id(self, sequence: str = 'base') -> int:
+        """
+        Highest conversation id indexed in one id sequence: 'base' (ids
+        from before sharding, or all of them when unsharded) or a shard's
+        allocator number
+        """
+        return self.meta['last_ids'].get(sequence, 0)
+
+    def _open_maps(self):
+        """Map the data files at the current capacity"""
+        capacity, dim = self.meta['capacity'], self.meta['dim']
+        if capacity and dim:
+            self.vectors = np.memmap(self.vectors_path, dtype=np.float32, mode="r+", shape=(capacity, dim))
+            self.ids = np.memmap(self.ids_path, dtype=np.int64, mode="r+", shape=(capacity,))
+        else:
+            self.vectors = None
+            self.ids = None
+
+    def _grow(self, needed: int):
+        """Double the file capacity until `needed` rows fit"""
+        capacity = max(self.meta['capacity'], 1024)
+        while capacity < needed:
+            capacity *= 2
+        if capacity == self.meta['capacity']:
+            return
+
+        if self.vectors is not None:
+            self.vectors.flush()
+            self.ids.flush()
+        self.vectors = None
+        self.ids = None
+
+        dim = self.meta['dim']
+        for path, row_bytes in ((self.vectors_path, dim * 4), (self.ids_path, 8)):
+            with open(path, "ab") as f:
+                f.truncate(capacity * row_bytes)
+
+        self.meta['capacity'] = capacity
+        self._open_maps()
+
+    def _save_meta(self):
+        """Persist metadata atomically, after the data it describes"""
+        tmp_path = self.meta_path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(self.meta, f)
+        os.replace(tmp_path, self.meta_path)
+
+    def reset(self, model: str, dim: int):
+        """Drop all vectors (e.g. when the embedding model changes)"""
+        self.vectors = None
+        self.ids = None
+        for path in (self.vectors_path, self.ids_path):
+            if os.path.exists(path):
+                os.unlink(path)
+        self.meta = {'model': model, 'dim': dim, 'count': 0, 'capacity': 0, 'last_ids': {}}
+        self._save_meta()
+
+    def append(self, ids: List[int], embeddings: np.ndarray, last_id: int, sequence: str = 'base'):
+        """
+        Append a batch of embeddings
+
+        Args:
+            ids: Conversation row ids, one per embedding
+            embeddings: Matrix of shape (len(ids), dim)
+            last_id: Highest conversation id covered by this batch
+            sequence: Id sequence the batch was read from (see last_id)
+        """
+        embeddings = np.asarray(embeddings, dtype=np.float32)
+        norms = np.linalg.norm(embeddings, axis=1, keepdims=True)
+        embeddings /= np.maximum(norms, 1e-12)
+
+        start = self.meta['count']
+        end = start + len(ids)
+        self._grow(end)
+        self.vectors[start:end] = embeddings
+        self.ids[start:end] = ids
+        self.vectors.flush()
+        self.ids.flush()
+
+        self.meta['count'] = end
+        self.meta['last_ids'][sequence] = last_id
+        self._save_meta()
+
+    def search(self, query: np.ndarray, top_k: int) -> List[tuple]:
+        """
+        Exact inner-product search, vectorized block by block
+
+        Args:
+            query: Query embedding
+            top_k: Number of results
+
+        Returns:
+            List of tuples (conversation_id, score), best first
+        """
+        count = self.meta['count']
+        if not count or top_k <= 0:
+            return []
+
+        query = np.asarray(query, dtype=np.float32)
+        query /= max(float(np.linalg.norm(query)), 1e-12)
+
+        best_scores = np.empty(0, dtype=np.float32)
+        best_ids = np.empty(0, dtype=np.int64)
+        for start in range(0, count, SEARCH_BLOCK_ROWS):
+            end = min(start + SEARCH_BLOCK_ROWS, count)
+            scores = self.vectors[start:end] @ query
+            k = min(top_k, len(scores))
+            top = np.argpartition(-scores, k - 1)[:k]
+            best_scores = np.concatenate([best_scores, scores[top]])
+            best_ids = np.concatenate([best_ids, self.ids[start:end][top]])
+
+        order = np.argsort(-best_scores)[:top_k]
+        return [(int(best_ids[i]), float(best_scores[i])) for i in order]
+
+
+class LongTermMemory:
+    """Retrieval of relevant exchanges from earlier sessions"""
+
+    def __init__(self, shards: ConversationShards = None, index_dir: str = None):
+        """
+        Initialize the index and its background embedding worker
+
+        Args:
+            shards: Conversation databases (defaults to the process-wide shard map)
+            index_dir: Index directory (defaults to Config.MEMORY_INDEX_PATH)
+        """
+        self.shards = shards or get_conversation_shards()
+        self.model = Config.EMBEDDING_MODEL
+        self.batch_size = Config.MEMORY_EMBEDDING_BATCH
+        self.index = VectorIndex(index_dir or Config.MEMORY_INDEX_PATH)
+        if self.index.meta['model'] not in (None, self.model):
+            print(f"Embedding model changed to {self.model}, rebuilding memory index")
+            self.index.reset(self.model, 0)
+
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._worker = threading.Thread(target=self._run, name="memory-indexer", daemon=True)
+        self._worker.start()
+        self.schedule()
+
+    def _embed(self, texts: List[str]) -> np.ndarray:
+        """Embed a batch of texts with one Ollama call when supported"""
+        embeddings = get_ollama_pool().embed(self.model, texts)
+        return np.asarray(embeddings, dtype=np.float32)
+
+    def schedule(self):
+        """Wake the background worker to index newly saved turns"""
+        self._wakeup.set()
+
+    def _run(self):
+        """Background loop: embed unindexed rows in batches"""
+        while True:
+            self._wakeup.wait()
+            self._wakeup.clear()
+            try:
+                while self._index_batch():
+                    pass
+            except Exception as e:
+                print(f"Error updating memory index: {e}")
+
+    def _index_batch(self) -> bool:
+        """
+        Embed the next batch of conversation rows
+
+        Returns:
+            True if a batch was indexed and more may be pending
+        """
+        # Ids up to the base came from AUTOINCREMENT; above it, each shard's
+        # allocator hands out increasing ids ending in its shard number
+        base = base_id(self.shards.paths[0]) if self.shards.sharded else None
+        pending = self._index_sequence('base', ceiling=base)
+        if self.shards.sharded:
+            for allocator in range(len(self.shards.paths)):
+                pending = self._index_sequence(str(allocator), floor=base, allocator=allocator) or pending
+        return pending
+
+    def _next_rows(self, sequence: str, floor: int = None, ceiling: int = None,
+                   allocator: int = None) -> List[tuple]:
+        """
+        Lowest unindexed rows of one id sequence
+
+        Rows keep their id when the rebalancer moves a session, so every
+        shard is read; a row seen twice mid-move counts once.
+        """
+        conditions, params = ['id > ?'], [max(self.index.last_id(sequence), floor or 0)]
+        if ceiling is not None:
+            conditions.append('id <= ?')
+            params.append(ceiling)
+        if allocator is not None:
+            conditions.append(f'(id & {SHARD_ID_MASK}) = ?')
+            params.append(allocator)
+        rows = {}
+        for path in self.shards.paths:
+            with sqlite3.connect(path) as conn:
+                cursor = conn.cursor()
+                cursor.execute(f'''
+                    SELECT id, user_input, bot_response
+                    FROM conversations
+                    WHERE {' AND '.join(conditions)}
+                    ORDER BY id ASC
+                    LIMIT ?
+                ''', (*params, self.batch_size))
+                rows.update((row[0], row) for row in cursor.fetchall())
+        return [rows[row_id] for row_id in sorted(rows)[:self.batch_size]]
+
+    def _index_sequence(self, sequence: str, floor: int = None, ceiling: int = None,
+                        allocator: int = None) -> bool:
+        rows = self._next_rows(sequence, floor, ceiling, allocator)
+        if not rows:
+            return False
+
+        texts = [f"{user_input}\n{bot_response}" for _, user_input, bot_response in rows]
+        embeddings = self._embed(texts)
+
+        with self._lock:
+            if self.index.meta['dim'] != embeddings.shape[1]:
+                self.index.reset(self.model, embeddings.shape[1])
+                return True
+            self.index.append([row[0] for row in rows], embeddings, rows[-1][0], sequence)
+
+        print(f"Memory index updated: {self.index.count} turns")
+        return len(rows) == self.batch_size
+
+    def retrieve(self, query: str, exclude_session: str = None, top_k: int = None,
+                 token_budget: int = None) -> List[Dict[str, str]]:
+        """
+        Find past exchanges relevant to a query
+
+        Args:
+            query: Current user input
+            exclude_session: Session whose turns are already in the prompt
+            top_k: Maximum number of exchanges (defaults to Config.MEMORY_TOP_K)
+            token_budget: Maximum estimated tokens (defaults to Config.MEMORY_TOKEN_BUDGET)
+
+        Returns:
+            List of exchanges (user_input, bot_response, timestamp, score), best first
+        """
+        top_k = top_k or Config.MEMORY_TOP_K
+        token_budget = token_budget or Config.MEMORY_TOKEN_BUDGET
+
+        try:
+            if not self.index.count:
+                return []
+
+            query_embedding = self._embed([query])[0]
+            with self._lock:
+                # Over-fetch: some hits belong to the current or deleted sessions
+                hits = self.index.search(query_embedding, top_k * 4)
+            if not hits:
+                return []
+
+            scores = dict(hits)
+            placeholders = ','.join('?' for _ in scores)
+            rows = {}
+            for path in self.shards.paths:
+                with sqlite3.connect(path) as conn:
+                    cursor = conn.cursor()
+                    cursor.execute(f'''
+                        SELECT id, session_id, user_input, bot_response, timestamp
+                        FROM conversations
+                        WHERE id IN ({placeholders})
+                    ''', list(scores))
+                    rows.update((row[0], row) for row in cursor.fetchall())
+
+            results = []
+            used_tokens = 0
+            for conversation_id, score in hits:
+                row = rows.get(conversation_id)
+                if row is None or row[1] == exclude_session:
+                    continue
+                _, _, user_input, bot_response, timestamp = row
+                cost = estimate_tokens(user_input) + estimate_tokens(bot_response)
+                if used_tokens + cost > token_budget:
+                    continue
+                used_tokens += cost
+                results.append({
+                    'user_input': user_input,
+                    'bot_response': bot_response,
+                    'timestamp': timestamp,
+                    'score': score
+                })
+                if len(results) >= top_k:
+                    break
+
+            return results
+
+        except Exception as e:
+            print(f"Error retrieving long-term memory: {e}")
+            return []
+
+
+def get_long_term_memory() -> Optional[LongTermMemory]:
+    """
+    Get the process-wide long-term memory (shared by all browser sessions)
+
+    Returns:
+        LongTermMemory instance, or None if disabled or failed to start
+    """
+    global _instance
+    if not Config.LONG_TERM_MEMORY_ENABLED:
+        return None
+    with _instance_lock:
+        if _instance is None:
+            try:
+                _instance = LongTermMemory()
+            except Exception as e:
+                print(f"⚠️ Long-term memory disabled: {e}")
+                return None
+        return _instance
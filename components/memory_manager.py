@@ -1,9 +1,53 @@
 # Memory / DB
+import heapq
+import os
 import sqlite3
 import json
-from datetime import datetime
-from typing import List, Dict, Optional, Tuple
+import threading
+import uuid
+from datetime import datetime, timezone
+from itertools import islice
+from typing import Any, Callable, List, Dict, Optional, Tuple
 from config import Config
+from conversation_shards import allocate_ids, get_conversation_shards, install_shard_schema, max_conversation_id
+from conversation_stats import ConversationStats, install_stats_schema
+from conversation_search import ConversationSearch, install_search_schema
+from session_archive import SessionArchiver, install_archive_schema
+from turn_cache import get_turn_cache
+
+# Bumped on every write; read-side caches compare it to detect stale entries
+_data_version = 0
+_data_version_lock = threading.Lock()
+
+
+def _bump_data_version():
+    global _data_version
+    with _data_version_lock:
+        _data_version += 1
+
+
+def get_data_version() -> int:
+    """Process-wide counter of conversation/session writes"""
+    return _data_version
+
+
+def parse_db_timestamp(value: str) -> Optional[datetime]:
+    """
+    Convert an SQLite CURRENT_TIMESTAMP string (UTC) to a local datetime
+    
+    Args:
+        value: Timestamp string such as '2025-08-20 14:55:09'
+        
+    Returns:
+        Timezone-aware local datetime, or None if unparseable
+    """
+    if not value:
+        return None
+    try:
+        parsed = datetime.strptime(value[:19], '%Y-%m-%d %H:%M:%S')
+    except ValueError:
+        return None
+    return parsed.replace(tzinfo=timezone.utc).astimezone()
 
 class MemoryManager:
     """Memory manager for conversation persistence using SQLite"""
@@ -11,45 +55,94 @@ class MemoryManager:
     def __init__(self):
         """Initialize database connection and create tables"""
         Config.ensure_directories()
-        self.db_path = Config.DATABASE_PATH
+        self.db_path = Config.DATABASE_PATH  # Shard 0; also keys the process-wide caches
+        self.shards = get_conversation_shards()
+        self.stats = ConversationStats(self.shards)
+        self.search = ConversationSearch(self.shards)
+        self.archive = SessionArchiver(self.shards)
+        self.turns = get_turn_cache(self.db_path)
         self.init_database()
     
     def init_database(self):
-        """Initialize database tables"""
+        """Initialize database tables (in every shard)"""
         try:
-            with sqlite3.connect(self.db_path) as conn:
-                cursor = conn.cursor()
-                
-                # Create conversations table
-                cursor.execute('''
-                    CREATE TABLE IF NOT EXISTS conversations (
-                        id INTEGER PRIMARY KEY AUTOINCREMENT,
-                        session_id TEXT NOT NULL,
-                        user_input TEXT NOT NULL,
-                        bot_response TEXT NOT NULL,
-                        timestamp DATETIME DEFAULT CURRENT_TIMESTAMP,
-                        audio_file_path TEXT,
-                        metadata TEXT
-                    )
-                ''')
-                
-                # Create sessions table
-                cursor.execute('''
-                    CREATE TABLE IF NOT EXISTS sessions (
-                        session_id TEXT PRIMARY KEY,
-                        created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
-                        last_activity DATETIME DEFAULT CURRENT_TIMESTAMP,
-                        title TEXT,
-                        metadata TEXT
-                    )
-                ''')
-                
-                conn.commit()
-                print("Database initialized successfully")
+            fts_available = True
+            # New allocators start above every existing id (the single-file ones included)
+            floor_id = max_conversation_id(self.shards.paths) if self.shards.sharded else 0
+            for index, path in enumerate(self.shards.paths):
+                fts_available = self._init_shard(index, path, floor_id) and fts_available
+            self.search.fts_available = fts_available
+            if self.shards.catalog_created:
+                # Sharding just enabled: the existing database becomes shard 0
+                self.shards.sync_catalog()
+            print("Database initialized successfully" if not self.shards.sharded
+                  else f"Database initialized successfully ({len(self.shards.paths)} shards)")
                 
         except Exception as e:
             print(f"Error initializing database: {e}")
     
+    def _init_shard(self, index: int, path: str, floor_id: int = 0) -> bool:
+        """
+        Create tables, indexes and triggers in one database file
+        
+        Returns:
+            True if FTS5 search is available in it
+        """
+        with sqlite3.connect(path) as conn:
+            cursor = conn.cursor()
+            
+            # Create conversations table
+            cursor.execute('''
+                CREATE TABLE IF NOT EXISTS conversations (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    session_id TEXT NOT NULL,
+                    user_input TEXT NOT NULL,
+                    bot_response TEXT NOT NULL,
+                    timestamp DATETIME DEFAULT CURRENT_TIMESTAMP,
+                    audio_file_path TEXT,
+                    metadata TEXT
+                )
+            ''')
+            
+            # Create sessions table
+            cursor.execute('''
+                CREATE TABLE IF NOT EXISTS sessions (
+                    session_id TEXT PRIMARY KEY,
+                    created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+                    last_activity DATETIME DEFAULT CURRENT_TIMESTAMP,
+                    title TEXT,
+                    metadata TEXT
+                )
+            ''')
+            
+            # Keyset pagination over recent sessions
+            cursor.execute('''
+                CREATE INDEX IF NOT EXISTS idx_sessions_last_activity
+                ON sessions (last_activity DESC, session_id DESC)
+            ''')
+            
+            # Per-session history lookups
+            cursor.execute('''
+                CREATE INDEX IF NOT EXISTS idx_conversations_session
+                ON conversations (session_id, id)
+            ''')
+            
+            # Statistics rollups maintained by triggers
+            install_stats_schema(cursor)
+            
+            # Full-text index maintained by triggers
+            fts_available = install_search_schema(cursor)
+            
+            # Index of sessions moved to the archive
+            install_archive_schema(cursor)
+            
+            # Per-shard conversation id allocator
+            if self.shards.sharded:
+                install_shard_schema(cursor, index, floor_id)
+            
+            conn.commit()
+        return fts_available
+    
     def create_session(self, title: str = None) -> str:
         """
         Create a new conversation session
@@ -60,20 +153,26 @@ class MemoryManager:
         Returns:
             Session ID
         """
-        session_id = f"session_{datetime.now().strftime('%Y%m%d_%H%M%S')}"
+        # Random suffix: several clients may start sessions in the same second
+        session_id = f"session_{datetime.now().strftime('%Y%m%d_%H%M%S')}_{uuid.uuid4().hex[:6]}"
         
         if not title:
             # Use English for better Windows compatibility
             title = f"Conversation {datetime.now().strftime('%Y-%m-%d %H:%M')}"
         
         try:
-            with sqlite3.connect(self.db_path) as conn:
+            shard = self.shards.placement(session_id)
+            with sqlite3.connect(self.shards.paths[shard]) as conn:
                 cursor = conn.cursor()
                 cursor.execute('''
                     INSERT INTO sessions (session_id, title)
                     VALUES (?, ?)
                 ''', (session_id, title))
                 conn.commit()
+            self.shards.register(session_id, shard, title)
+            _bump_data_version()
+            # A new session's (empty) history is known without a query
+            self.turns.load(session_id, [], True)
                 
             print(f"New session created: {session_id}")
             return session_id
@@ -87,6 +186,8 @@ class MemoryManager:
         """
         Save conversation exchange to database
         
+        An archived session is restored from the archive first.
+        
         Args:
             session_id: Session identifier
             user_input: User's input text
@@ -100,24 +201,43 @@ class MemoryManager:
         try:
             metadata_json = json.dumps(metadata) if metadata else None
             
-            with sqlite3.connect(self.db_path) as conn:
-                cursor = conn.cursor()
-                
-                # Save conversation
-                cursor.execute('''
-                    INSERT INTO conversations 
-                    (session_id, user_input, bot_response, audio_file_path, metadata)
-                    VALUES (?, ?, ?, ?, ?)
-                ''', (session_id, user_input, bot_response, audio_file_path, metadata_json))
-                
-                # Update session last activity
-                cursor.execute('''
-                    UPDATE sessions 
-                    SET last_activity = CURRENT_TIMESTAMP
-                    WHERE session_id = ?
-                ''', (session_id,))
-                
-                conn.commit()
+            for attempt in range(3):
+                shard = self.shards.shard_of(session_id)
+                with sqlite3.connect(self.shards.paths[shard]) as conn:
+                    cursor = conn.cursor()
+                    
+                    # Update session last activity
+                    cursor.execute('''
+                        UPDATE sessions 
+                        SET last_activity = CURRENT_TIMESTAMP
+                        WHERE session_id = ?
+                    ''', (session_id,))
+                    
+                    # No session row here: the rebalancer may have moved it to another
+                    # shard, or it was archived (new turns would have no session)
+                    if cursor.rowcount == 0 and attempt < 2:
+                        conn.rollback()
+                        if self.shards.sharded and self.shards.refresh(session_id) != shard:
+                            continue
+                        if self.archive.is_archived(session_id):
+                            if not self.open_session(session_id):
+                                print(f"Error saving conversation: archived session {session_id} "
+                                      f"could not be restored")
+                                return False
+                            continue
+                    
+                    # Save conversation (ids come from the shard's allocator when sharded)
+                    conversation_id = allocate_ids(cursor)[0] if self.shards.sharded else None
+                    cursor.execute('''
+                        INSERT INTO conversations 
+                        (id, session_id, user_input, bot_response, audio_file_path, metadata)
+                        VALUES (?, ?, ?, ?, ?, ?)
+                    ''', (conversation_id, session_id, user_input, bot_response, audio_file_path, metadata_json))
+                    
+                    conn.commit()
+                break
+            _bump_data_version()
+            self.turns.append(session_id, (user_input, bot_response))
                 
             print(f"Conversation saved for session: {session_id}")
             return True
@@ -126,48 +246,160 @@ class MemoryManager:
             print(f"Error saving conversation: {e}")
             return False
     
+    def set_reply_audio(self, session_id: str, bot_response: str, audio_path: str) -> bool:
+        """
+        Link a spoken reply's audio to its turn
+        
+        Speech is synthesized after the turn is saved, so the path is added
+        afterwards, as 'reply_audio_path' in the metadata of the session's
+        latest turn with that reply.
+        
+        Args:
+            session_id: Session identifier
+            bot_response: Reply text that was spoken
+            audio_path: Audio store path of the reply
+            
+        Returns:
+            True if a turn was updated, False otherwise
+        """
+        try:
+            for attempt in range(2):
+                shard = self.shards.shard_of(session_id)
+                with sqlite3.connect(self.shards.paths[shard]) as conn:
+                    cursor = conn.cursor()
+                    cursor.execute('''
+                        SELECT id, metadata FROM conversations
+                        WHERE session_id = ? AND bot_response = ?
+                        ORDER BY id DESC
+                        LIMIT 1
+                    ''', (session_id, bot_response))
+                    row = cursor.fetchone()
+                    if row is None:
+                        if attempt == 0 and self.shards.sharded and self.shards.refresh(session_id) != shard:
+                            continue
+                        return False
+                    
+                    conversation_id, metadata_json = row
+                    metadata = json.loads(metadata_json) if metadata_json else {}
+                    metadata['reply_audio_path'] = audio_path
+                    cursor.execute('UPDATE conversations SET metadata = ? WHERE id = ?',
+                                   (json.dumps(metadata), conversation_id))
+                    conn.commit()
+                return True
+            return False
+            
+        except Exception as e:
+            print(f"Error linking reply audio: {e}")
+            return False
+    
     def get_conversation_history(self, session_id: str, limit: int = 20) -> List[Dict[str, str]]:
         """
         Get conversation history for a session
         
+        Served from the process-wide turn cache when possible; a miss loads
+        the session's recent turns into it.
+        
         Args:
             session_id: Session identifier
-            limit: Maximum number of messages to retrieve
+            limit: Maximum number of turns (most recent) to retrieve
             
         Returns:
-            List of conversation messages in format for LLM
+            List of conversation messages in format for LLM, oldest first
         """
         try:
-            with sqlite3.connect(self.db_path) as conn:
-                cursor = conn.cursor()
-                cursor.execute('''
-                    SELECT user_input, bot_response, timestamp
-                    FROM conversations
-                    WHERE session_id = ?
-                    ORDER BY timestamp ASC
-                    LIMIT ?
-                ''', (session_id, limit))
-                
-                rows = cursor.fetchall()
-                
-                # Convert to LLM message format
-                messages = []
-                for user_input, bot_response, timestamp in rows:
-                    messages.append({
-                        'role': 'user',
-                        'content': user_input
-                    })
-                    messages.append({
-                        'role': 'assistant',
-                        'content': bot_response
-                    })
-                
-                return messages
+            turns = self.turns.get(session_id, limit)
+            if turns is None:
+                turns = self._load_recent_turns(session_id, limit)
+            
+            # Convert to LLM message format
+            messages = []
+            for user_input, bot_response in turns:
+                messages.append({
+                    'role': 'user',
+                    'content': user_input
+                })
+                messages.append({
+                    'role': 'assistant',
+                    'content': bot_response
+                })
+            
+            return messages
                 
         except Exception as e:
             print(f"Error getting conversation history: {e}")
             return []
     
+    def _load_recent_turns(self, session_id: str, limit: int) -> List[Tuple[str, str]]:
+        """Read a session's most recent turns and cache them"""
+        fetch = max(limit, self.turns.max_turns)
+        token = self.turns.write_token()
+        # One extra row tells whether this is the whole history
+        rows = self._read_session(session_id, '''
+            SELECT user_input, bot_response
+            FROM conversations
+            WHERE session_id = ?
+            ORDER BY id DESC
+            LIMIT ?
+        ''', (session_id, fetch + 1))
+        
+        turns = rows[:fetch][::-1]
+        self.turns.load(session_id, turns[-self.turns.max_turns:],
+                        len(rows) <= self.turns.max_turns, token)
+        return turns[-limit:]
+    
+    def _read_session(self, session_id: str, sql: str, params: Tuple) -> List[Tuple]:
+        """
+        Run a query on the shard holding a session
+        
+        An empty result is retried once on the catalog's current shard, in
+        case the rebalancer in another process has just moved the session.
+        """
+        shard = self.shards.shard_of(session_id)
+        with sqlite3.connect(self.shards.paths[shard]) as conn:
+            rows = conn.execute(sql, params).fetchall()
+        if not rows and self.shards.sharded:
+            moved_to = self.shards.refresh(session_id)
+            if moved_to != shard:
+                with sqlite3.connect(self.shards.paths[moved_to]) as conn:
+                    rows = conn.execute(sql, params).fetchall()
+        return rows
+    
+    def _read_merged(self, sql: str, params: Tuple, key: Callable[[Tuple], Any], limit: int) -> List[Tuple]:
+        """
+        Run a query ordered by `key` descending on every shard and merge the results
+        
+        Each shard returns at most `limit` rows from its own index, so the
+        merge reads no more than shards x limit rows.
+        """
+        results = []
+        for path in self.shards.paths:
+            with sqlite3.connect(path) as conn:
+                results.append(conn.execute(sql, params).fetchall())
+        if len(results) == 1:
+            return results[0]
+        return list(islice(heapq.merge(*results, key=key, reverse=True), limit))
+    
+    def search_conversations(self, query: str, limit: int = 10, offset: int = 0,
+                             session_id: str = None) -> List[Dict[str, object]]:
+        """
+        Full-text search over past exchanges
+        
+        Args:
+            query: Search terms (all must match)
+            limit: Page size
+            offset: Number of results to skip
+            session_id: Restrict to one session (optional)
+            
+        Returns:
+            List of matches ranked by relevance, with highlighted snippets
+        """
+        try:
+            return self.search.search(query, limit, offset, session_id)
+            
+        except Exception as e:
+            print(f"Error searching conversations: {e}")
+            return []
+    
     def get_sessions(self, limit: int = 10) -> List[Tuple[str, str, str]]:
         """
         Get list of recent sessions
@@ -179,19 +411,171 @@ class MemoryManager:
             List of tuples (session_id, title, last_activity)
         """
         try:
-            with sqlite3.connect(self.db_path) as conn:
-                cursor = conn.cursor()
-                cursor.execute('''
-                    SELECT session_id, title, last_activity
+            return self._read_merged('''
+                SELECT session_id, title, last_activity
+                FROM sessions
+                ORDER BY last_activity DESC
+                LIMIT ?
+            ''', (limit,), lambda row: row[2], limit)
+                
+        except Exception as e:
+            print(f"Error getting sessions: {e}")
+            return []
+    
+    def get_sessions_page(self, limit: int = 10,
+                          before: Tuple[str, str] = None) -> List[Tuple[str, str, str, str]]:
+        """
+        Get one page of sessions, most recently active first
+        
+        Keyset pagination: pass the (last_activity, session_id) of the last
+        row of the previous page, so each page is an index range scan.
+        
+        Args:
+            limit: Page size
+            before: Cursor from the previous page (optional)
+            
+        Returns:
+            List of tuples (session_id, title, last_activity, created_at)
+        """
+        try:
+            key = lambda row: (row[2], row[0])
+            if before:
+                return self._read_merged('''
+                    SELECT session_id, title, last_activity, created_at
                     FROM sessions
-                    ORDER BY last_activity DESC
+                    WHERE (last_activity, session_id) < (?, ?)
+                    ORDER BY last_activity DESC, session_id DESC
                     LIMIT ?
-                ''', (limit,))
+                ''', (before[0], before[1], limit), key, limit)
+            return self._read_merged('''
+                SELECT session_id, title, last_activity, created_at
+                FROM sessions
+                ORDER BY last_activity DESC, session_id DESC
+                LIMIT ?
+            ''', (limit,), key, limit)
                 
-                return cursor.fetchall()
+        except Exception as e:
+            print(f"Error getting sessions page: {e}")
+            return []
+    
+    def session_exists(self, session_id: str) -> bool:
+        """
+        Check whether a session was created here (archived sessions included)
+        
+        Args:
+            session_id: Session identifier
+            
+        Returns:
+            True if the session exists, False otherwise
+        """
+        try:
+            with sqlite3.connect(self.shards.locate(session_id)) as conn:
+                cursor = conn.cursor()
+                cursor.execute('''
+                    SELECT 1 FROM sessions WHERE session_id = ?
+                    UNION ALL
+                    SELECT 1 FROM archived_sessions WHERE session_id = ?
+                ''', (session_id, session_id))
+                return cursor.fetchone() is not None
                 
         except Exception as e:
-            print(f"Error getting sessions: {e}")
+            print(f"Error checking session: {e}")
+            return False
+    
+    def get_session_preview(self, session_id: str) -> Optional[Dict[str, str]]:
+        """
+        Get the latest exchange of a session
+        
+        Args:
+            session_id: Session identifier
+            
+        Returns:
+            Dictionary with user_input, bot_response and timestamp, or None
+        """
+        try:
+            rows = self._read_session(session_id, '''
+                SELECT user_input, bot_response, timestamp
+                FROM conversations
+                WHERE session_id = ?
+                ORDER BY id DESC
+                LIMIT 1
+            ''', (session_id,))
+                
+            if not rows:
+                return None
+            row = rows[0]
+            return {'user_input': row[0], 'bot_response': row[1], 'timestamp': row[2]}
+            
+        except Exception as e:
+            print(f"Error getting session preview: {e}")
+            return None
+    
+    def get_session_turns(self, session_id: str, limit: int = 50) -> List[Dict[str, object]]:
+        """
+        Get the most recent exchanges of a session for display
+        
+        Args:
+            session_id: Session identifier
+            limit: Maximum number of exchanges
+            
+        Returns:
+            List of dictionaries (user, bot, timestamp), oldest first
+        """
+        try:
+            rows = self._read_session(session_id, '''
+                SELECT user_input, bot_response, timestamp
+                FROM conversations
+                WHERE session_id = ?
+                ORDER BY id DESC
+                LIMIT ?
+            ''', (session_id, limit))
+                
+            return [
+                {'user': user_input, 'bot': bot_response, 'timestamp': parse_db_timestamp(timestamp)}
+                for user_input, bot_response, timestamp in reversed(rows)
+            ]
+            
+        except Exception as e:
+            print(f"Error getting session turns: {e}")
+            return []
+    
+    def open_session(self, session_id: str) -> bool:
+        """
+        Make a session's turns available, restoring it from the archive if needed
+        
+        Args:
+            session_id: Session identifier
+            
+        Returns:
+            True if the session is in the hot database, False otherwise
+        """
+        try:
+            if self.archive.is_archived(session_id):
+                restored = self.archive.rehydrate(session_id)
+                _bump_data_version()
+                self.turns.invalidate(session_id)
+                return restored
+            return True
+            
+        except Exception as e:
+            print(f"Error opening session: {e}")
+            return False
+    
+    def get_archived_sessions(self, limit: int = 10) -> List[Tuple[str, str, str, int]]:
+        """
+        Get archived sessions
+        
+        Args:
+            limit: Maximum number of sessions to retrieve
+            
+        Returns:
+            List of tuples (session_id, title, last_activity, turn_count)
+        """
+        try:
+            return self.archive.list_archived(limit)
+            
+        except Exception as e:
+            print(f"Error getting archived sessions: {e}")
             return []
     
     def delete_session(self, session_id: str) -> bool:
@@ -205,7 +589,11 @@ class MemoryManager:
             True if successful, False otherwise
         """
         try:
-            with sqlite3.connect(self.db_path) as conn:
+            # Restored first, so the statistics triggers subtract its turns
+            if self.archive.is_archived(session_id) and not self.archive.rehydrate(session_id):
+                print(f"⚠️ Archived session {session_id} could not be restored; its statistics are kept")
+            
+            with sqlite3.connect(self.shards.locate(session_id)) as conn:
                 cursor = conn.cursor()
                 
                 # Delete conversations
@@ -214,7 +602,19 @@ class MemoryManager:
                 # Delete session
                 cursor.execute('DELETE FROM sessions WHERE session_id = ?', (session_id,))
                 
+                # Delete archived copy, if any
+                cursor.execute('SELECT archive_path FROM archived_sessions WHERE session_id = ?', (session_id,))
+                archived = cursor.fetchone()
+                cursor.execute('DELETE FROM archived_sessions WHERE session_id = ?', (session_id,))
+                
                 conn.commit()
+            
+            self.shards.forget(session_id)
+            _bump_data_version()
+            self.turns.invalidate(session_id)
+            
+            if archived and archived[0]:
+                os.unlink(os.path.join(self.archive.archive_dir, archived[0]))
                 
             print(f"Session deleted: {session_id}")
             return True
@@ -223,42 +623,59 @@ class MemoryManager:
             print(f"Error deleting session: {e}")
             return False
     
-    def get_conversation_stats(self) -> Dict[str, int]:
+    def get_conversation_stats(self) -> Dict[str, float]:
         """
         Get statistics about conversations
         
+        Reads the trigger-maintained rollup tables, so the cost does not
+        grow with the number of stored conversations.
+        
         Returns:
             Dictionary with conversation statistics
         """
         try:
-            with sqlite3.connect(self.db_path) as conn:
-                cursor = conn.cursor()
-                
-                # Get total conversations
-                cursor.execute('SELECT COUNT(*) FROM conversations')
-                total_conversations = cursor.fetchone()[0]
-                
-                # Get total sessions
-                cursor.execute('SELECT COUNT(*) FROM sessions')
-                total_sessions = cursor.fetchone()[0]
-                
-                # Get conversations today
-                cursor.execute('''
-                    SELECT COUNT(*) FROM conversations 
-                    WHERE DATE(timestamp) = DATE('now')
-                ''')
-                conversations_today = cursor.fetchone()[0]
-                
-                return {
-                    'total_conversations': total_conversations,
-                    'total_sessions': total_sessions,
-                    'conversations_today': conversations_today
-                }
+            return self.stats.get_totals()
                 
         except Exception as e:
             print(f"Error getting conversation stats: {e}")
             return {
                 'total_conversations': 0,
                 'total_sessions': 0,
-                'conversations_today': 0
-            }
\ No newline at end of file
+                'conversations_today': 0,
+                'avg_user_length': 0.0,
+                'avg_reply_length': 0.0
+            }
+    
+    def get_daily_turns(self, days: int = 7) -> List[Tuple[str, int]]:
+        """
+        Get per-day turn counts
+        
+        Args:
+            days: Number of days to include
+            
+        Returns:
+            List of tuples (day, turns), oldest first
+        """
+        try:
+            return self.stats.get_daily_turns(days)
+            
+        except Exception as e:
+            print(f"Error getting daily turns: {e}")
+            return []
+    
+    def get_session_turn_counts(self, session_ids: List[str]) -> Dict[str, int]:
+        """
+        Get per-session turn counts
+        
+        Args:
+            session_ids: Sessions to look up
+            
+        Returns:
+            Dictionary mapping session_id to turn count
+        """
+        try:
+            return self.stats.get_session_turn_counts(session_ids)
+            
+        except Exception as e:
+            print(f"Error getting session turn counts: {e}")
+            return {}
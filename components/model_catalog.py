@@ -0,0 +1,186 @@
+# Model catalog
+# Cached inventory of Ollama models and background pulls with progress
+import threading
+import time
+from typing import Any, Dict, List, Optional
+
+from config import Config
+
+
+def normalize_model_name(name: str) -> str:
+    """
+    Canonical form of a model name: Ollama lists models with their tag and
+    treats an untagged name as ":latest"
+
+    >>> normalize_model_name("nomic-embed-text")
+    'nomic-embed-text:latest'
+    >>> normalize_model_name("kangyufei/llama2:japanese")
+    'kangyufei/llama2:japanese'
+    >>> normalize_model_name("localhost:5000/team/model")
+    'localhost:5000/team/model:latest'
+    """
+    if ':' in name.rsplit('/', 1)[-1]:
+        return name
+    return f"{name}:latest"
+
+
+def parse_model_names(models: Any) -> List[str]:
+    """
+    Extract model names from an ollama list() response
+
+    Handles both the object response of newer ollama clients and the
+    dictionary response of older ones.
+
+    Args:
+        models: Response of ollama.list() / Client.list()
+
+    Returns:
+        List of model names
+    """
+    available_models = []
+    if hasattr(models, 'models'):
+        # New ollama version with object response
+        for model in models.models:
+            if getattr(model, 'name', None):
+                available_models.append(model.name)
+            elif getattr(model, 'model', None):
+                available_models.append(model.model)
+    elif isinstance(models, dict) and 'models' in models:
+        # Dictionary response format
+        for model in models['models']:
+            if isinstance(model, dict) and 'name' in model:
+                available_models.append(model['name'])
+            elif isinstance(model, dict) and 'model' in model:
+                available_models.append(model['model'])
+    return available_models
+
+
+class PullJob:
+    """Progress of one background model pull"""
+
+    def __init__(self, model: str):
+        self.model = model
+        self.status = "starting"
+        self.host: Optional[str] = None
+        self.completed = 0
+        self.total = 0
+        self.done = False
+        self.success = False
+        self.error: Optional[str] = None
+        self.started_at = time.time()
+
+    @property
+    def progress(self) -> float:
+        """Fraction of the current layer downloaded (0.0 - 1.0)"""
+        if self.done:
+            return 1.0
+        return self.completed / self.total if self.total else 0.0
+
+    def update(self, host: str, status: str, completed: int = None, total: int = None):
+        self.host = host
+        self.status = status
+        if total:
+            self.total = total
+            self.completed = completed or 0
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {
+            'model': self.model,
+            'status': self.status,
+            'host': self.host,
+            'progress': self.progress,
+            'done': self.done,
+            'success': self.success,
+            'error': self.error,
+        }
+
+
+class ModelCatalog:
+    """Model inventory across the Ollama pool, refreshed at most once per TTL"""
+
+    def __init__(self, pool, ttl: float = None):
+        """
+        Args:
+            pool: OllamaPool whose backends are inventoried
+            ttl: Seconds an inventory stays fresh (defaults to Config.MODEL_CATALOG_TTL)
+        """
+        self.pool = pool
+        self.ttl = ttl or Config.MODEL_CATALOG_TTL
+        self._jobs: Dict[str, PullJob] = {}
+        self._lock = threading.Lock()
+
+    def _is_fresh(self) -> bool:
+        # The pool's health checker re-lists models in the background, so the
+        # inventory is usually fresh without any request-time round trip
+        probes = [backend.last_probe for backend in self.pool.backends]
+        return bool(probes) and time.time() - min(probes) < self.ttl
+
+    def refresh(self):
+        """Re-list models on every backend now"""
+        self.pool.probe_all()
+
+    def available_models(self) -> List[str]:
+        """Models on at least one healthy backend (cached)"""
+        if not self._is_fresh():
+            self.refresh()
+        return self.pool.available_models()
+
+    def has_model(self, model: str) -> bool:
+        if not self._is_fresh():
+            self.refresh()
+        return self.pool.has_model(model)
+
+    def start_pull(self, model: str) -> PullJob:
+        """
+        Pull a model in the background; concurrent callers share one job
+
+        Args:
+            model: Model name
+
+        Returns:
+            PullJob to poll for progress
+        """
+        with self._lock:
+            job = self._jobs.get(model)
+            if job and not job.done:
+                return job
+            job = PullJob(model)
+            self._jobs[model] = job
+
+        thread = threading.Thread(target=self._run_pull, args=(job,), name=f"pull-{model}", daemon=True)
+        thread.start()
+        return job
+
+    def _run_pull(self, job: PullJob):
+        try:
+            job.success = self.pool.pull(job.model, progress=job.update)
+            if not job.success:
+                job.error = "No healthy backend completed the pull"
+        except Exception as e:
+            job.error = str(e)
+            print(f"Error pulling model {job.model}: {e}")
+        finally:
+            job.status = "success" if job.success else "failed"
+            job.done = True
+            self.refresh()
+
+    def pull_job(self, model: str) -> Optional[PullJob]:
+        """Latest pull job for a model, if any"""
+        with self._lock:
+            return self._jobs.get(model)
+
+
+_catalog: Optional[ModelCatalog] = None
+_catalog_lock = threading.Lock()
+
+
+def get_model_catalog() -> ModelCatalog:
+    """Get the process-wide model catalog"""
+    global _catalog
+    # Imported here: ollama_pool uses this module's parser
+    from ollama_pool import get_ollama_pool
+
+    with _catalog_lock:
+        if _catalog is None:
+            _catalog = ModelCatalog(get_ollama_pool())
+        return _catalog
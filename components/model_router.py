@@ -0,0 +1,138 @@
+# Model routing
+# Simple turns go to a small fast model; complex ones (or failed small replies) to the large model
+import re
+import threading
+from typing import Dict, Optional, Tuple
+
+from config import Config
+
+# Sentence boundaries counted to spot multi-part questions
+SENTENCE_END_PATTERN = re.compile(r'[。！？!?]')
+
+ROUTE_SMALL = "small"
+ROUTE_LARGE = "large"
+ROUTE_ESCALATED = "escalated"
+
+
+class ModelRouter:
+    """Chooses the model for each turn and keeps latency/cost statistics"""
+
+    def __init__(self, small_model: str = None, large_model: str = None):
+        """
+        Args:
+            small_model: Fast model for simple turns (defaults to Config.LLM_SMALL_MODEL)
+            large_model: Model for complex turns (defaults to Config.LLM_MODEL)
+        """
+        self.small_model = small_model or Config.LLM_SMALL_MODEL
+        self.large_model = large_model or Config.LLM_MODEL
+        self._lock = threading.Lock()
+        self._stats = {route: {'turns': 0, 'latency': 0.0, 'cost': 0.0, 'baseline_cost': 0.0}
+                       for route in (ROUTE_SMALL, ROUTE_LARGE, ROUTE_ESCALATED)}
+
+    def complexity_reason(self, user_input: str) -> Optional[str]:
+        """
+        Why an input needs the large model
+
+        Returns:
+            Reason string, or None if the input is simple
+        """
+        text = user_input.strip()
+        if len(text) > Config.ROUTER_SIMPLE_MAX_CHARS:
+            return f"long input ({len(text)} chars)"
+        if len(SENTENCE_END_PATTERN.findall(text)) > 1:
+            return "several sentences"
+        for keyword in Config.ROUTER_COMPLEX_KEYWORDS:
+            if keyword in text:
+                return f"keyword '{keyword}'"
+        return None
+
+    def route(self, user_input: str, small_available: bool = True,
+              small_only: bool = False) -> Tuple[str, str, str]:
+        """
+        Pick the model for a turn
+
+        Args:
+            user_input: User input
+            small_available: Whether the small model is installed
+            small_only: Send every turn to the small model (degraded load tier)
+
+        Returns:
+            Tuple (model, route, reason)
+        """
+        if not Config.LLM_ROUTING_ENABLED:
+            return self.large_model, ROUTE_LARGE, "routing disabled"
+        if not small_available:
+            return self.large_model, ROUTE_LARGE, f"{self.small_model} not available"
+        if small_only:
+            return self.small_model, ROUTE_SMALL, "load tier"
+        reason = self.complexity_reason(user_input)
+        if reason:
+            return self.large_model, ROUTE_LARGE, reason
+        return self.small_model, ROUTE_SMALL, "simple input"
+
+    def record(self, route: str, latency: float, small_chars: int = 0, large_chars: int = 0):
+        """
+        Record a finished turn
+
+        Cost is estimated from generated characters, weighting the small
+        model by Config.LLM_SMALL_MODEL_COST relative to the large model.
+
+        Args:
+            route: ROUTE_SMALL, ROUTE_LARGE or ROUTE_ESCALATED
+            latency: Seconds for the whole turn
+            small_chars: Characters generated by the small model
+            large_chars: Characters generated by the large model
+        """
+        with self._lock:
+            stats = self._stats[route]
+            stats['turns'] += 1
+            stats['latency'] += latency
+            stats['cost'] += small_chars * Config.LLM_SMALL_MODEL_COST + large_chars
+            # The same reply from the large model alone (an escalated turn's
+            # failed small attempt would not have happened)
+            stats['baseline_cost'] += large_chars if route == ROUTE_ESCALATED else small_chars + large_chars
+
+    def stats(self) -> Dict[str, object]:
+        """
+        Per-route turns and average latency, plus estimated savings
+
+        Savings compare against sending every turn to the large model: a
+        small-model turn would have cost its characters at full weight and
+        taken the large route's average latency; escalations count against.
+        """
+        with self._lock:
+            routes = {route: dict(values) for route, values in self._stats.items()}
+
+        for values in routes.values():
+            values['avg_latency'] = values['latency'] / values['turns'] if values['turns'] else 0.0
+
+        small, large, escalated = routes[ROUTE_SMALL], routes[ROUTE_LARGE], routes[ROUTE_ESCALATED]
+        turns = sum(values['turns'] for values in routes.values())
+        cost = sum(values['cost'] for values in routes.values())
+        baseline_cost = sum(values['baseline_cost'] for values in routes.values())
+        latency_saved = 0.0
+        if large['turns']:
+            latency_saved = (large['avg_latency'] - small['avg_latency']) * small['turns']
+            # Escalated turns paid for the failed small attempt
+            latency_saved -= (escalated['avg_latency'] - large['avg_latency']) * escalated['turns']
+
+        return {
+            'turns': turns,
+            'routes': routes,
+            'small_share': small['turns'] / turns if turns else 0.0,
+            'cost_saving': 1 - cost / baseline_cost if baseline_cost else 0.0,
+            'latency_saved': latency_saved,
+        }
+
+
+_router: Optional[ModelRouter] = None
+_router_lock = threading.Lock()
+
+
+def get_model_router() -> ModelRouter:
+    """Get the process-wide router (statistics cover every session)"""
+    global _router
+    with _router_lock:
+        if _router is None:
+            _router = ModelRouter()
+        return _router
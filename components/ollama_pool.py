@@ -0,0 +1,328 @@
+# Ollama backend pool
+# Several Ollama hosts: least-outstanding routing, session affinity, health checks, failover
+import random
+import threading
+import time
+from typing import Any, Callable, Dict, Iterator, List, Optional
+
+import ollama
+
+from config import Config
+from load_controller import get_load_controller
+from model_catalog import normalize_model_name, parse_model_names
+
+
+class NoBackendAvailable(Exception):
+    """Raised when no healthy backend can serve a request"""
+
+
+class OllamaBackend:
+    """One Ollama host and its routing state"""
+
+    def __init__(self, host: str):
+        self.host = host
+        self.client = ollama.Client(host=host)
+        self.outstanding = 0
+        self.healthy = True  # Optimistic until the first probe says otherwise
+        self.models: Optional[set] = None  # Normalized names; unknown until the first successful probe
+        self.served = 0
+        self.failures = 0
+        self.last_error: Optional[str] = None
+        self.last_probe = 0.0
+
+    def can_serve(self, model: str) -> bool:
+        return self.healthy and (self.models is None or normalize_model_name(model) in self.models)
+
+
+class OllamaPool:
+    """Routes Ollama calls across several hosts"""
+
+    def __init__(self, hosts: List[str] = None, health_interval: float = None):
+        """
+        Create clients and start the health checker
+
+        Args:
+            hosts: Ollama hosts (defaults to Config.OLLAMA_HOSTS)
+            health_interval: Seconds between probes (defaults to Config.OLLAMA_HEALTH_INTERVAL)
+        """
+        self.backends = [OllamaBackend(host) for host in (hosts or Config.OLLAMA_HOSTS)]
+        self.health_interval = health_interval or Config.OLLAMA_HEALTH_INTERVAL
+        self._affinity: Dict[str, OllamaBackend] = {}
+        self._lock = threading.Lock()
+
+        self.probe_all()
+        self._stop = threading.Event()
+        self._checker = threading.Thread(target=self._health_loop, name="ollama-health", daemon=True)
+        self._checker.start()
+        print(f"Ollama pool: {[backend.host for backend in self.backends]}")
+
+    # --- health -----------------------------------------------------------
+
+    def probe(self, backend: OllamaBackend) -> bool:
+        """
+        Check one backend and refresh its model list
+
+        Returns:
+            True if the backend answered
+        """
+        try:
+            backend.models = {normalize_model_name(name) for name in parse_model_names(backend.client.list())}
+            backend.healthy = True
+            backend.last_error = None
+        except Exception as e:
+            if backend.healthy:
+                print(f"⚠️ Ollama backend {backend.host} unhealthy: {e}")
+            backend.healthy = False
+            backend.last_error = str(e)
+        backend.last_probe = time.time()
+        return backend.healthy
+
+    def probe_all(self):
+        for backend in self.backends:
+            self.probe(backend)
+
+    def _health_loop(self):
+        while not self._stop.wait(self.health_interval):
+            self.probe_all()
+
+    def available_models(self) -> List[str]:
+        """Models present on at least one healthy backend"""
+        models = set()
+        for backend in self.backends:
+            if backend.healthy and backend.models:
+                models |= backend.models
+        return sorted(models)
+
+    def has_model(self, model: str) -> bool:
+        model = normalize_model_name(model)
+        return any(backend.healthy and model in (backend.models or ()) for backend in self.backends)
+
+    # --- routing ----------------------------------------------------------
+
+    def _choose(self, model: str, session_id: str = None, exclude: set = ()) -> OllamaBackend:
+        """
+        Pick a backend: the session's previous one while it is not much
+        busier than the least-loaded one (keeps its prompt cache warm),
+        otherwise the backend with the fewest outstanding requests.
+        """
+        with self._lock:
+            candidates = [b for b in self.backends if b.can_serve(model) and b not in exclude]
+            if not candidates:
+                raise NoBackendAvailable(f"No healthy Ollama backend serves {model}")
+
+            least = min(backend.outstanding for backend in candidates)
+            preferred = self._affinity.get(session_id) if session_id else None
+            if preferred in candidates and preferred.outstanding <= least + Config.OLLAMA_AFFINITY_SLACK:
+                chosen = preferred
+            else:
+                chosen = random.choice([b for b in candidates if b.outstanding == least])
+
+            chosen.outstanding += 1
+            if session_id:
+                self._affinity[session_id] = chosen
+                if len(self._affinity) > Config.OLLAMA_AFFINITY_MAX_SESSIONS:
+                    # Drop the oldest affinities (dicts keep insertion order)
+                    for stale in list(self._affinity)[:len(self._affinity) // 2]:
+                        del self._affinity[stale]
+            return chosen
+
+    def _release(self, backend: OllamaBackend, failed: bool = False):
+        with self._lock:
+            backend.outstanding -= 1
+            if failed:
+                backend.failures += 1
+            else:
+                backend.served += 1
+
+    def _handle_failure(self, backend: OllamaBackend, model: str, error: Exception) -> bool:
+        """
+        Decide whether an error is worth failing over
+
+        Returns:
+            True to retry on another backend, False to re-raise
+        """
+        if isinstance(error, ollama.ResponseError):
+            if getattr(error, 'status_code', None) == 404:
+                # Model missing on this host: stop routing it here
+                backend.models = (backend.models or set()) - {normalize_model_name(model)}
+                return True
+            return False
+        backend.healthy = False
+        backend.last_error = str(error)
+        print(f"⚠️ Ollama backend {backend.host} failed, failing over: {error}")
+        return True
+
+    def _call(self, model: str, session_id: str, method: str, **kwargs) -> Any:
+        """Run a non-streaming client call with failover"""
+        tried = set()
+        while True:
+            backend = self._choose(model, session_id, tried)
+            try:
+                result = getattr(backend.client, method)(model=model, **kwargs)
+            except Exception as e:
+                self._release(backend, failed=True)
+                tried.add(backend)
+                if not self._handle_failure(backend, model, e):
+                    raise
+                continue
+            self._release(backend)
+            return result
+
+    def chat(self, model: str, messages: List[Dict[str, str]], session_id: str = None,
+             stream: bool = False, **kwargs) -> Any:
+        """
+        ollama.chat routed to a backend
+
+        For streams, failover happens only before the first chunk; the
+        backend stays counted as outstanding until the stream is consumed.
+
+        Args:
+            model: Model name
+            messages: Chat messages
+            session_id: Session for affinity routing (optional)
+            stream: Return an iterator of chunks
+
+        Returns:
+            Chat response, or chunk iterator when streaming
+        """
+        if not stream:
+            return self._call(model, session_id, 'chat', messages=messages, **kwargs)
+        return self._stream_chat(model, messages, session_id, **kwargs)
+
+    def _stream_chat(self, model: str, messages: List[Dict[str, str]], session_id: str,
+                     **kwargs) -> Iterator[Any]:
+        tried = set()
+        while True:
+            backend = self._choose(model, session_id, tried)
+            started = False
+            try:
+                for part in backend.client.chat(model=model, messages=messages, stream=True, **kwargs):
+                    started = True
+                    yield part
+            except Exception as e:
+                self._release(backend, failed=True)
+                tried.add(backend)
+                if started or not self._handle_failure(backend, model, e):
+                    raise
+                continue
+            except GeneratorExit:
+                # Consumer stopped early (e.g. cancelled generation)
+                self._release(backend)
+                raise
+            self._release(backend)
+            return
+
+    def embed(self, model: str, texts: List[str]) -> List[List[float]]:
+        """
+        Embed texts on the least-loaded backend
+
+        Args:
+            model: Embedding model
+            texts: Texts to embed
+
+        Returns:
+            One embedding per text
+        """
+        tried = set()
+        while True:
+            backend = self._choose(model, None, tried)
+            try:
+                if hasattr(backend.client, 'embed'):
+                    embeddings = backend.client.embed(model=model, input=texts)['embeddings']
+                else:
+                    embeddings = [backend.client.embeddings(model=model, prompt=text)['embedding']
+                                  for text in texts]
+            except Exception as e:
+                self._release(backend, failed=True)
+                tried.add(backend)
+                if not self._handle_failure(backend, model, e):
+                    raise
+                continue
+            self._release(backend)
+            return embeddings
+
+    def pull(self, model: str, progress: Callable[..., None] = None) -> bool:
+        """
+        Pull a model onto every healthy backend that lacks it
+
+        Args:
+            model: Model name
+            progress: Called as progress(host, status, completed, total) per streamed update
+
+        Returns:
+            True if every healthy backend now has the model
+        """
+        ok = True
+        for backend in self.backends:
+            if not backend.healthy or normalize_model_name(model) in (backend.models or ()):
+                continue
+            try:
+                print(f"Pulling model {model} on {backend.host}")
+                for update in backend.client.pull(model, stream=True):
+                    if progress:
+                        progress(backend.host, update.get('status'), update.get('completed'), update.get('total'))
+                backend.models = (backend.models or set()) | {normalize_model_name(model)}
+            except Exception as e:
+                print(f"Error pulling model on {backend.host}: {e}")
+                ok = False
+        return ok and self.has_model(model)
+
+    def running_models(self) -> List[Dict[str, Any]]:
+        """
+        Models loaded in memory on each healthy backend (ollama ps)
+
+        Returns:
+            List of {'host', 'model', 'size', 'size_vram'}; hosts that do not
+            answer are left out
+        """
+        running = []
+        for backend in self.backends:
+            if not backend.healthy:
+                continue
+            try:
+                response = backend.client.ps()
+            except Exception:
+                continue
+            models = response.models if hasattr(response, 'models') else response.get('models', [])
+            for model in models:
+                get = model.get if isinstance(model, dict) else lambda key, default=None: getattr(model, key, default)
+                running.append({
+                    'host': backend.host,
+                    'model': get('model') or get('name'),
+                    'size': get('size') or 0,
+                    'size_vram': get('size_vram') or 0,
+                })
+        return running
+
+    def in_flight_per_backend(self) -> float:
+        """Requests in flight per healthy backend (all of them if none is healthy)"""
+        with self._lock:
+            healthy = [backend for backend in self.backends if backend.healthy] or self.backends
+            return sum(backend.outstanding for backend in healthy) / len(healthy)
+
+    def stats(self) -> List[Dict[str, Any]]:
+        """Per-backend routing and health counters"""
+        with self._lock:
+            return [{
+                'host': backend.host,
+                'healthy': backend.healthy,
+                'outstanding': backend.outstanding,
+                'served': backend.served,
+                'failures': backend.failures,
+                'models': sorted(backend.models or ()),
+                'last_error': backend.last_error,
+            } for backend in self.backends]
+
+
+_pool: Optional[OllamaPool] = None
+_pool_lock = threading.Lock()
+
+
+def get_ollama_pool() -> OllamaPool:
+    """Get the process-wide backend pool"""
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = OllamaPool()
+            get_load_controller().add_in_flight_probe(_pool.in_flight_per_backend)
+        return _pool
@@ -0,0 +1,313 @@
+# Profiler
+# Opt-in per-turn profiles (stack sampling or cProfile) and process resource figures
+import cProfile
+import glob
+import os
+import pstats
+import sys
+import threading
+import time
+from collections import Counter, deque
+from contextlib import contextmanager
+from typing import Dict, Iterator, List, Optional
+
+try:
+    import psutil
+    PSUTIL_AVAILABLE = True
+except ImportError:
+    psutil = None
+    PSUTIL_AVAILABLE = False
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+from config import Config
+
+# Stage a sample is charged to: the innermost frame whose file matches
+STAGES = [
+    ('stt', ('speech_to_text', 'whisper', 'inference_scheduler')),
+    ('llm', ('llm_handler', 'ollama', 'httpx', 'model_router', 'quality_monitor')),
+    ('tts', ('text_to_speach', 'tts_', 'TTS', 'audio_stream', 'sounddevice')),
+    ('sqlite', ('memory_manager', 'conversation_', 'session_', 'turn_cache', 'long_term_memory', 'sqlite3')),
+    ('streamlit', ('streamlit',)),
+]
+
+# Files whose innermost frame means a thread is parked, not working
+IDLE_FILES = ('threading.py', 'queue.py', 'selectors.py')
+
+
+def current_rss() -> int:
+    """Resident set size of this process in bytes (0 if unknown)"""
+    if psutil:
+        return psutil.Process().memory_info().rss
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, AttributeError):
+        pass
+    if resource:
+        # Peak rather than current; kilobytes on Linux
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+    return 0
+
+
+def _frame_stage(filename: str) -> Optional[str]:
+    for stage, markers in STAGES:
+        if any(marker in filename for marker in markers):
+            return stage
+    return None
+
+
+def _parked(frame) -> bool:
+    """The thread is waiting on a lock, queue or selector"""
+    return os.path.basename(frame.f_code.co_filename) in IDLE_FILES
+
+
+class StackSampler(threading.Thread):
+    """
+    Samples the profiled thread's Python stack at a fixed interval
+
+    Threads started while sampling (workers the turn spawns) are sampled
+    too, except while parked in a wait; threads that were already running
+    (idle pools, Streamlit's server, other sessions) are left out. The
+    profiled thread is always sampled, so time it spends waiting on a
+    worker still counts towards the stage it waits in.
+
+    Stacks are kept collapsed ("thread;outer;...;inner" -> count), the
+    input format of flamegraph.pl and speedscope.
+    """
+
+    def __init__(self, interval: float, target: int = None):
+        """
+        Args:
+            interval: Seconds between samples
+            target: Ident of the profiled thread (defaults to the caller)
+        """
+        super().__init__(name="stack-sampler", daemon=True)
+        self.interval = interval
+        self.target = target or threading.get_ident()
+        self._preexisting = {thread.ident for thread in threading.enumerate()} - {self.target}
+        self.stacks: Counter = Counter()
+        self.stages: Counter = Counter()
+        self.samples = 0
+        self._stop_event = threading.Event()
+
+    def run(self):
+        own = threading.get_ident()
+        names = {}
+        while not self._stop_event.wait(self.interval):
+            if len(names) != threading.active_count():
+                names = {thread.ident: thread.name for thread in threading.enumerate()}
+            for ident, frame in sys._current_frames().items():
+                if ident == own or ident in self._preexisting:
+                    continue
+                if ident != self.target and _parked(frame):
+                    continue
+                self._record(names.get(ident, str(ident)), frame)
+            self.samples += 1
+
+    def _record(self, thread_name: str, frame):
+        frames = []
+        stage = None
+        while frame is not None:
+            code = frame.f_code
+            if stage is None:
+                stage = _frame_stage(code.co_filename)
+            frames.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{frame.f_lineno})")
+            frame = frame.f_back
+        frames.append(thread_name)
+        self.stacks[';'.join(reversed(frames))] += 1
+        self.stages[stage or 'other'] += 1
+
+    def stop(self):
+        self._stop_event.set()
+        self.join()
+
+
+class Profiler:
+    """
+    Turn profiles and resource figures for one process
+
+    Disabled unless Config.PROFILING_ENABLED; profile() is then a no-op.
+    """
+
+    def __init__(self):
+        self.enabled = Config.PROFILING_ENABLED
+        self.mode = Config.PROFILING_MODE
+        self.output_dir = Config.PROFILING_OUTPUT_DIR
+        self.records = deque(maxlen=20)
+        self.model_memory: Dict[str, int] = {}
+        self.model_reports = None  # Queue to the parent process, set in inference workers
+        self._lock = threading.Lock()
+        self._active = False  # One profile at a time; nested/concurrent turns are skipped
+        self._last_cpu = (time.monotonic(), time.process_time())
+        self.reruns = 0
+        self.rerun_seconds = 0.0
+
+    @contextmanager
+    def profile(self, label: str) -> Iterator[None]:
+        """
+        Profile the enclosed block
+
+        Writes <output_dir>/<time>-<label>.collapsed (stack sampling) or
+        .prof (cProfile) and keeps a summary in `records`.
+        """
+        with self._lock:
+            skip = not self.enabled or self._active
+            if not skip:
+                self._active = True
+        if skip:
+            yield
+            return
+
+        sampler = profiler = None
+        if self.mode == 'cprofile':
+            profiler = cProfile.Profile()
+        else:
+            sampler = StackSampler(Config.PROFILING_INTERVAL)
+
+        started, cpu_started, rss_before = time.perf_counter(), time.process_time(), current_rss()
+        if profiler:
+            profiler.enable()
+        else:
+            sampler.start()
+        try:
+            yield
+        finally:
+            if profiler:
+                profiler.disable()
+            else:
+                sampler.stop()
+            record = {
+                'label': label,
+                'at': time.time(),
+                'wall': time.perf_counter() - started,
+                'cpu': time.process_time() - cpu_started,
+                'rss_before': rss_before,
+                'rss_after': current_rss(),
+            }
+            try:
+                record.update(self._write(label, profiler, sampler))
+            except Exception as e:
+                print(f"Error writing profile: {e}")
+            with self._lock:
+                self.records.append(record)
+                self._active = False
+            print(f"Profile {label}: {record['wall']:.2f}s wall, {record['cpu']:.2f}s CPU -> {record.get('path')}")
+
+    def _write(self, label: str, profiler: Optional[cProfile.Profile],
+               sampler: Optional[StackSampler]) -> Dict[str, object]:
+        os.makedirs(self.output_dir, exist_ok=True)
+        now = time.time()
+        stamp = f"{time.strftime('%Y%m%d-%H%M%S', time.localtime(now))}.{int(now * 1000) % 1000:03d}"
+        base = os.path.join(self.output_dir, f"{stamp}-{label}")
+        if profiler:
+            path = f"{base}.prof"
+            profiler.dump_stats(path)
+            top = pstats.Stats(profiler).sort_stats('cumulative').stats
+            stages = Counter()
+            for (filename, _, _), (_, _, total, _, _) in top.items():
+                stages[_frame_stage(filename) or 'other'] += total
+            summary = {'path': path, 'stages': self._shares(stages)}
+        else:
+            path = f"{base}.collapsed"
+            with open(path, 'w', encoding='utf-8') as f:
+                for stack, count in sampler.stacks.most_common():
+                    f.write(f"{stack} {count}\n")
+            summary = {'path': path, 'samples': sampler.samples, 'stages': self._shares(sampler.stages)}
+        self._prune()
+        return summary
+
+    @staticmethod
+    def _shares(counts: Counter) -> Dict[str, float]:
+        total = sum(counts.values())
+        return {stage: count / total for stage, count in counts.most_common()} if total else {}
+
+    def _prune(self):
+        files = sorted(glob.glob(os.path.join(self.output_dir, '*.collapsed'))
+                       + glob.glob(os.path.join(self.output_dir, '*.prof')), key=os.path.getmtime)
+        for path in files[:-Config.PROFILING_KEEP_FILES]:
+            os.remove(path)
+
+    @contextmanager
+    def track_model(self, name: str) -> Iterator[None]:
+        """
+        Attribute the RSS growth of the enclosed model load to `name`
+
+        In an inference worker the figure is also reported to the parent
+        process (see model_reports).
+        """
+        before = current_rss()
+        try:
+            yield
+        finally:
+            self.record_model(name, max(current_rss() - before, 0))
+
+    def record_model(self, name: str, size: int):
+        """
+        Set the memory attributed to a model
+
+        Args:
+            name: Model label shown in the resource panel
+            size: Bytes
+        """
+        with self._lock:
+            self.model_memory[name] = size
+        if self.model_reports is not None:
+            self.model_reports.put((os.getpid(), name, size))
+
+    def record_rerun(self, seconds: float):
+        """Count one Streamlit script run"""
+        with self._lock:
+            self.reruns += 1
+            self.rerun_seconds += seconds
+
+    def resources(self) -> Dict[str, object]:
+        """
+        Process resource figures
+
+        Returns:
+            Dictionary with rss, cpu_seconds, cpu_percent (since the previous
+            call), threads, worker_rss (child processes, needs psutil),
+            model_memory, reruns and avg_rerun
+        """
+        now, cpu = time.monotonic(), time.process_time()
+        with self._lock:
+            last_now, last_cpu = self._last_cpu
+            self._last_cpu = (now, cpu)
+            stats = {
+                'rss': current_rss(),
+                'cpu_seconds': cpu,
+                'cpu_percent': 100 * (cpu - last_cpu) / (now - last_now) if now > last_now else 0.0,
+                'threads': threading.active_count(),
+                'worker_rss': 0,
+                'model_memory': dict(self.model_memory),
+                'reruns': self.reruns,
+                'avg_rerun': self.rerun_seconds / self.reruns if self.reruns else 0.0,
+            }
+        if psutil:
+            try:
+                stats['worker_rss'] = sum(child.memory_info().rss
+                                          for child in psutil.Process().children(recursive=True))
+            except psutil.Error:
+                pass
+        return stats
+
+    def recent(self) -> List[Dict[str, object]]:
+        with self._lock:
+            return list(self.records)
+
+
+_profiler: Optional[Profiler] = None
+_profiler_lock = threading.Lock()
+
+
+def get_profiler() -> Profiler:
+    """Get the process-wide profiler"""
+    global _profiler
+    with _profiler_lock:
+        if _profiler is None:
+            _profiler = Profiler()
+        return _profiler
@@ -0,0 +1,105 @@
+# Streaming quality monitor
+# Watches tokens as they arrive and aborts generations that are turning into garbage
+import re
+import threading
+from typing import Dict, Optional
+
+from config import Config
+
+# Japanese script: kana and kanji
+JAPANESE_CHAR_PATTERN = re.compile(r'[\u3040-\u309F\u30A0-\u30FF\u4E00-\u9FAF]')
+# The runs _clean_response strips: long digit strings, long Latin words
+GARBAGE_PATTERN = re.compile(r'\d{5,}|[a-zA-Z]{10,}')
+
+_stats = {'generations': 0, 'aborts': 0, 'recovered': 0, 'by_reason': {}}
+_stats_lock = threading.Lock()
+
+
+class GenerationAborted(Exception):
+    """Raised from a generation stream that the monitor gave up on"""
+
+    def __init__(self, reason: str, chars: int):
+        super().__init__(reason)
+        self.reason = reason
+        self.chars = chars
+
+
+def record_generation(aborts: int, recovered: bool):
+    """
+    Count a finished turn
+
+    Args:
+        aborts: Attempts aborted during the turn
+        recovered: Whether a retry produced a usable reply after an abort
+    """
+    with _stats_lock:
+        _stats['generations'] += 1
+        _stats['aborts'] += aborts
+        if aborts and recovered:
+            _stats['recovered'] += 1
+
+
+def quality_stats() -> Dict[str, object]:
+    """
+    Process-wide monitor counters
+
+    Returns:
+        Dictionary with generations, aborts, recovered, by_reason and
+        abort_rate (aborted attempts per generation)
+    """
+    with _stats_lock:
+        stats = dict(_stats, by_reason=dict(_stats['by_reason']))
+    stats['abort_rate'] = stats['aborts'] / stats['generations'] if stats['generations'] else 0.0
+    return stats
+
+
+class QualityMonitor:
+    """Running quality checks over one generation's streamed text"""
+
+    def __init__(self):
+        self.text = []
+        self.chars = 0
+        self.japanese_chars = 0
+
+    def feed(self, chunk: str) -> Optional[str]:
+        """
+        Add a streamed chunk
+
+        Args:
+            chunk: Raw text from the model
+
+        Returns:
+            Abort reason, or None while the text looks healthy
+        """
+        self.text.append(chunk)
+        self.chars += sum(1 for c in chunk if not c.isspace())
+        self.japanese_chars += len(JAPANESE_CHAR_PATTERN.findall(chunk))
+        return self.check()
+
+    @property
+    def ready(self) -> bool:
+        """Enough text has arrived for the ratios to mean something"""
+        return self.chars >= Config.QUALITY_MIN_CHARS
+
+    def check(self) -> Optional[str]:
+        if not self.ready:
+            return None
+
+        japanese_ratio = self.japanese_chars / self.chars
+        if japanese_ratio < Config.QUALITY_MIN_JAPANESE_RATIO:
+            return f"japanese ratio {japanese_ratio:.2f}"
+
+        text = ''.join(self.text)
+        garbage = sum(len(match) for match in GARBAGE_PATTERN.findall(text))
+        garbage_rate = garbage / self.chars
+        if garbage_rate > Config.QUALITY_MAX_GARBAGE_RATE:
+            return f"garbage rate {garbage_rate:.2f}"
+        return None
+
+    def abort(self, reason: str) -> GenerationAborted:
+        """Count an abort and build the exception to raise"""
+        with _stats_lock:
+            kind = reason.rsplit(' ', 1)[0]
+            _stats['by_reason'][kind] = _stats['by_reason'].get(kind, 0) + 1
+        print(f"Generation aborted after {self.chars} chars: {reason}")
+        return GenerationAborted(reason, len(''.join(self.text)))
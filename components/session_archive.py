@@ -0,0 +1,352 @@
+# Session archive
+# Moves idle sessions into compressed JSONL files and keeps the hot DB small
+import gzip
+import io
+import json
+import os
+import sqlite3
+from datetime import datetime
+from typing import List, Dict, Tuple
+
+try:
+    import zstandard
+    ZSTD_AVAILABLE = True
+except ImportError:
+    ZSTD_AVAILABLE = False
+    zstandard = None
+
+from config import Config
+from conversation_shards import ConversationShards, get_conversation_shards, reserve_ids
+from conversation_stats import pause_stats, resume_stats
+
+ARCHIVE_TABLE = '''
+    CREATE TABLE IF NOT EXISTS archived_sessions (
+        session_id TEXT PRIMARY KEY,
+        title TEXT,
+        created_at DATETIME,
+        last_activity DATETIME,
+        turn_count INTEGER NOT NULL DEFAULT 0,
+        archive_path TEXT,
+        archived_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+        metadata TEXT,
+        stats_kept INTEGER NOT NULL DEFAULT 0
+    )
+'''
+
+
+def install_archive_schema(cursor: sqlite3.Cursor):
+    """
+    Create the archive index table
+
+    Args:
+        cursor: Cursor on the conversation database
+    """
+    cursor.execute(ARCHIVE_TABLE)
+    columns = {row[1] for row in cursor.execute('PRAGMA table_info(archived_sessions)')}
+    if 'stats_kept' not in columns:
+        # Sessions archived before this column took their turns out of the statistics
+        cursor.execute('ALTER TABLE archived_sessions ADD COLUMN stats_kept INTEGER NOT NULL DEFAULT 0')
+    cursor.execute('''
+        CREATE INDEX IF NOT EXISTS idx_archived_sessions_last_activity
+        ON archived_sessions (last_activity)
+    ''')
+
+
+def _open_archive(path: str, mode: str):
+    """Open a .jsonl.zst or .jsonl.gz archive as a text stream"""
+    if path.endswith(".zst"):
+        if not ZSTD_AVAILABLE:
+            raise RuntimeError("zstandard is required to read .zst archives (pip install zstandard)")
+        raw = open(path, mode + "b")
+        if mode == "w":
+            stream = zstandard.ZstdCompressor(level=10).stream_writer(raw, closefd=True)
+        else:
+            stream = zstandard.ZstdDecompressor().stream_reader(raw, closefd=True)
+        return io.TextIOWrapper(stream, encoding="utf-8")
+    return gzip.open(path, mode + "t", encoding="utf-8")
+
+
+class SessionArchiver:
+    """Retention subsystem: archive idle sessions, rehydrate on demand, vacuum"""
+
+    def __init__(self, shards: ConversationShards = None, archive_dir: str = None):
+        """
+        Initialize archiver
+
+        Args:
+            shards: Conversation databases (defaults to the process-wide shard map);
+                    an archived session stays indexed in its shard
+            archive_dir: Archive root (defaults to Config.ARCHIVE_PATH)
+        """
+        self.shards = shards or get_conversation_shards()
+        self.archive_dir = archive_dir or Config.ARCHIVE_PATH
+        use_zstd = Config.ARCHIVE_COMPRESSION == "zstd" and ZSTD_AVAILABLE
+        self.extension = ".jsonl.zst" if use_zstd else ".jsonl.gz"
+
+    def _archive_file(self, session_id: str) -> str:
+        """Relative path for a new archive file, sharded by month"""
+        month = datetime.utcnow().strftime("%Y/%m")
+        return os.path.join(month, f"{session_id}{self.extension}")
+
+    def archive_idle_sessions(self, idle_days: int = None, limit: int = None) -> int:
+        """
+        Archive every session idle for longer than the threshold
+
+        Args:
+            idle_days: Idle threshold (defaults to Config.ARCHIVE_IDLE_DAYS)
+            limit: Maximum number of sessions to archive in this run
+
+        Returns:
+            Number of sessions archived
+        """
+        idle_days = Config.ARCHIVE_IDLE_DAYS if idle_days is None else idle_days
+
+        idle = []
+        for path in self.shards.paths:
+            with sqlite3.connect(path) as conn:
+                cursor = conn.cursor()
+                cursor.execute('''
+                    SELECT last_activity, session_id FROM sessions
+                    WHERE last_activity < DATETIME('now', ?)
+                    ORDER BY last_activity ASC
+                    LIMIT ?
+                ''', (f"-{idle_days} days", limit if limit is not None else -1))
+                idle.extend(cursor.fetchall())
+        idle.sort()
+        session_ids = [session_id for _, session_id in idle[:limit]]
+
+        archived = 0
+        for session_id in session_ids:
+            if self.archive_session(session_id):
+                archived += 1
+
+        if archived:
+            print(f"Archived {archived} idle sessions")
+            self.incremental_vacuum()
+        return archived
+
+    def archive_session(self, session_id: str) -> bool:
+        """
+        Move one session and its turns into an archive file
+
+        The file is fully written before the rows are deleted, so a crash
+        can leave a stray file but never loses conversations. The statistics
+        rollups keep counting the session's turns.
+
+        Args:
+            session_id: Session identifier
+
+        Returns:
+            True if archived, False otherwise
+        """
+        try:
+            with sqlite3.connect(self.shards.locate(session_id)) as conn:
+                cursor = conn.cursor()
+                cursor.execute('''
+                    SELECT session_id, created_at, last_activity, title, metadata
+                    FROM sessions WHERE session_id = ?
+                ''', (session_id,))
+                session = cursor.fetchone()
+                if session is None:
+                    return False
+                _, created_at, last_activity, title, metadata = session
+
+                cursor.execute('''
+                    SELECT id, user_input, bot_response, timestamp, audio_file_path, metadata
+                    FROM conversations
+                    WHERE session_id = ?
+                    ORDER BY id ASC
+                ''', (session_id,))
+                turns = cursor.fetchall()
+
+                relative_path = None
+                if turns:
+                    relative_path = self._archive_file(session_id)
+                    full_path = os.path.join(self.archive_dir, relative_path)
+                    os.makedirs(os.path.dirname(full_path), exist_ok=True)
+                    tmp_path = os.path.join(os.path.dirname(full_path), "tmp-" + os.path.basename(full_path))
+                    with _open_archive(tmp_path, "w") as f:
+                        f.write(json.dumps({
+                            'type': 'session', 'session_id': session_id, 'created_at': created_at,
+                            'last_activity': last_activity, 'title': title, 'metadata': metadata
+                        }, ensure_ascii=False) + "\n")
+                        for turn_id, user_input, bot_response, timestamp, audio_file_path, turn_metadata in turns:
+                            f.write(json.dumps({
+                                'type': 'turn', 'id': turn_id, 'user_input': user_input,
+                                'bot_response': bot_response, 'timestamp': timestamp,
+                                'audio_file_path': audio_file_path, 'metadata': turn_metadata
+                            }, ensure_ascii=False) + "\n")
+                    os.replace(tmp_path, full_path)
+
+                cursor.execute('''
+                    INSERT OR REPLACE INTO archived_sessions
+                    (session_id, title, created_at, last_activity, turn_count, archive_path, metadata, stats_kept)
+                    VALUES (?, ?, ?, ?, ?, ?, ?, 1)
+                ''', (session_id, title, created_at, last_activity, len(turns), relative_path, metadata))
+                pause_stats(cursor)
+                cursor.execute('DELETE FROM conversations WHERE session_id = ?', (session_id,))
+                cursor.execute('DELETE FROM sessions WHERE session_id = ?', (session_id,))
+                resume_stats(cursor)
+                conn.commit()
+
+            return True
+
+        except Exception as e:
+            print(f"Error archiving session {session_id}: {e}")
+            return False
+
+    def is_archived(self, session_id: str) -> bool:
+        """
+        Check whether a session lives in the archive
+
+        Args:
+            session_id: Session identifier
+
+        Returns:
+            True if archived, False otherwise
+        """
+        with sqlite3.connect(self.shards.locate(session_id)) as conn:
+            cursor = conn.cursor()
+            cursor.execute('SELECT 1 FROM archived_sessions WHERE session_id = ?', (session_id,))
+            return cursor.fetchone() is not None
+
+    def rehydrate(self, session_id: str) -> bool:
+        """
+        Restore an archived session into the hot database
+
+        Turns keep their original ids and timestamps, so the search index
+        and the long-term memory index see the same rows. The statistics
+        still count them from before archiving, so they are not added again.
+
+        Args:
+            session_id: Session identifier
+
+        Returns:
+            True if restored, False otherwise
+        """
+        try:
+            with sqlite3.connect(self.shards.locate(session_id)) as conn:
+                cursor = conn.cursor()
+                cursor.execute('''
+                    SELECT title, created_at, last_activity, archive_path, metadata, stats_kept
+                    FROM archived_sessions WHERE session_id = ?
+                ''', (session_id,))
+                entry = cursor.fetchone()
+                if entry is None:
+                    return False
+                title, created_at, last_activity, relative_path, metadata, stats_kept = entry
+
+                cursor.execute('DELETE FROM archived_sessions WHERE session_id = ?', (session_id,))
+                if stats_kept:
+                    pause_stats(cursor)
+                cursor.execute('''
+                    INSERT OR IGNORE INTO sessions (session_id, created_at, last_activity, title, metadata)
+                    VALUES (?, ?, ?, ?, ?)
+                ''', (session_id, created_at, last_activity, title, metadata))
+
+                full_path = os.path.join(self.archive_dir, relative_path) if relative_path else None
+                if full_path:
+                    with _open_archive(full_path, "r") as f:
+                        batch = []
+                        for line in f:
+                            record = json.loads(line)
+                            if record['type'] != 'turn':
+                                continue
+                            batch.append((
+                                record['id'], session_id, record['user_input'], record['bot_response'],
+                                record['timestamp'], record['audio_file_path'], record['metadata']
+                            ))
+                            if len(batch) >= 500:
+                                self._insert_turns(cursor, batch)
+                                batch = []
+                        self._insert_turns(cursor, batch)
+
+                resume_stats(cursor)
+                conn.commit()
+
+            if full_path:
+                os.unlink(full_path)
+            print(f"Session rehydrated from archive: {session_id}")
+            return True
+
+        except Exception as e:
+            print(f"Error rehydrating session {session_id}: {e}")
+            return False
+
+    def _insert_turns(self, cursor: sqlite3.Cursor, batch: List[Tuple]):
+        """Insert archived turns with their original ids"""
+        if batch:
+            cursor.executemany('''
+                INSERT OR IGNORE INTO conversations
+                (id, session_id, user_input, bot_response, timestamp, audio_file_path, metadata)
+                VALUES (?, ?, ?, ?, ?, ?, ?)
+            ''', batch)
+            if self.shards.sharded:
+                # The session may have been archived on another shard; new turns must sort after these
+                reserve_ids(cursor, max(turn[0] for turn in batch))
+
+    def list_archived(self, limit: int = 20) -> List[Tuple[str, str, str, int]]:
+        """
+        List archived sessions, most recently active first
+
+        Args:
+            limit: Maximum number of sessions
+
+        Returns:
+            List of tuples (session_id, title, last_activity, turn_count)
+        """
+        archived = []
+        for path in self.shards.paths:
+            with sqlite3.connect(path) as conn:
+                cursor = conn.cursor()
+                cursor.execute('''
+                    SELECT session_id, title, last_activity, turn_count
+                    FROM archived_sessions
+                    ORDER BY last_activity DESC
+                    LIMIT ?
+                ''', (limit,))
+                archived.extend(cursor.fetchall())
+        archived.sort(key=lambda row: row[2] or '', reverse=True)
+        return archived[:limit]
+
+    def incremental_vacuum(self, pages: int = None) -> Dict[str, int]:
+        """
+        Return free pages to the filesystem
+
+        The first call switches the database to incremental auto-vacuum,
+        which needs one full VACUUM; later calls are cheap and bounded.
+
+        Args:
+            pages: Maximum pages to release per shard (defaults to Config.VACUUM_PAGES)
+
+        Returns:
+            Dictionary with free page counts before and after (all shards)
+        """
+        pages = Config.VACUUM_PAGES if pages is None else pages
+        result = {'free_pages_before': 0, 'free_pages_after': 0}
+        for path in self.shards.paths:
+            before, after = self._vacuum_shard(path, pages)
+            result['free_pages_before'] += before
+            result['free_pages_after'] += after
+        return result
+
+    def _vacuum_shard(self, path: str, pages: int) -> Tuple[int, int]:
+        conn = sqlite3.connect(path, isolation_level=None)
+        try:
+            cursor = conn.cursor()
+            cursor.execute('PRAGMA auto_vacuum')
+            if cursor.fetchone()[0] != 2:
+                print("Enabling incremental auto-vacuum (one-time full VACUUM)...")
+                cursor.execute('PRAGMA auto_vacuum = INCREMENTAL')
+                cursor.execute('VACUUM')
+
+            cursor.execute('PRAGMA freelist_count')
+            before = cursor.fetchone()[0]
+            cursor.execute(f'PRAGMA incremental_vacuum({int(pages)})')
+            cursor.fetchall()
+            cursor.execute('PRAGMA freelist_count')
+            after = cursor.fetchone()[0]
+            return before, after
+
+        finally:
+            conn.close()
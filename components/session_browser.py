@@ -0,0 +1,124 @@
+# Session browser
+# TTL-cached, keyset-paginated access to sessions for the sidebar
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from config import Config
+from memory_manager import MemoryManager, get_data_version
+
+# Cursor for the next page: (last_activity, session_id) of the last row shown
+PageCursor = Optional[Tuple[str, str]]
+
+
+class TTLCache:
+    """Small thread-safe cache whose entries expire after a TTL or on any write"""
+
+    def __init__(self, ttl: float, max_entries: int = 256):
+        """
+        Initialize cache
+
+        Args:
+            ttl: Entry lifetime in seconds
+            max_entries: Entries kept before the oldest are dropped
+        """
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entries: Dict[Any, Tuple[float, int, Any]] = {}
+        self._lock = threading.Lock()
+
+    def get_or_load(self, key: Any, loader: Callable[[], Any]) -> Any:
+        """
+        Return a fresh cached value, or load and cache it
+
+        An entry is fresh if it is younger than the TTL and no conversation
+        write happened since it was loaded (see get_data_version).
+
+        Args:
+            key: Cache key
+            loader: Called on a miss
+
+        Returns:
+            Cached or freshly loaded value
+        """
+        now = time.monotonic()
+        version = get_data_version()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry and entry[0] > now and entry[1] == version:
+                return entry[2]
+
+        value = loader()
+
+        with self._lock:
+            if len(self._entries) >= self.max_entries:
+                oldest = sorted(self._entries, key=lambda k: self._entries[k][0])
+                for stale_key in oldest[:len(oldest) // 2]:
+                    del self._entries[stale_key]
+            self._entries[key] = (now + self.ttl, version, value)
+        return value
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+# Shared by every browser session in this process
+_cache = TTLCache(Config.SESSION_CACHE_TTL)
+
+
+class SessionBrowser:
+    """Paginated session list with lazily loaded previews"""
+
+    def __init__(self, memory: MemoryManager, page_size: int = None):
+        """
+        Initialize session browser
+
+        Args:
+            memory: Memory manager used on cache misses
+            page_size: Sessions per page (defaults to Config.SESSION_PAGE_SIZE)
+        """
+        self.memory = memory
+        self.page_size = page_size or Config.SESSION_PAGE_SIZE
+
+    def page(self, cursor: PageCursor = None) -> Tuple[List[Dict[str, Any]], PageCursor]:
+        """
+        Get one page of sessions with their turn counts
+
+        Args:
+            cursor: Cursor returned with the previous page (None for the first)
+
+        Returns:
+            Tuple (sessions, next_cursor); next_cursor is None on the last page
+        """
+        def load():
+            # One extra row tells whether another page exists
+            rows = self.memory.get_sessions_page(self.page_size + 1, cursor)
+            visible = rows[:self.page_size]
+            counts = self.memory.get_session_turn_counts([row[0] for row in visible])
+            sessions = [{
+                'session_id': session_id,
+                'title': title,
+                'last_activity': last_activity,
+                'created_at': created_at,
+                'turns': counts.get(session_id, 0)
+            } for session_id, title, last_activity, created_at in visible]
+            next_cursor = (visible[-1][2], visible[-1][0]) if len(rows) > self.page_size else None
+            return sessions, next_cursor
+
+        return _cache.get_or_load(('page', self.memory.db_path, self.page_size, cursor), load)
+
+    def preview(self, session_id: str) -> Optional[Dict[str, str]]:
+        """
+        Get a session's latest exchange, loaded only when requested
+
+        Args:
+            session_id: Session identifier
+
+        Returns:
+            Dictionary with user_input, bot_response and timestamp, or None
+        """
+        return _cache.get_or_load(
+            ('preview', self.memory.db_path, session_id),
+            lambda: self.memory.get_session_preview(session_id)
+        )
@@ -0,0 +1,173 @@
+# Speculative generation
+# Start the LLM on a stable partial transcript while the user is still speaking
+import difflib
+import re
+import threading
+import time
+from typing import Callable, Dict, Optional
+
+from config import Config
+from llm_handler import ERROR_RESPONSE
+
+# Whitespace and punctuation ignored when comparing transcripts
+TRANSCRIPT_NOISE_PATTERN = re.compile(r'[\s。、，．！？!?,.「」（）()・…ー〜~]')
+
+_stats = {'turns': 0, 'speculated': 0, 'hits': 0, 'misses': 0, 'restarts': 0,
+          'latency_saved': 0.0}
+_stats_lock = threading.Lock()
+
+
+def _count(key: str, amount=1):
+    with _stats_lock:
+        _stats[key] += amount
+
+
+def speculation_stats() -> Dict[str, float]:
+    """
+    Process-wide speculation counters
+
+    Returns:
+        Dictionary with turns, speculated, hits, misses, restarts,
+        hit_rate (hits per speculated turn), latency_saved (seconds)
+        and avg_latency_saved (seconds per hit)
+    """
+    with _stats_lock:
+        stats = dict(_stats)
+    stats['hit_rate'] = stats['hits'] / stats['speculated'] if stats['speculated'] else 0.0
+    stats['avg_latency_saved'] = stats['latency_saved'] / stats['hits'] if stats['hits'] else 0.0
+    return stats
+
+
+def normalize_transcript(text: str) -> str:
+    return TRANSCRIPT_NOISE_PATTERN.sub('', text or '')
+
+
+def transcript_divergence(a: str, b: str) -> float:
+    """
+    How different two transcripts are, ignoring whitespace and punctuation
+
+    Returns:
+        0.0 for identical text up to 1.0 for nothing in common
+    """
+    a, b = normalize_transcript(a), normalize_transcript(b)
+    if a == b:
+        return 0.0
+    return 1.0 - difflib.SequenceMatcher(None, a, b).ratio()
+
+
+class _Speculation:
+    """One background generation for a given partial transcript"""
+
+    def __init__(self, text: str, generate: Callable[[str, threading.Event], Optional[str]]):
+        self.text = text
+        self.cancel = threading.Event()
+        self.response: Optional[str] = None
+        self.started_at = time.perf_counter()
+        self.finished_at: Optional[float] = None
+        self._done = threading.Event()
+        self._thread = threading.Thread(target=self._run, args=(generate,), name="speculation", daemon=True)
+        self._thread.start()
+
+    def _run(self, generate):
+        try:
+            self.response = generate(self.text, self.cancel)
+        except Exception as e:
+            print(f"Speculative generation failed: {e}")
+        finally:
+            self.finished_at = time.perf_counter()
+            self._done.set()
+
+    def wait(self) -> Optional[str]:
+        self._done.wait()
+        return self.response
+
+
+class SpeculativeResponder:
+    """
+    Drives one voice turn: fed partial transcripts while capture runs,
+    then asked for a reply once the final transcript is known
+
+    A partial is considered stable when two consecutive partials agree;
+    generation starts on it in the background. If a later stable partial
+    or the final transcript diverges by more than the threshold, the
+    speculative generation is cancelled (and restarted for partials).
+    """
+
+    def __init__(self, generate: Callable[[str, threading.Event], Optional[str]],
+                 max_divergence: float = None):
+        """
+        Args:
+            generate: Called as generate(text, cancel_event) on a worker thread;
+                      returns the reply, or None if cancelled
+            max_divergence: Largest transcript_divergence still counted as a hit
+                            (defaults to Config.SPECULATION_MAX_DIVERGENCE)
+        """
+        self.generate = generate
+        self.max_divergence = (Config.SPECULATION_MAX_DIVERGENCE if max_divergence is None
+                               else max_divergence)
+        self._last_partial: Optional[str] = None
+        self._current: Optional[_Speculation] = None
+
+    def on_partial(self, text: str):
+        """Feed a partial transcript (called from the capture loop)"""
+        if not normalize_transcript(text):
+            return
+        stable = self._last_partial is not None and transcript_divergence(text, self._last_partial) == 0.0
+        self._last_partial = text
+        if not stable:
+            return
+
+        if self._current is not None:
+            if transcript_divergence(text, self._current.text) <= self.max_divergence:
+                return
+            self._current.cancel.set()
+            _count('restarts')
+            print(f"Speculation restarted: '{self._current.text}' -> '{text}'")
+
+        print(f"Speculating on partial transcript: {text}")
+        self._current = _Speculation(text, self.generate)
+
+    def finalize(self, final_text: str) -> Optional[str]:
+        """
+        Resolve the turn against the final transcript
+
+        Args:
+            final_text: Final transcript of the full capture
+
+        Returns:
+            The speculative reply on a hit, or None when the caller must
+            generate from the final transcript (also when the speculative
+            generation failed with an error)
+        """
+        _count('turns')
+        speculation, self._current = self._current, None
+        if speculation is None:
+            return None
+        _count('speculated')
+
+        divergence = transcript_divergence(final_text, speculation.text)
+        if divergence > self.max_divergence:
+            speculation.cancel.set()
+            _count('misses')
+            print(f"Speculation missed (divergence {divergence:.2f}): '{speculation.text}' vs '{final_text}'")
+            return None
+
+        final_at = time.perf_counter()
+        response = speculation.wait()
+        if response is None or response == ERROR_RESPONSE:
+            _count('misses')
+            return None
+
+        # Without speculation the whole generation would have started now
+        saved = min(speculation.finished_at - speculation.started_at, final_at - speculation.started_at)
+        saved = max(saved, 0.0)
+        _count('hits')
+        _count('latency_saved', saved)
+        print(f"Speculation hit (divergence {divergence:.2f}), saved {saved:.2f}s")
+        return response
+
+    def abandon(self):
+        """Cancel any running speculation (e.g. capture failed)"""
+        if self._current is not None:
+            self._current.cancel.set()
+            self._current = None
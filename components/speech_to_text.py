@@ -2,7 +2,9 @@
 # Whisper
 import tempfile
 import os
-from typing import Optional
+import time
+import weakref
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
 import numpy as np
 
 # Try to import audio and whisper packages
@@ -36,30 +38,57 @@ except ImportError:
     sf = None
 
 from config import Config
+from audio_buffers import AudioRingBuffer, count_copy, get_audio_buffer_pool
+from audio_decode import WHISPER_RATE, AudioDecoder, AudioSource, iter_chunks
+from inference_scheduler import PRIORITY_BATCH, PRIORITY_INTERACTIVE, SchedulerBusy
+from load_controller import get_load_controller
+from profiler import get_profiler
 
 class SpeechToText:
     """Speech-to-Text using OpenAI Whisper optimized for Japanese"""
     
-    def __init__(self):
-        """Initialize Whisper model"""
+    def __init__(self, scheduler=None):
+        """
+        Initialize Whisper model
+        
+        Args:
+            scheduler: InferenceScheduler running the model in worker
+                       processes; when given, no model is loaded here
+        """
         self.model = None
         self.sample_rate = Config.SAMPLE_RATE
         self.available = False
         self.use_faster_whisper = False
+        self.scheduler = scheduler
+        self._buffer: Optional[AudioRingBuffer] = None
+        
+        if scheduler is not None:
+            self.available = scheduler.available
+            return
         
         if not WHISPER_AVAILABLE and not FASTER_WHISPER_AVAILABLE:
             print("❌ No Whisper models available")
             return
             
+        self.model, self.use_faster_whisper = self._load_model(Config.WHISPER_MODEL)
+        self.available = self.model is not None
+        self._models = {Config.WHISPER_MODEL: (self.model, self.use_faster_whisper)}
+    
+    def _load_model(self, name: str):
+        """
+        Load a Whisper model by size name
+        
+        Returns:
+            Tuple (model or None, whether it is a faster-whisper model)
+        """
         # Try faster-whisper first for better Windows compatibility
         if FASTER_WHISPER_AVAILABLE:
             try:
                 print("Loading Faster-Whisper model...")
-                self.model = WhisperModel(Config.WHISPER_MODEL, device="cpu", compute_type="int8")
-                self.available = True
-                self.use_faster_whisper = True
-                print(f"Faster-Whisper model '{Config.WHISPER_MODEL}' loaded successfully on CPU")
-                return
+                with get_profiler().track_model(f"whisper-{name}"):
+                    model = WhisperModel(name, device="cpu", compute_type="int8")
+                print(f"Faster-Whisper model '{name}' loaded successfully on CPU")
+                return model, True
             except Exception as e:
                 print(f"❌ Failed to load Faster-Whisper model: {e}")
         
@@ -68,22 +97,65 @@ class SpeechToText:
             try:
                 print("Loading Whisper model...")
                 # Force CPU usage to avoid GPU issues
-                self.model = whisper.load_model(Config.WHISPER_MODEL, device="cpu")
-                self.available = True
-                self.use_faster_whisper = False
-                print(f"Whisper model '{Config.WHISPER_MODEL}' loaded successfully on CPU")
+                with get_profiler().track_model(f"whisper-{name}"):
+                    model = whisper.load_model(name, device="cpu")
+                print(f"Whisper model '{name}' loaded successfully on CPU")
+                return model, False
             except Exception as e:
                 print(f"❌ Failed to load Whisper model: {e}")
+        return None, False
+    
+    def _model_for(self, name: Optional[str]):
+        """
+        Model for a size name, loading it on first use
+        
+        Falls back to the default model if the requested one fails to load.
+        """
+        if not name or name == Config.WHISPER_MODEL:
+            return self.model, self.use_faster_whisper
+        if name not in self._models:
+            self._models[name] = self._load_model(name)
+        model, use_faster_whisper = self._models[name]
+        if model is None:
+            return self.model, self.use_faster_whisper
+        return model, use_faster_whisper
+    
+    @staticmethod
+    def _tier_model() -> Optional[str]:
+        """Whisper model chosen by the load controller (None for WHISPER_MODEL)"""
+        return get_load_controller().current()['whisper_model']
+    
+    def capture_buffer(self) -> AudioRingBuffer:
+        """
+        This instance's ring buffer from the shared pool, reset for a new capture
+        
+        The buffer goes back to the pool when the instance is garbage
+        collected (e.g. when its Streamlit session ends).
+        """
+        if self._buffer is None:
+            pool = get_audio_buffer_pool()
+            key = f"stt-{id(self)}"
+            self._buffer = pool.acquire(key)
+            weakref.finalize(self, pool.release, key)
+        self._buffer.reset()
+        return self._buffer
+    
+    def last_recording(self) -> Optional[np.ndarray]:
+        """View of the latest capture (valid until the next recording), or None"""
+        if self._buffer is None or not self._buffer.filled:
+            return None
+        return self._buffer.view()
     
     def record_audio(self, duration: int = 5) -> Optional[np.ndarray]:
         """
         Record audio from microphone
         
         Args:
-            duration: Recording duration in seconds
+            duration: Recording duration in seconds (capped at Config.AUDIO_BUFFER_SECONDS)
             
         Returns:
-            Audio data as numpy array or None if error
+            View of the captured samples in this instance's ring buffer
+            (valid until the next recording) or None if error
         """
         if not AUDIO_AVAILABLE:
             print("❌ Audio recording not available")
@@ -91,80 +163,74 @@ class SpeechToText:
             
         try:
             print(f"Recording for {duration} seconds...")
-            audio_data = sd.rec(
-                int(duration * self.sample_rate),
+            buffer = self.capture_buffer()
+            # Record straight into the preallocated buffer (mono)
+            out = buffer.frames(int(duration * self.sample_rate))
+            sd.rec(
+                len(out),
                 samplerate=self.sample_rate,
-                channels=Config.CHANNELS,
-                dtype=np.float32
+                channels=1,
+                dtype=np.float32,
+                out=out
             )
             sd.wait()  # Wait for recording to complete
             print("Recording completed")
-            return audio_data.flatten()
+            return buffer.view()
         except Exception as e:
             print(f"❌ Recording error: {e}")
             return None
     
-    def transcribe_audio(self, audio_data: np.ndarray) -> Optional[str]:
+    def transcribe_buffer(self, buffer: AudioRingBuffer,
+                          priority: int = PRIORITY_INTERACTIVE) -> Optional[str]:
+        """
+        Transcribe a ring buffer's contents without copying them
+        
+        With the scheduler, workers read the shared-memory segment in place.
+        
+        Args:
+            buffer: Buffer filled at the recording rate
+            priority: Scheduler priority (PRIORITY_BATCH for speculative partials)
+            
+        Returns:
+            Transcribed Japanese text or None if error
+        """
+        if self.scheduler is not None and buffer.shared_name:
+            name, length = buffer.shared_ref()
+            return self.scheduler.transcribe_shared(name, length, self.sample_rate, priority,
+                                                    model_name=self._tier_model()).result()
+        return self.transcribe_audio(buffer.view(), in_place=True)
+    
+    def transcribe_audio(self, audio_data: np.ndarray, sample_rate: int = None,
+                         in_place: bool = False, model_name: str = None) -> Optional[str]:
         """
         Transcribe audio to Japanese text using Whisper
         
         Args:
             audio_data: Audio data as numpy array
+            sample_rate: Sample rate of audio_data (defaults to the recording rate)
+            in_place: Allow normalizing audio_data in place instead of copying
+            model_name: Whisper model size (defaults to the load controller's tier)
             
         Returns:
             Transcribed Japanese text or None if error
         """
-        if not self.available or not AUDIO_AVAILABLE:
+        model_name = model_name or self._tier_model()
+        if self.scheduler is not None:
+            # Raises SchedulerBusy when the worker queue is full
+            return self.scheduler.transcribe(audio_data, sample_rate, model_name=model_name).result()
+        
+        # Arrays need only the model; sounddevice is for recording
+        if not self.available:
             print("❌ Speech-to-text not available")
             return None
             
         try:
             # Transcribe directly from numpy array to avoid file I/O issues
             print("Transcribing audio to Japanese...")
-            
-            # Ensure audio is float32 and normalized
-            if audio_data.dtype != np.float32:
-                audio_data = audio_data.astype(np.float32)
-            
-            # Normalize audio to [-1, 1] range
-            if np.max(np.abs(audio_data)) > 1.0:
-                audio_data = audio_data / np.max(np.abs(audio_data))
-            
-            # Convert stereo to mono if needed
-            if audio_data.ndim > 1:
-                audio_data = np.mean(audio_data, axis=1)
-            
-            # Resample to 16kHz if needed (Whisper expects 16kHz)
-            target_sr = 16000
-            if self.sample_rate != target_sr:
-                # Simple resampling - for production use librosa.resample
-                ratio = target_sr / self.sample_rate
-                audio_data = np.interp(
-                    np.linspace(0, len(audio_data), int(len(audio_data) * ratio)),
-                    np.arange(len(audio_data)),
-                    audio_data
-                )
-            
+            audio_data = self._prepare_audio(audio_data, sample_rate, in_place)
             print(f"Audio shape: {audio_data.shape}, dtype: {audio_data.dtype}")
             
-            if self.use_faster_whisper:
-                # Use faster-whisper with numpy array
-                segments, info = self.model.transcribe(
-                    audio_data,
-                    language=Config.WHISPER_LANGUAGE,
-                    task="transcribe"
-                )
-                transcribed_text = " ".join([segment.text for segment in segments]).strip()
-            else:
-                # Use regular whisper with numpy array
-                result = self.model.transcribe(
-                    audio_data,
-                    language=Config.WHISPER_LANGUAGE,
-                    task="transcribe",
-                    fp16=False  # Disable FP16 to avoid warnings
-                )
-                transcribed_text = result["text"].strip()
-            
+            transcribed_text, _ = self._run_model(audio_data, model_name)
             print(f"Transcribed: {transcribed_text}")
             return transcribed_text
             
@@ -174,25 +240,154 @@ class SpeechToText:
             traceback.print_exc()
             return None
     
+    def transcribe_segments(self, audio_data: np.ndarray, sample_rate: int = None,
+                            model_name: str = None) -> Optional[List[Dict[str, object]]]:
+        """
+        Transcribe audio into timed segments
+        
+        Args:
+            audio_data: Audio data as numpy array (not modified)
+            sample_rate: Sample rate of audio_data (defaults to the recording rate)
+            model_name: Whisper model size (defaults to the load controller's tier)
+            
+        Returns:
+            List of segments {'start', 'end', 'text'} (seconds from the start
+            of audio_data) or None if error
+        """
+        model_name = model_name or self._tier_model()
+        if self.scheduler is not None:
+            return self.scheduler.transcribe(audio_data, sample_rate, model_name=model_name,
+                                             segments=True).result()
+        
+        if not self.available:
+            print("❌ Speech-to-text not available")
+            return None
+        
+        try:
+            _, segments = self._run_model(self._prepare_audio(audio_data, sample_rate), model_name)
+            return segments
+        except Exception as e:
+            print(f"Error during transcription: {e}")
+            return None
+    
+    def _prepare_audio(self, audio_data: np.ndarray, sample_rate: int = None,
+                       in_place: bool = False) -> np.ndarray:
+        """Mono float32 in [-1, 1] at 16 kHz, copying only when needed"""
+        # Ensure audio is float32 and normalized
+        if audio_data.dtype != np.float32:
+            audio_data = audio_data.astype(np.float32)
+            count_copy(audio_data.nbytes)
+            in_place = True
+        
+        # Convert stereo to mono if needed
+        if audio_data.ndim > 1:
+            audio_data = np.mean(audio_data, axis=1, dtype=np.float32)
+            count_copy(audio_data.nbytes)
+            in_place = True
+        
+        # Normalize audio to [-1, 1] range (peak without an abs() temporary)
+        peak = float(max(audio_data.max(), -audio_data.min())) if len(audio_data) else 0.0
+        if peak > 1.0:
+            if in_place:
+                audio_data /= peak
+            else:
+                audio_data = audio_data / peak
+                count_copy(audio_data.nbytes)
+        
+        # Resample to 16kHz if needed (Whisper expects 16kHz)
+        target_sr = WHISPER_RATE
+        source_sr = sample_rate or self.sample_rate
+        if source_sr != target_sr:
+            # Simple resampling - for production use librosa.resample
+            ratio = target_sr / source_sr
+            audio_data = np.interp(
+                np.linspace(0, len(audio_data), int(len(audio_data) * ratio)),
+                np.arange(len(audio_data)),
+                audio_data
+            ).astype(np.float32)
+            count_copy(audio_data.nbytes)
+        return audio_data
+    
+    def _run_model(self, audio_data: np.ndarray,
+                   model_name: str = None) -> Tuple[str, List[Dict[str, object]]]:
+        """
+        Run Whisper on prepared 16 kHz audio
+        
+        Returns:
+            Tuple (text, segments {'start', 'end', 'text'})
+        """
+        model, use_faster_whisper = self._model_for(model_name)
+        if use_faster_whisper:
+            # Use faster-whisper with numpy array (segments are generated lazily)
+            segments, info = model.transcribe(
+                audio_data,
+                language=Config.WHISPER_LANGUAGE,
+                task="transcribe"
+            )
+            segments = [{'start': segment.start, 'end': segment.end, 'text': segment.text.strip()}
+                        for segment in segments]
+            transcribed_text = " ".join([segment['text'] for segment in segments]).strip()
+        else:
+            # Use regular whisper with numpy array
+            result = model.transcribe(
+                audio_data,
+                language=Config.WHISPER_LANGUAGE,
+                task="transcribe",
+                fp16=False  # Disable FP16 to avoid warnings
+            )
+            segments = [{'start': segment['start'], 'end': segment['end'], 'text': segment['text'].strip()}
+                        for segment in result.get("segments", [])]
+            transcribed_text = result["text"].strip()
+        return transcribed_text, segments
+    
+    def transcribe_stream(self, source: AudioSource, model_name: str = None,
+                          on_chunk: Callable[[np.ndarray], None] = None) -> Iterator[Dict[str, object]]:
+        """
+        Transcribe an audio file or upload chunk by chunk
+        
+        Decoding, resampling and transcription are interleaved, so memory
+        stays at about one chunk (Config.UPLOAD_CHUNK_SECONDS) whatever the
+        length, and segments arrive as each chunk is done.
+        
+        Args:
+            source: File path or binary file object, in any format AudioDecoder reads
+            model_name: Whisper model size (defaults to the load controller's tier)
+            on_chunk: Called with each 16 kHz chunk before it is transcribed
+                      (a reused buffer; copy to keep it)
+            
+        Yields:
+            Segments {'start', 'end', 'text'} in seconds from the start of the audio
+            
+        Raises:
+            AudioDecodeError: If the audio cannot be decoded
+        """
+        # One model for the whole upload, so its chunks are transcribed alike
+        model_name = model_name or self._tier_model()
+        with AudioDecoder(source) as decoder:
+            for offset, chunk in iter_chunks(decoder):
+                if on_chunk:
+                    on_chunk(chunk)
+                for segment in self.transcribe_segments(chunk, WHISPER_RATE, model_name) or []:
+                    if segment['text']:
+                        yield {'start': round(offset + segment['start'], 2),
+                               'end': round(offset + segment['end'], 2),
+                               'text': segment['text']}
+    
     def transcribe_file(self, audio_file_path: str) -> Optional[str]:
         """
         Transcribe audio file to Japanese text
         
         Args:
-            audio_file_path: Path to audio file
+            audio_file_path: Path to audio file (WAV, FLAC, Ogg, MP3; more with ffmpeg)
             
         Returns:
             Transcribed Japanese text or None if error
         """
         try:
             print(f"Transcribing file: {audio_file_path}")
-            result = self.model.transcribe(
-                audio_file_path,
-                language=Config.WHISPER_LANGUAGE,
-                task="transcribe"
-            )
+            segments = list(self.transcribe_stream(audio_file_path))
             
-            transcribed_text = result["text"].strip()
+            transcribed_text = " ".join(segment['text'] for segment in segments).strip()
             print(f"Transcribed: {transcribed_text}")
             return transcribed_text
             
@@ -200,6 +395,58 @@ class SpeechToText:
             print(f"Error during file transcription: {e}")
             return None
     
+    def record_streaming(self, duration: int = 5, on_partial: Callable[[str], None] = None,
+                         interval: float = None) -> Optional[str]:
+        """
+        Record audio while transcribing what has been captured so far
+
+        Whisper is not incremental, so each partial re-transcribes the audio
+        captured up to that point; short voice turns keep this affordable.
+
+        Args:
+            duration: Recording duration in seconds
+            on_partial: Called with each partial transcript
+            interval: Seconds between partial transcripts (defaults to Config.PARTIAL_TRANSCRIPT_INTERVAL)
+
+        Returns:
+            Final transcript of the full recording or None if error
+        """
+        if not AUDIO_AVAILABLE:
+            print("❌ Audio recording not available")
+            return None
+
+        interval = interval or Config.PARTIAL_TRANSCRIPT_INTERVAL
+        buffer = self.capture_buffer()
+
+        def callback(indata, frames, time_info, status):
+            # Stop at capacity rather than wrap, so views stay contiguous
+            room = buffer.capacity - buffer.filled
+            if room > 0:
+                buffer.write(indata[:min(frames, room), 0])
+
+        try:
+            print(f"Recording for {duration} seconds (streaming)...")
+            with sd.InputStream(samplerate=self.sample_rate, channels=1,
+                                dtype=np.float32, callback=callback):
+                deadline = time.monotonic() + duration
+                while time.monotonic() < deadline:
+                    time.sleep(min(interval, max(deadline - time.monotonic(), 0)))
+                    if on_partial and buffer.filled >= self.sample_rate and time.monotonic() < deadline:
+                        # The callback keeps appending past the region being transcribed;
+                        # partials are speculative, so they yield to other users' final transcripts
+                        try:
+                            partial = self.transcribe_buffer(buffer, PRIORITY_BATCH)
+                        except SchedulerBusy:
+                            continue  # Workers saturated: skip this partial
+                        if partial:
+                            on_partial(partial)
+            print("Recording completed")
+        except Exception as e:
+            print(f"❌ Recording error: {e}")
+            return None
+
+        return self.transcribe_buffer(buffer)
+
     def record_and_transcribe(self, duration: int = 5) -> Optional[str]:
         """
         Record audio and transcribe to Japanese text
@@ -210,6 +457,7 @@ class SpeechToText:
         Returns:
             Transcribed Japanese text or None if error
         """
-        audio_data = self.record_audio(duration)
-        return self.transcribe_audio(audio_data)
+        if self.record_audio(duration) is None:
+            return None
+        return self.transcribe_buffer(self._buffer)
 
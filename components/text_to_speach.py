@@ -1,8 +1,10 @@
 # TTS
 # Coqui
-import os
+import re
 import tempfile
-from typing import Optional
+import time
+from typing import List, Optional, Tuple
+import numpy as np
 
 # Try to import audio packages, handle gracefully if missing
 try:
@@ -17,21 +19,61 @@ except ImportError:
     sf = None
 
 from config import Config
+from audio_store import get_audio_store
+from tts_frontend import PhonemeCache, normalize_japanese
+from profiler import get_profiler
+
+# Sentence boundaries: split after Japanese/ASCII terminators and newlines
+SENTENCE_PATTERN = re.compile(r'[^。！？!?\n]+[。！？!?]*')
+
+
+def split_sentences(text: str) -> List[str]:
+    """
+    Split Japanese text into sentences for incremental synthesis
+    
+    Args:
+        text: Text to split
+        
+    Returns:
+        Non-empty sentences, terminators included
+    """
+    return [sentence.strip() for sentence in SENTENCE_PATTERN.findall(text) if sentence.strip()]
 
 class TextToSpeech:
     """Text-to-Speech using Coqui TTS for Japanese"""
     
-    def __init__(self):
-        """Initialize TTS model for Japanese"""
+    def __init__(self, scheduler=None):
+        """
+        Initialize TTS model for Japanese
+        
+        Args:
+            scheduler: InferenceScheduler running the model in worker
+                       processes; when given, no model is loaded here
+        """
         self.tts = None
         self.tts_available = False
+        self.scheduler = scheduler
+        self.phoneme_cache: Optional[PhonemeCache] = None
+        
+        if scheduler is not None:
+            self.tts_available = scheduler.available
+            Config.ensure_directories()
+            return
         
         try:
             print("Loading Japanese TTS model...")
             # Initialize TTS with Japanese model
             from TTS.api import TTS
-            self.tts = TTS(model_name=Config.TTS_MODEL)
+            with get_profiler().track_model("coqui-tts"):
+                self.tts = TTS(model_name=Config.TTS_MODEL)
             self.tts_available = True
+            if Config.TTS_BACKEND == 'onnx':
+                from tts_onnx import enable_onnx
+                enable_onnx(self.tts)
+            if Config.TTS_PHONEME_CACHE_SIZE:
+                self.phoneme_cache = PhonemeCache()
+                if not self.phoneme_cache.install(self.tts):
+                    self.phoneme_cache = None
             print(f"TTS model loaded: {Config.TTS_MODEL}")
             
         except ImportError:
@@ -57,7 +99,7 @@ class TextToSpeech:
         Returns:
             Path to generated audio file or None if error
         """
-        if not self.tts:
+        if not self.is_available():
             print("TTS model not available")
             return None
         
@@ -75,10 +117,17 @@ class TextToSpeech:
             print(f"Converting text to speech: {text}")
             
             # Generate speech
-            self.tts.tts_to_file(
-                text=text,
-                file_path=output_path
-            )
+            if self.scheduler is not None:
+                result = self.synthesize(text)
+                if result is None:
+                    return None
+                samples, sample_rate = result
+                sf.write(output_path, samples, sample_rate)
+            else:
+                self.tts.tts_to_file(
+                    text=normalize_japanese(text),
+                    file_path=output_path
+                )
             
             print(f"Audio saved to: {output_path}")
             return output_path
@@ -87,26 +136,84 @@ class TextToSpeech:
             print(f"Error during TTS conversion: {e}")
             return None
     
+    def synthesize(self, text: str) -> Optional[Tuple[np.ndarray, int]]:
+        """
+        Convert Japanese text to speech in memory
+        
+        Args:
+            text: Japanese text to convert
+            
+        Returns:
+            Tuple (float32 samples, sample rate) or None if error
+        """
+        if self.scheduler is not None:
+            # Raises SchedulerBusy when the worker queue is full
+            return self.scheduler.synthesize(text).result()
+        
+        if not self.tts:
+            print("TTS model not available")
+            return None
+        
+        try:
+            started = time.perf_counter()
+            samples = self.tts.tts(text=normalize_japanese(text))
+            if self.phoneme_cache:
+                self.phoneme_cache.record_synthesis(time.perf_counter() - started)
+            sample_rate = self.tts.synthesizer.output_sample_rate
+            return np.asarray(samples, dtype=np.float32), sample_rate
+            
+        except Exception as e:
+            print(f"Error during TTS synthesis: {e}")
+            return None
+    
     def text_to_speech_play(self, text: str) -> bool:
         """
         Convert Japanese text to speech and play immediately
         
+        The clip is also handed to the audio store (if enabled).
+        
         Args:
             text: Japanese text to convert and play
             
         Returns:
             True if successful, False otherwise
         """
-        audio_file = self.text_to_speech_file(text)
-        if audio_file:
-            success = self.play_audio_file(audio_file)
-            # Clean up temporary file
-            try:
-                os.unlink(audio_file)
-            except Exception as e:
-                print(f"Warning: Could not delete temporary file {audio_file}: {e}")
-            return success
-        return False
+        if not self.is_available():
+            print("TTS model not available")
+            return False
+        result = self.synthesize(text)
+        if result is None:
+            return False
+        samples, sample_rate = result
+        store = get_audio_store()
+        if store:
+            store.submit_reply(text, samples, sample_rate)
+        return self.play_samples(samples, sample_rate)
+    
+    def play_samples(self, samples: np.ndarray, sample_rate: int) -> bool:
+        """
+        Play audio samples using sounddevice
+        
+        Args:
+            samples: Audio samples
+            sample_rate: Sample rate
+            
+        Returns:
+            True if successful, False otherwise
+        """
+        if not AUDIO_AVAILABLE:
+            print("⚠️ Audio playback not available")
+            return False
+            
+        try:
+            sd.play(samples, sample_rate)
+            sd.wait()  # Wait for playback to complete
+            print("Audio playback completed")
+            return True
+            
+        except Exception as e:
+            print(f"Error playing audio: {e}")
+            return False
     
     def play_audio_file(self, audio_file_path: str) -> bool:
         """
@@ -167,6 +274,15 @@ class TextToSpeech:
             print(f"Error getting available models: {e}")
             return []
     
+    def frontend_stats(self) -> Optional[dict]:
+        """
+        Phoneme cache and front-end timing (in-process model only)
+        
+        Returns:
+            PhonemeCache.stats(), or None without an in-process cache
+        """
+        return self.phoneme_cache.stats() if self.phoneme_cache else None
+    
     def is_available(self) -> bool:
         """
         Check if TTS is available and ready
@@ -174,4 +290,4 @@ class TextToSpeech:
         Returns:
             True if TTS is ready, False otherwise
         """
-        return self.tts_available and self.tts is not None
\ No newline at end of file
+        return self.tts_available and (self.tts is not None or self.scheduler is not None)
\ No newline at end of file
@@ -0,0 +1,215 @@
+# TTS front end
+# Japanese text normalization and a per-sentence phoneme cache in front of Coqui
+import re
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+from typing import Dict, List
+
+from config import Config
+
+# Read aloud instead of passed to the phonemizer (after NFKC folding)
+SYMBOL_READINGS = {
+    '%': 'パーセント',
+    '°C': '度',  # NFKC turns ℃ into °C
+    '°': '度',
+    '+': 'プラス',
+    '=': 'イコール',
+    '&': 'アンド',
+    '@': 'アット',
+    '$': 'ドル',
+    '¥': '円',
+    '€': 'ユーロ',
+    '~': 'から',
+    '〜': 'から',
+    '×': 'かける',
+    '÷': 'わる',
+}
+# ASCII punctuation folded back to the Japanese forms the model was trained on
+PUNCTUATION = str.maketrans({'!': '！', '?': '？', ',': '、', '(': '（', ')': '）'})
+
+# Optional '#' (#1 -> 一番) and minus sign; a '-' joining two words or numbers
+# (3-5, 2024-10-19, ABC-123) is not a minus
+NUMBER_PATTERN = re.compile(r'(?P<number_sign>#)?(?P<minus>(?<![0-9A-Za-z.])[-−])?'
+                            r'(?P<value>\d+(?:,\d{3})*(?:\.\d+)?)')
+# Sharp after a note or language name (C#, F#); other '#' are left alone
+SHARP_PATTERN = re.compile(r'(?<=[A-Za-z])#')
+# Left for the tokenizer to drop rather than mispronounce
+STRIP_PATTERN = re.compile(r'[*_^|<>\[\]{}\\`"]')
+
+DIGITS = '〇一二三四五六七八九'
+SMALL_UNITS = [(1000, '千'), (100, '百'), (10, '十')]
+LARGE_UNITS = [(10 ** 12, '兆'), (10 ** 8, '億'), (10 ** 4, '万')]
+
+
+def _under_10000(value: int) -> str:
+    text = ''
+    for unit, name in SMALL_UNITS:
+        count, value = divmod(value, unit)
+        if count:
+            text += (DIGITS[count] if count > 1 else '') + name
+    if value:
+        text += DIGITS[value]
+    return text
+
+
+def number_to_kanji(value: int) -> str:
+    """
+    Integer to kanji numerals as read aloud (12345 -> 一万二千三百四十五)
+
+    Values of 10^16 and above are read digit by digit.
+    """
+    if value == 0:
+        return DIGITS[0]
+    if value >= 10 ** 16:
+        return ''.join(DIGITS[int(digit)] for digit in str(value))
+    text = ''
+    for unit, name in LARGE_UNITS:
+        count, value = divmod(value, unit)
+        if count:
+            text += _under_10000(count) + name
+    return text + _under_10000(value)
+
+
+def _read_digits(digits: str) -> str:
+    return ''.join(DIGITS[int(digit)] for digit in digits)
+
+
+def _read_number(match: re.Match) -> str:
+    whole, _, fraction = match.group('value').replace(',', '').partition('.')
+    if len(whole) > 1 and whole.startswith('0'):
+        # Zero-padded numbers and codes (007, 0120) are read digit by digit
+        text = _read_digits(whole)
+    else:
+        text = number_to_kanji(int(whole))
+    if fraction:
+        text += '点' + _read_digits(fraction)
+    if match.group('minus'):
+        text = 'マイナス' + text
+    if match.group('number_sign'):
+        text += '番'
+    return text
+
+
+def normalize_japanese(text: str) -> str:
+    """
+    Normalize text before phonemization
+
+    Folds full/half width (NFKC: ＡＢＣ１２３ -> ABC123, ｶﾀｶﾅ -> カタカナ),
+    spells out numbers as kanji numerals, reads common symbols aloud and
+    drops markup characters.
+
+    >>> normalize_japanese('気温は-5度、湿度は40%です')
+    '気温はマイナス五度、湿度は四十パーセントです'
+    >>> normalize_japanese('3-5人')
+    '三-五人'
+    >>> normalize_japanese('#1の曲')
+    '一番の曲'
+    >>> normalize_japanese('C#とF#')
+    'CシャープとFシャープ'
+    >>> normalize_japanese('番号は0123です')
+    '番号は〇一二三です'
+    >>> normalize_japanese('１２,３４５.６円')
+    '一万二千三百四十五点六円'
+    """
+    text = unicodedata.normalize('NFKC', text)
+    text = SHARP_PATTERN.sub('シャープ', text)
+    text = NUMBER_PATTERN.sub(_read_number, text)
+    for symbol, reading in SYMBOL_READINGS.items():
+        if symbol in text:
+            text = text.replace(symbol, reading)
+    text = STRIP_PATTERN.sub('', text).translate(PUNCTUATION)
+    return re.sub(r'\s+', ' ', text).strip()
+
+
+class PhonemeCache:
+    """
+    Bounded LRU of token id sequences, installed over a Coqui tokenizer
+
+    Coqui's synthesizer calls tokenizer.text_to_ids once per sentence
+    (cleaners, morphological analysis and phonemization); cached sentences
+    skip all of it and go straight to the model.
+    """
+
+    def __init__(self, max_entries: int = None):
+        """
+        Args:
+            max_entries: Sentences kept (defaults to Config.TTS_PHONEME_CACHE_SIZE)
+        """
+        self.max_entries = max_entries or Config.TTS_PHONEME_CACHE_SIZE
+        self._entries: "OrderedDict[tuple, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.frontend_seconds = 0.0   # Time spent in text_to_ids, cache included
+        self.synthesis_seconds = 0.0  # Whole synthesis calls
+        self.syntheses = 0
+
+    def install(self, tts) -> bool:
+        """
+        Wrap the tokenizer of a loaded TTS.api.TTS model
+
+        Returns:
+            False if the model has no tokenizer to wrap (older Coqui releases)
+        """
+        tokenizer = getattr(getattr(getattr(tts, 'synthesizer', None), 'tts_model', None), 'tokenizer', None)
+        if tokenizer is None or not hasattr(tokenizer, 'text_to_ids'):
+            print("⚠️ TTS tokenizer not found; phoneme cache disabled")
+            return False
+
+        text_to_ids = tokenizer.text_to_ids
+
+        def cached_text_to_ids(text: str, language: str = None) -> List[int]:
+            started = time.perf_counter()
+            key = (text, language)
+            with self._lock:
+                ids = self._entries.get(key)
+                if ids is not None:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+            if ids is None:
+                ids = tuple(text_to_ids(text, language=language))
+                with self._lock:
+                    self.misses += 1
+                    self._entries[key] = ids
+                    while len(self._entries) > self.max_entries:
+                        self._entries.popitem(last=False)
+            with self._lock:
+                self.frontend_seconds += time.perf_counter() - started
+            return list(ids)
+
+        tokenizer.text_to_ids = cached_text_to_ids
+        return True
+
+    def record_synthesis(self, seconds: float):
+        """Count a finished synthesis call; logs the front end's share now and then"""
+        with self._lock:
+            self.syntheses += 1
+            self.synthesis_seconds += seconds
+            report = self.syntheses % Config.TTS_FRONTEND_REPORT_EVERY == 0
+        if report:
+            stats = self.stats()
+            print(f"TTS front end: {stats['frontend_share']:.0%} of synthesis time, "
+                  f"phoneme cache hit rate {stats['hit_rate']:.0%} ({stats['entries']} sentences)")
+
+    def stats(self) -> Dict[str, object]:
+        """
+        Cache and timing counters
+
+        Returns:
+            Dictionary with entries, hits, misses, hit_rate, syntheses,
+            frontend_seconds, synthesis_seconds and frontend_share
+        """
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'entries': len(self._entries),
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': self.hits / lookups if lookups else 0.0,
+                'syntheses': self.syntheses,
+                'frontend_seconds': self.frontend_seconds,
+                'synthesis_seconds': self.synthesis_seconds,
+                'frontend_share': self.frontend_seconds / self.synthesis_seconds if self.synthesis_seconds else 0.0,
+            }
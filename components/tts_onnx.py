@@ -0,0 +1,160 @@
+# ONNX Runtime TTS backend
+# Runs the Coqui vocoder through onnxruntime; the rest of the Coqui pipeline is unchanged
+import copy
+import os
+import re
+from typing import Optional
+
+import numpy as np
+
+try:
+    import onnxruntime as ort
+    ONNXRUNTIME_AVAILABLE = True
+except ImportError:
+    ort = None
+    ONNXRUNTIME_AVAILABLE = False
+
+from config import Config
+
+GRAPH_OPTIMIZATION_LEVELS = {
+    'disable': 'ORT_DISABLE_ALL',
+    'basic': 'ORT_ENABLE_BASIC',
+    'extended': 'ORT_ENABLE_EXTENDED',
+    'all': 'ORT_ENABLE_ALL',
+}
+
+
+def session_options() -> "ort.SessionOptions":
+    """Thread and graph settings from Config.TTS_ONNX_*"""
+    options = ort.SessionOptions()
+    options.intra_op_num_threads = Config.TTS_ONNX_INTRA_THREADS
+    options.inter_op_num_threads = Config.TTS_ONNX_INTER_THREADS
+    options.execution_mode = ort.ExecutionMode.ORT_SEQUENTIAL
+    options.graph_optimization_level = getattr(
+        ort.GraphOptimizationLevel, GRAPH_OPTIMIZATION_LEVELS[Config.TTS_ONNX_GRAPH_OPTIMIZATION])
+    return options
+
+
+def model_path(model_name: str, part: str) -> str:
+    """ONNX file for one part of a Coqui model, e.g. tts_models/ja/kokoro/... -> data/onnx/...-vocoder.onnx"""
+    safe_name = re.sub(r'[^A-Za-z0-9_.-]+', '_', model_name)
+    return os.path.join(Config.TTS_ONNX_DIR, f"{safe_name}-{part}.onnx")
+
+
+def export_vocoder(synthesizer, path: str):
+    """
+    Export a Coqui synthesizer's vocoder to ONNX
+
+    Weight norm is folded on a copy first, so the PyTorch model is left as is.
+    The file is written under a temporary name and renamed into place.
+
+    Args:
+        synthesizer: TTS.utils.synthesizer.Synthesizer with a vocoder_model
+        path: Output .onnx file
+    """
+    import torch
+
+    vocoder = copy.deepcopy(synthesizer.vocoder_model).cpu().eval()
+    if hasattr(vocoder, 'remove_weight_norm'):
+        vocoder.remove_weight_norm()
+
+    class Wrapper(torch.nn.Module):
+        def __init__(self, model):
+            super().__init__()
+            self.model = model
+
+        def forward(self, mel):
+            # inference() adds the vocoder's replicate padding before forward()
+            return self.model.inference(mel)
+
+    n_mels = synthesizer.vocoder_config['audio']['num_mels']
+    dummy = torch.randn(1, n_mels, 100)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    # Several TTS workers may export at once; none may load a partial file
+    temp_path = f"{path}.{os.getpid()}.tmp"
+    try:
+        with torch.no_grad():
+            torch.onnx.export(
+                Wrapper(vocoder), dummy, temp_path,
+                input_names=['mel'], output_names=['wav'],
+                dynamic_axes={'mel': {2: 'frames'}, 'wav': {2: 'samples'}},
+                opset_version=17
+            )
+        os.replace(temp_path, path)
+    finally:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+    print(f"Vocoder exported to ONNX: {path}")
+
+
+class OnnxVocoder:
+    """
+    Drop-in for Synthesizer.vocoder_model: inference(mel tensor) -> waveform tensor
+
+    Coqui's Synthesizer still denormalizes/renormalizes the spectrogram and
+    post-processes the waveform, so the output matches the PyTorch path.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.session = ort.InferenceSession(path, sess_options=session_options(),
+                                            providers=['CPUExecutionProvider'])
+
+    def inference(self, mel):
+        import torch
+
+        mel = np.ascontiguousarray(mel.detach().cpu().numpy(), dtype=np.float32)
+        wav, = self.session.run(None, {'mel': mel})
+        return torch.from_numpy(wav)
+
+    def __call__(self, mel):
+        return self.inference(mel)
+
+
+def enable_onnx(tts, model_name: str = None) -> Optional[OnnxVocoder]:
+    """
+    Switch a loaded TTS.api.TTS model's vocoder to onnxruntime
+
+    The acoustic model (Tacotron2-DDC) stays in PyTorch: its decoder is an
+    autoregressive loop with attention and stop-token state that
+    torch.onnx.export would unroll to a fixed length.
+
+    Args:
+        tts: Loaded TTS.api.TTS instance
+        model_name: Coqui model name used to name the exported file (defaults to Config.TTS_MODEL)
+
+    Returns:
+        The installed OnnxVocoder, or None (PyTorch path kept) if unavailable
+    """
+    if not ONNXRUNTIME_AVAILABLE:
+        print("⚠️ onnxruntime not installed; TTS stays on PyTorch")
+        print("💡 Install with: pip install onnxruntime")
+        return None
+
+    synthesizer = getattr(tts, 'synthesizer', None)
+    if synthesizer is None or getattr(synthesizer, 'vocoder_model', None) is None:
+        print("⚠️ TTS model has no separate vocoder; TTS stays on PyTorch")
+        return None
+
+    path = model_path(model_name or Config.TTS_MODEL, 'vocoder')
+    try:
+        if not os.path.exists(path):
+            export_vocoder(synthesizer, path)
+        vocoder = OnnxVocoder(path)
+    except Exception as e:
+        print(f"⚠️ ONNX vocoder unavailable ({e}); TTS stays on PyTorch")
+        return None
+
+    synthesizer.torch_vocoder_model = synthesizer.vocoder_model
+    synthesizer.vocoder_model = vocoder
+    print(f"TTS vocoder running on onnxruntime ({Config.TTS_ONNX_INTRA_THREADS} intra-op threads, "
+          f"optimization '{Config.TTS_ONNX_GRAPH_OPTIMIZATION}')")
+    return vocoder
+
+
+def disable_onnx(tts):
+    """Restore the PyTorch vocoder (used by the benchmark)"""
+    synthesizer = tts.synthesizer
+    if getattr(synthesizer, 'torch_vocoder_model', None) is not None:
+        synthesizer.vocoder_model = synthesizer.torch_vocoder_model
+        synthesizer.torch_vocoder_model = None
@@ -0,0 +1,120 @@
+# Turn cache
+# Process-wide LRU of each session's most recent turns, kept write-through by MemoryManager
+import threading
+from collections import OrderedDict, deque
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from config import Config
+
+# One exchange: (user_input, bot_response)
+Turn = Tuple[str, str]
+
+
+class _Entry:
+    __slots__ = ('turns', 'complete')
+
+    def __init__(self, turns: Iterable[Turn], max_turns: int, complete: bool):
+        self.turns = deque(turns, maxlen=max_turns)
+        self.complete = complete  # Holds every turn of the session
+
+
+class TurnCache:
+    """
+    Recent turns per session, bounded by session count and turns per session
+
+    Writes must go through MemoryManager so entries stay current; the cache
+    assumes this process is the only writer of a session's turns.
+    """
+
+    def __init__(self, max_sessions: int = None, max_turns: int = None):
+        """
+        Args:
+            max_sessions: Sessions kept (defaults to Config.TURN_CACHE_SESSIONS)
+            max_turns: Most recent turns kept per session (defaults to Config.TURN_CACHE_TURNS)
+        """
+        self.max_sessions = max_sessions or Config.TURN_CACHE_SESSIONS
+        self.max_turns = max_turns or Config.TURN_CACHE_TURNS
+        self._entries: "OrderedDict[str, _Entry]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._writes = 0  # Bumped by append/invalidate, guards load() against races
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, session_id: str, limit: int) -> Optional[List[Turn]]:
+        """
+        Most recent turns, oldest first
+
+        Returns:
+            Up to `limit` turns, or None if the cache cannot answer
+        """
+        with self._lock:
+            entry = self._entries.get(session_id)
+            if entry is None or (limit > self.max_turns and not entry.complete):
+                self.misses += 1
+                return None
+            self._entries.move_to_end(session_id)
+            self.hits += 1
+            turns = list(entry.turns)
+            return turns[-limit:] if limit < len(turns) else turns
+
+    def write_token(self) -> int:
+        """Take before reading the database; pass to load()"""
+        with self._lock:
+            return self._writes
+
+    def load(self, session_id: str, turns: List[Turn], complete: bool, token: int = None):
+        """
+        Store turns read from the database
+
+        Args:
+            session_id: Session identifier
+            turns: Most recent turns, oldest first
+            complete: True if `turns` is the session's whole history
+            token: write_token() taken before the read; if any write happened
+                   since, the (possibly stale) turns are not stored
+        """
+        with self._lock:
+            if token is not None and token != self._writes:
+                return
+            self._entries[session_id] = _Entry(turns, self.max_turns, complete)
+            self._entries.move_to_end(session_id)
+            while len(self._entries) > self.max_sessions:
+                self._entries.popitem(last=False)
+
+    def append(self, session_id: str, turn: Turn):
+        """Write-through for a saved turn (no-op if the session is not cached)"""
+        with self._lock:
+            self._writes += 1
+            entry = self._entries.get(session_id)
+            if entry is None:
+                return
+            if len(entry.turns) == self.max_turns:
+                entry.complete = False
+            entry.turns.append(turn)
+            self._entries.move_to_end(session_id)
+
+    def invalidate(self, session_id: str):
+        with self._lock:
+            self._writes += 1
+            self._entries.pop(session_id, None)
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                'sessions': len(self._entries),
+                'turns': sum(len(entry.turns) for entry in self._entries.values()),
+                'hits': self.hits,
+                'misses': self.misses,
+            }
+
+
+_caches: Dict[str, TurnCache] = {}
+_caches_lock = threading.Lock()
+
+
+def get_turn_cache(db_path: str) -> TurnCache:
+    """Get the process-wide cache for a database"""
+    with _caches_lock:
+        if db_path not in _caches:
+            _caches[db_path] = TurnCache()
+        return _caches[db_path]
@@ -11,6 +11,27 @@ class Config:
     
     # Database settings
     DATABASE_PATH = "data/conversations.db"
+    DATABASE_SHARDS = int(os.getenv('DATABASE_SHARDS', '1'))  # >1 spreads sessions over data/conversations-N.db
+    DATABASE_CATALOG_PATH = "data/catalog.db"  # Session -> shard directory (sharded only)
+    SHARD_LOCATION_CACHE = 100000              # Session locations cached per process
+    SHARD_REBALANCE_PAUSE = 0.05               # Seconds between session moves while rebalancing
+    
+    # Archive settings (idle sessions leave the hot database)
+    ARCHIVE_PATH = "data/archive"
+    ARCHIVE_IDLE_DAYS = 30
+    ARCHIVE_COMPRESSION = "zstd"  # "zstd" (needs zstandard) or "gzip"
+    VACUUM_PAGES = 2000           # Pages released per incremental vacuum
+    
+    # Bulk export/import settings
+    TRANSFER_BATCH_SIZE = 1000          # Rows per fetchmany / executemany
+    TRANSFER_TRANSACTION_ROWS = 50000   # Rows per import transaction
+
+    # Offline batch replay (regenerate stored turns with another model)
+    REPLAY_DATABASE_PATH = "data/replay.db"  # Results, kept out of the interactive database
+    REPLAY_BATCH_SIZE = 200                  # Turns per short read of the conversation database
+    REPLAY_PARALLEL_PER_BACKEND = int(os.getenv('OLLAMA_NUM_PARALLEL', '4'))  # Match the hosts' OLLAMA_NUM_PARALLEL
+    REPLAY_HISTORY_TURNS = 5                 # Earlier turns in each prompt (LLMHandler keeps 10 messages)
+    REPLAY_CHECKPOINT_ROWS = 50              # Results per commit / checkpoint
     
     # Whisper STT settings
     WHISPER_MODEL = "base"  # or "small" for better accuracy
@@ -21,19 +42,132 @@ class Config:
     LLM_TEMPERATURE = 0.3  # Lower temperature for more consistent output
     LLM_MAX_TOKENS = 256   # Reduced for more focused responses
     
+    # Model routing: simple turns go to a small fast model, the rest to LLM_MODEL
+    LLM_ROUTING_ENABLED = True
+    LLM_SMALL_MODEL = "qwen2.5:1.5b"  # Small model with usable Japanese
+    LLM_SMALL_MODEL_COST = 0.2        # Cost per generated character relative to LLM_MODEL
+    LLM_SMALL_MODEL_AUTO_PULL = False # Download LLM_SMALL_MODEL at startup when missing
+    ROUTER_SIMPLE_MAX_CHARS = 20      # Longer inputs go to the large model
+    ROUTER_COMPLEX_KEYWORDS = ["説明", "理由", "なぜ", "どうして", "詳しく", "比較", "違い", "方法", "教えて"]
+    
+    # Streaming quality monitor (aborts and retries garbled generations early)
+    QUALITY_MONITOR_ENABLED = True
+    QUALITY_MIN_CHARS = 24               # Characters seen before judging
+    QUALITY_MIN_JAPANESE_RATIO = 0.5     # Kana/kanji share of non-space characters
+    QUALITY_MAX_GARBAGE_RATE = 0.2       # Share of characters in digit/Latin runs
+    QUALITY_MAX_RETRIES = 1              # Large-model retries after an abort
+    QUALITY_RETRY_TEMPERATURE = 0.1
+    QUALITY_RETRY_PROMPT = "必ず自然な日本語だけで簡潔に答えてください。英数字や記号の羅列は使わないでください。"
+    
+    # Ollama backends (comma-separated OLLAMA_HOSTS for several boxes)
+    OLLAMA_HOSTS = [host.strip() for host in
+                    os.getenv('OLLAMA_HOSTS', os.getenv('OLLAMA_HOST', 'http://localhost:11434')).split(',')
+                    if host.strip()]
+    OLLAMA_HEALTH_INTERVAL = 15          # Seconds between health/model probes
+    OLLAMA_AFFINITY_SLACK = 2            # Extra in-flight requests tolerated to keep a session on its host
+    OLLAMA_AFFINITY_MAX_SESSIONS = 10000 # Session-to-host mappings remembered
+    MODEL_CATALOG_TTL = 60               # Seconds a model inventory is trusted without re-listing
+    
+    # Recent-turn cache used to build prompts without reading the database
+    TURN_CACHE_SESSIONS = 256  # Sessions kept (least recently used dropped)
+    TURN_CACHE_TURNS = 20      # Most recent turns kept per session
+
+    # Load-aware degradation: past these SLOs quality steps down one tier at a time
+    LOAD_CONTROL_ENABLED = True
+    SLO_TURN_LATENCY = 8.0           # Seconds, p90 of recent LLM turns
+    SLO_QUEUE_DEPTH = 8              # STT/TTS requests waiting for a worker
+    SLO_LLM_IN_FLIGHT = 4            # LLM requests in flight per Ollama backend
+    LOAD_LATENCY_WINDOW = 50         # Recent turns considered
+    LOAD_LATENCY_MAX_AGE = 120       # Seconds before a turn stops counting
+    LOAD_RECOVER_SCORE = 0.6         # Load (1.0 = at the SLO) to stay under before recovering
+    LOAD_RECOVER_SECONDS = 30        # How long it must stay under
+    LOAD_MIN_DWELL_SECONDS = 10      # Minimum time between tier changes
+    DEGRADATION_TIERS = [
+        {'name': 'full', 'whisper_model': None, 'num_predict': None, 'small_llm_only': False, 'tts': True},
+        {'name': 'short', 'whisper_model': None, 'num_predict': 128, 'small_llm_only': False, 'tts': True},
+        {'name': 'light', 'whisper_model': 'tiny', 'num_predict': 128, 'small_llm_only': True, 'tts': True},
+        {'name': 'text_only', 'whisper_model': 'tiny', 'num_predict': 96, 'small_llm_only': True, 'tts': False},
+    ]  # None keeps WHISPER_MODEL / LLM_MAX_TOKENS
+
+    # Long-term memory settings (retrieval from earlier sessions)
+    LONG_TERM_MEMORY_ENABLED = True
+    EMBEDDING_MODEL = "nomic-embed-text"  # Pull with: ollama pull nomic-embed-text
+    MEMORY_INDEX_PATH = "data/memory_index"
+    MEMORY_EMBEDDING_BATCH = 32  # Turns embedded per Ollama call
+    MEMORY_TOP_K = 3             # Past exchanges added to the prompt
+    MEMORY_TOKEN_BUDGET = 400    # Approximate tokens reserved for them
+    
+    # Speculative generation (reply drafted from partial transcripts while recording)
+    SPECULATIVE_GENERATION = True
+    PARTIAL_TRANSCRIPT_INTERVAL = 1.0  # Seconds between partial transcripts
+    SPECULATION_MAX_DIVERGENCE = 0.1   # Final vs. speculated transcript difference still accepted
+    
+    # Inference scheduler (Whisper/Coqui in dedicated worker processes)
+    INFERENCE_SCHEDULER_ENABLED = True
+    STT_WORKERS = 2
+    TTS_WORKERS = 1
+    INFERENCE_THREADS_PER_WORKER = 2  # Intra-op threads pinned per worker
+    INFERENCE_MAX_QUEUE = 32          # Pending requests before rejecting
+    
     # TTS settings
     TTS_MODEL = "tts_models/ja/kokoro/tacotron2-DDC"  # Japanese TTS model
     TTS_OUTPUT_PATH = "temp_audio"
+    TTS_PHONEME_CACHE_SIZE = 2048    # Sentences whose phoneme ids are kept (0 disables)
+    TTS_FRONTEND_REPORT_EVERY = 50   # Syntheses between front-end timing log lines
+    TTS_BACKEND = os.getenv('TTS_BACKEND', 'pytorch')  # "pytorch" or "onnx" (vocoder on onnxruntime)
+    TTS_ONNX_DIR = "data/onnx"       # Exported models, created on first use
+    TTS_ONNX_INTRA_THREADS = 2       # Threads inside one operator
+    TTS_ONNX_INTER_THREADS = 1       # Operators run in parallel (sequential execution uses 1)
+    TTS_ONNX_GRAPH_OPTIMIZATION = "all"  # "disable", "basic", "extended" or "all"
+    # Where replies are played: "server" (local sound device) or "browser" (encoded and streamed)
+    TTS_PLAYBACK = os.getenv('TTS_PLAYBACK', 'server')
+    TTS_STREAM_FORMAT = "opus"       # "opus" (Ogg Opus) or "wav" (16-bit PCM)
+    TTS_STREAM_MAX_BUFFER_KB = 512   # Encoded audio held per stream for listeners
+    TTS_STREAM_MAX_STREAMS = 64      # Streams kept at once
+    TTS_STREAM_TTL = 300             # Seconds a finished stream stays readable
     
     # Audio settings
     SAMPLE_RATE = 16000
     CHANNELS = 1
     CHUNK_SIZE = 1024
     AUDIO_FORMAT = "wav"
+    AUDIO_BUFFER_SECONDS = 30  # Capacity of each preallocated capture buffer
+    AUDIO_BUFFER_MAX = 32      # Capture buffers kept for reuse across sessions
+
+    # Audio uploads (files and browser recordings, decoded block by block)
+    UPLOAD_DECODE_BLOCK_SECONDS = 5   # Audio decoded and resampled per block
+    UPLOAD_CHUNK_SECONDS = 30         # Audio per transcription chunk (Whisper's window)
+    UPLOAD_SPLIT_SEARCH_SECONDS = 3   # Chunks end at the quietest point of this tail
+    UPLOAD_STORE_MAX_SECONDS = 300    # Longer uploads are not kept in the audio store
+    UPLOAD_FFMPEG = os.getenv('FFMPEG', 'ffmpeg')  # Decodes what libsndfile cannot (WebM, M4A, ...)
+
+    # Audio store (turn recordings and spoken replies, compressed on a background thread)
+    AUDIO_STORE_ENABLED = True
+    AUDIO_STORE_PATH = "data/audio"
+    AUDIO_STORE_RECORDING_FORMAT = "flac"  # Lossless, so recordings can be re-transcribed
+    AUDIO_STORE_REPLY_FORMAT = "opus"      # Replies can be re-synthesized; keep them small
+    AUDIO_STORE_QUEUE = 64                 # Clips waiting for the encoder before new ones are dropped
     
     # Streamlit settings
     WEB_PORT = 8501
     WEB_HOST = "localhost"
+    CHAT_DISPLAY_TURNS = 10  # Most recent exchanges shown in the chat area
+    SESSION_PAGE_SIZE = 5    # Sessions per sidebar page
+    SESSION_CACHE_TTL = 30   # Seconds before cached session queries expire
+    
+    # Profiling (opt-in): per-turn profiles and a resource panel in the sidebar
+    PROFILING_ENABLED = os.getenv('PROFILING', '0') == '1'
+    PROFILING_MODE = "sample"          # "sample" (stack sampling, collapsed stacks) or "cprofile"
+    PROFILING_INTERVAL = 0.005         # Seconds between stack samples
+    PROFILING_OUTPUT_DIR = "data/profiles"
+    PROFILING_KEEP_FILES = 50          # Oldest profile files removed beyond this
+    PROFILING_PANEL_REFRESH = 5        # Seconds between resource panel updates
+    
+    # Headless API server settings (api_server.py)
+    API_HOST = "0.0.0.0"
+    API_PORT = 8600
+    API_WORKER_THREADS = 16        # Threads running blocking model calls
+    API_MAX_UPLOAD_MB = 25         # Largest accepted audio upload
     
     # Japanese conversation prompts
     SYSTEM_PROMPT = """あなたは親切で知識豊富な日本語のアシスタントです。
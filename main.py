@@ -9,7 +9,6 @@ os.environ['LC_ALL'] = 'en_US.UTF-8'
 
 import streamlit as st
 import time
-from datetime import datetime
 
 # Set UTF-8 encoding for Windows
 import locale
@@ -27,7 +26,18 @@ sys.path.append(os.path.join(os.path.dirname(__file__), 'components'))
 from speech_to_text import SpeechToText
 from llm_handler import LLMHandler
 from text_to_speach import TextToSpeech
-from memory_manager import MemoryManager
+from memory_manager import MemoryManager, parse_db_timestamp
+from session_browser import SessionBrowser
+from long_term_memory import get_long_term_memory
+from chat_view import ChatView, fragment, make_exchange
+from inference_scheduler import get_scheduler
+from speculative_generation import SpeculativeResponder, speculation_stats
+from quality_monitor import quality_stats
+from load_controller import get_load_controller
+from audio_stream import CONTENT_TYPES, encode_audio
+from audio_store import get_audio_store
+from audio_decode import WHISPER_RATE, AudioDecodeError, ClipKeeper
+from profiler import get_profiler
 from config import Config
 
 class SuperKamenBot:
@@ -36,6 +46,7 @@ class SuperKamenBot:
     def __init__(self):
         """Initialize all components"""
         self.initialize_components()
+        self.chat_view = ChatView(Config.CHAT_DISPLAY_TURNS)
     
     def initialize_components(self):
         """Initialize all bot components"""
@@ -44,7 +55,8 @@ class SuperKamenBot:
             if 'stt' not in st.session_state:
                 with st.spinner("音声認識モデルを読み込み中..."):
                     try:
-                        st.session_state.stt = SpeechToText()
+                        # Model runs in the shared worker pool when the scheduler is enabled
+                        st.session_state.stt = SpeechToText(get_scheduler('stt'))
                         if not st.session_state.stt.available:
                             st.warning("音声認識が利用できません。テキストのみのモードで続行します。")
                     except Exception as e:
@@ -55,24 +67,29 @@ class SuperKamenBot:
                 with st.spinner("言語モデルを読み込み中..."):
                     try:
                         st.session_state.llm = LLMHandler()
-                        # Ensure model is ready
-                        if not st.session_state.llm.ensure_model_ready():
-                            st.error("言語モデルの準備ができませんでした。Ollamaが実行されているか確認してください。")
-                            st.stop()
                     except Exception as e:
                         st.error(f"言語モデルの初期化に失敗: {e}")
                         st.stop()
             
+            # Cheap on every run: the model inventory is cached process-wide
+            if not st.session_state.llm.ensure_model_ready():
+                self.show_model_pull()
+                st.stop()
+            
             if 'tts' not in st.session_state:
                 with st.spinner("音声合成モデルを読み込み中..."):
                     try:
-                        st.session_state.tts = TextToSpeech()
+                        st.session_state.tts = TextToSpeech(get_scheduler('tts'))
                         if not st.session_state.tts.is_available():
                             st.warning("音声合成が利用できません。テキストのみのモードで続行します。")
                     except Exception as e:
                         st.warning(f"音声合成の初期化に失敗: {e}")
                         st.session_state.tts = None
             
+            if 'long_term_memory' not in st.session_state:
+                # Shared across browser sessions; indexes past turns in the background
+                st.session_state.long_term_memory = get_long_term_memory()
+            
             if 'memory' not in st.session_state:
                 try:
                     st.session_state.memory = MemoryManager()
@@ -97,6 +114,37 @@ class SuperKamenBot:
             st.error(f"初期化エラー: {e}")
             st.stop()
     
+    def show_model_pull(self):
+        """Show progress of the background model download, polling until done"""
+        llm = st.session_state.llm
+        job = llm.pull_status()
+        if job is None or (job.done and not job.success):
+            st.error("言語モデルの準備ができませんでした。Ollamaが実行されているか確認してください。")
+            if job and job.error:
+                st.caption(job.error)
+            if st.button("🔄 再試行"):
+                llm.pull_model()
+                st.rerun()
+            return
+        
+        st.info(f"言語モデル {llm.model} をダウンロード中...")
+        st.progress(job.progress, text=f"{job.status} ({job.progress:.0%})")
+        time.sleep(1)
+        st.rerun()
+    
+    def load_session(self, session_id: str):
+        """Switch to an existing session and load its history for display"""
+        # Archived sessions are restored lazily, on first open
+        st.session_state.memory.open_session(session_id)
+        st.session_state.current_session_id = session_id
+        st.session_state.conversation_history = []
+        # Load the most recent exchanges for display, with their real timestamps
+        turns = st.session_state.memory.get_session_turns(session_id, 50)
+        st.session_state.conversation_history = [
+            make_exchange(turn['user'], turn['bot'], turn['timestamp'])
+            for turn in turns
+        ]
+    
     def process_voice_input(self, duration: int = 5):
         """Process voice input and generate response"""
         if not st.session_state.stt or not st.session_state.stt.available:
@@ -104,65 +152,279 @@ class SuperKamenBot:
             return
             
         try:
-            # Record and transcribe
-            with st.spinner(f"{duration}秒間録音中..."):
-                user_text = st.session_state.stt.record_and_transcribe(duration)
+            if not Config.SPECULATIVE_GENERATION:
+                # Record and transcribe
+                with st.spinner(f"{duration}秒間録音中..."):
+                    user_text = st.session_state.stt.record_and_transcribe(duration)
+                speculated_response = None
+            else:
+                # Draft the reply from partial transcripts while still recording
+                responder = SpeculativeResponder(self.speculative_generator())
+                with st.spinner(f"{duration}秒間録音中..."):
+                    user_text = st.session_state.stt.record_streaming(duration, responder.on_partial)
+                if user_text:
+                    speculated_response = responder.finalize(user_text)
+                else:
+                    responder.abandon()
             
             if not user_text:
                 st.error("音声を認識できませんでした。もう一度お試しください。")
                 return
             
+            # Keep the recording with the turn (encoded in the background)
+            audio_path = None
+            store = get_audio_store()
+            recording = st.session_state.stt.last_recording()
+            if store and recording is not None:
+                audio_path = store.submit_recording(recording, st.session_state.stt.sample_rate)
+            
             # No green message - directly process the text input
-            self.process_text_input(user_text)
+            self.process_text_input(user_text, speculated_response, audio_path)
                 
         except Exception as e:
             st.error(f"音声処理エラー: {e}")
     
-    def process_text_input(self, user_text: str):
-        """Process text input and generate response"""
+    def process_audio_upload(self, uploaded):
+        """
+        Transcribe an uploaded file or browser recording and reply to it
+        
+        The audio is decoded and transcribed chunk by chunk; segments are
+        shown with their timestamps as each chunk finishes.
+        
+        Args:
+            uploaded: Streamlit UploadedFile (any format AudioDecoder reads)
+        """
+        stt = st.session_state.stt
+        if not stt or not stt.available:
+            st.error("音声認識が利用できません。テキスト入力をご利用ください。")
+            return
+        
+        placeholder = st.empty()
+        keeper = ClipKeeper() if get_audio_store() else None
+        lines = []
+        texts = []
+        try:
+            with st.spinner("音声ファイルを文字起こし中..."):
+                for segment in stt.transcribe_stream(uploaded, on_chunk=keeper):
+                    texts.append(segment['text'])
+                    start = int(segment['start'])
+                    lines.append(f"`{start // 60:02d}:{start % 60:02d}` {segment['text']}")
+                    placeholder.markdown("  \n".join(lines))
+        except AudioDecodeError as e:
+            st.error(f"音声ファイルを読み込めませんでした: {e}")
+            return
+        except Exception as e:
+            st.error(f"音声処理エラー: {e}")
+            return
+        placeholder.empty()
+        
+        user_text = " ".join(texts).strip()
+        if not user_text:
+            st.error("音声を認識できませんでした。もう一度お試しください。")
+            return
+        
+        audio_path = None
+        if keeper and keeper.samples() is not None:
+            audio_path = get_audio_store().submit_recording(keeper.samples(), WHISPER_RATE)
+        self.process_text_input(user_text, None, audio_path)
+    
+    def speculative_generator(self):
+        """
+        Build the generate(text, cancel) callable used for speculation
+        
+        Runs on a worker thread, so everything it needs from
+        st.session_state is captured here.
+        """
+        llm = st.session_state.llm
+        memory = st.session_state.memory
+        long_term_memory = st.session_state.long_term_memory
+        session_id = st.session_state.current_session_id
+        
+        def generate(text, cancel):
+            conversation_history = memory.get_conversation_history(session_id)
+            long_term_context = None
+            if long_term_memory:
+                long_term_context = long_term_memory.retrieve(text, exclude_session=session_id)
+            return llm.generate_response(text, conversation_history, long_term_context,
+                                         session_id=session_id, cancel=cancel)
+        
+        return generate
+    
+    def process_text_input(self, user_text: str, bot_response: str = None, audio_path: str = None):
+        """
+        Process text input and generate response
+        
+        Args:
+            user_text: User input
+            bot_response: Reply already generated speculatively (optional)
+            audio_path: Audio store path of the user's recording (optional)
+        """
         try:
             if not user_text.strip():
                 return
             
-            # Generate response
-            with st.spinner("応答を生成中..."):
-                conversation_history = st.session_state.memory.get_conversation_history(
-                    st.session_state.current_session_id
-                )
-                
-                bot_response = st.session_state.llm.generate_response(
-                    user_text, 
-                    conversation_history
-                )
+            # Generate response (unless speculation already did)
+            if not bot_response:
+                with st.spinner("応答を生成中..."):
+                    conversation_history = st.session_state.memory.get_conversation_history(
+                        st.session_state.current_session_id
+                    )
+                    
+                    long_term_context = None
+                    if st.session_state.long_term_memory:
+                        long_term_context = st.session_state.long_term_memory.retrieve(
+                            user_text,
+                            exclude_session=st.session_state.current_session_id
+                        )
+                    
+                    bot_response = st.session_state.llm.generate_response(
+                        user_text, 
+                        conversation_history,
+                        long_term_context,
+                        session_id=st.session_state.current_session_id
+                    )
             
             if bot_response:
                 # Save to memory
                 st.session_state.memory.save_conversation(
                     st.session_state.current_session_id,
                     user_text,
-                    bot_response
+                    bot_response,
+                    audio_file_path=audio_path
                 )
+                if st.session_state.long_term_memory:
+                    st.session_state.long_term_memory.schedule()
                 
-                # Add to session conversation history
-                st.session_state.conversation_history.append({
-                    'user': user_text,
-                    'bot': bot_response,
-                    'timestamp': datetime.now()
-                })
+                # Add to session conversation history and show it right away
+                exchange = make_exchange(user_text, bot_response)
+                st.session_state.conversation_history.append(exchange)
+                self.chat_view.append(exchange)
                 
-                # Generate speech if available
-                if st.session_state.tts and st.session_state.tts.is_available():
+                # Generate speech if available (skipped in the text-only load tier)
+                if (st.session_state.tts and st.session_state.tts.is_available()
+                        and get_load_controller().current()['tts']):
                     with st.spinner("音声を生成中..."):
-                        success = st.session_state.tts.text_to_speech_play(bot_response)
+                        if Config.TTS_PLAYBACK == 'browser':
+                            success = self.play_in_browser(bot_response)
+                        else:
+                            success = st.session_state.tts.text_to_speech_play(bot_response)
                         if not success:
                             st.warning("音声再生に失敗しました。")
-                
-                # Rerun to show updated conversation
-                st.rerun()
+                        store = get_audio_store()
+                        reply_audio = store.reply_path(bot_response) if success and store else None
+                        if reply_audio:
+                            st.session_state.memory.set_reply_audio(
+                                st.session_state.current_session_id, bot_response, reply_audio
+                            )
                 
         except Exception as e:
             st.error(f"テキスト処理エラー: {e}")
 
+    def play_in_browser(self, text: str) -> bool:
+        """
+        Send the reply's speech to the browser instead of the server's speakers
+        
+        Streamlit cannot serve a chunked response, so the clip is encoded
+        whole; api_server.py streams it progressively (/tts/streams).
+        """
+        result = st.session_state.tts.synthesize(text)
+        if result is None:
+            return False
+        samples, sample_rate = result
+        store = get_audio_store()
+        if store:
+            store.submit_reply(text, samples, sample_rate)
+        data = encode_audio(samples, sample_rate)
+        mime = CONTENT_TYPES[Config.TTS_STREAM_FORMAT].split(';')[0]
+        try:
+            st.audio(data, format=mime, autoplay=True)
+        except TypeError:
+            st.audio(data, format=mime)  # Streamlit < 1.35 has no autoplay
+        return True
+
+@fragment
+def chat_panel(bot: SuperKamenBot):
+    """
+    Chat history and input controls
+    
+    Runs as a fragment: sending a message reruns only this panel (not the
+    sidebar stats and session queries), and the new exchange is appended
+    to the existing chat container instead of re-rendering the page.
+    """
+    # Chat history - Instagram/Skype style, oldest to newest like real chat
+    bot.chat_view.render(st.session_state.conversation_history)
+    
+    # Voice input (prominent)
+    if st.session_state.stt and st.session_state.stt.available:
+        col1, col2, col3 = st.columns([1, 2, 1])
+        with col2:
+            if st.button("� 音声で話す", type="primary", use_container_width=True):
+                with get_profiler().profile('voice_turn'):
+                    bot.process_voice_input(5)
+        
+        # Uploaded files and browser recordings (no server microphone needed)
+        with st.expander("📎 音声ファイル・ブラウザ録音"):
+            recorded = None
+            audio_input = getattr(st, 'audio_input', None)  # Streamlit >= 1.39
+            if audio_input:
+                recorded = audio_input("ブラウザで録音", key="browser_recording")
+            uploaded = st.file_uploader("音声ファイル", key="audio_upload",
+                                        type=["wav", "flac", "ogg", "opus", "mp3", "webm", "m4a"])
+            clip = uploaded or recorded
+            if clip is not None and st.button("文字起こしして送信", key="send_upload", use_container_width=True):
+                with get_profiler().profile('upload_turn'):
+                    bot.process_audio_upload(clip)
+    else:
+        st.info("💡 音声入力は利用できません。")
+    
+    # Text input toggle (centered button)
+    col1, col2, col3 = st.columns([2, 1, 2])
+    with col2:
+        if st.button("💬", help="テキスト入力を表示/非表示", use_container_width=True, key="text_toggle"):
+            st.session_state.show_text_input = not st.session_state.show_text_input
+    
+    # Text input (at bottom like WhatsApp/Discord)
+    if st.session_state.show_text_input:
+        with st.form("text_form", clear_on_submit=True):
+            col1, col2 = st.columns([4, 1])
+            with col1:
+                user_input = st.text_input("メッセージ", placeholder="メッセージを入力してください...", label_visibility="collapsed")
+            with col2:
+                send_clicked = st.form_submit_button("送信", use_container_width=True, type="primary")
+            
+            if send_clicked and user_input:
+                with get_profiler().profile('text_turn'):
+                    bot.process_text_input(user_input)
+
+def _live_fragment(func):
+    """Re-run `func` every PROFILING_PANEL_REFRESH seconds where Streamlit supports it"""
+    if hasattr(st, 'fragment'):
+        return st.fragment(run_every=Config.PROFILING_PANEL_REFRESH)(func)
+    return func
+
+@_live_fragment
+def resource_panel():
+    """Process resources, model memory and the latest turn profiles"""
+    profiler = get_profiler()
+    resources = profiler.resources()
+    st.subheader("リソース")
+    col1, col2 = st.columns(2)
+    col1.metric("RSS", f"{resources['rss'] / 2**20:.0f} MB")
+    col2.metric("CPU", f"{resources['cpu_percent']:.0f}%")
+    st.caption(f"CPU時間 {resources['cpu_seconds']:.1f}秒, スレッド {resources['threads']}, "
+               f"再実行 平均 {resources['avg_rerun'] * 1000:.0f}ms ({resources['reruns']}回)")
+    if resources['worker_rss']:
+        st.caption(f"推論ワーカー RSS {resources['worker_rss'] / 2**20:.0f} MB")
+    for name, size in resources['model_memory'].items():
+        st.caption(f"{name}: {size / 2**20:.0f} MB")
+    for model in st.session_state.llm.pool.running_models():
+        st.caption(f"Ollama {model['model']} ({model['host']}): {model['size'] / 2**20:.0f} MB")
+    for record in reversed(profiler.recent()[-3:]):
+        stages = ", ".join(f"{stage} {share:.0%}" for stage, share in list(record.get('stages', {}).items())[:3])
+        st.caption(f"{record['label']}: {record['wall']:.2f}秒 (CPU {record['cpu']:.2f}秒) {stages}")
+        if record.get('path'):
+            st.caption(f"`{record['path']}`")
+
 def main():
     """Main Streamlit application"""
     
@@ -252,81 +514,116 @@ def main():
         stats = st.session_state.memory.get_conversation_stats()
         st.metric("総会話数", stats['total_conversations'])
         st.metric("今日の会話数", stats['conversations_today'])
+        st.metric("平均応答文字数", f"{stats['avg_reply_length']:.0f}")
+        if Config.LLM_ROUTING_ENABLED:
+            routing = st.session_state.llm.router.stats()
+            if routing['turns']:
+                st.caption(f"モデル振り分け: 小型モデル {routing['small_share']:.0%}, "
+                           f"推定コスト削減 {routing['cost_saving']:.0%}, "
+                           f"短縮 {routing['latency_saved']:.1f}秒")
+        if Config.QUALITY_MONITOR_ENABLED:
+            quality = quality_stats()
+            if quality['aborts']:
+                st.caption(f"品質監視: 中断 {quality['aborts']}回 "
+                           f"({quality['abort_rate']:.0%}), 回復 {quality['recovered']}回")
+        if Config.LOAD_CONTROL_ENABLED:
+            load = get_load_controller().status()
+            if load['level']:
+                st.caption(f"負荷制御: 品質段階 {load['tier']} "
+                           f"(p90応答 {load['signals'].get('p90_latency', 0):.1f}秒)")
+        if Config.SPECULATIVE_GENERATION:
+            speculation = speculation_stats()
+            if speculation['turns']:
+                st.caption(f"先読み生成: 的中率 {speculation['hit_rate']:.0%} "
+                           f"({speculation['hits']}/{speculation['speculated']}), "
+                           f"平均 {speculation['avg_latency_saved']:.1f}秒短縮")
+        
+        if Config.PROFILING_ENABLED:
+            resource_panel()
         
         # Recent sessions
         st.subheader("最近のセッション")
-        sessions = st.session_state.memory.get_sessions(5)
-        for session_id, title, last_activity in sessions:
-            if st.button(f"📋 {title}", key=f"session_{session_id}"):
-                st.session_state.current_session_id = session_id
-                st.session_state.conversation_history = []
-                # Load conversation history for display
-                history = st.session_state.memory.get_conversation_history(session_id, 50)
-                display_history = []
-                for i in range(0, len(history), 2):
-                    if i + 1 < len(history):
-                        display_history.append({
-                            'user': history[i]['content'],
-                            'bot': history[i + 1]['content'],
-                            'timestamp': datetime.now()  # Placeholder
-                        })
-                st.session_state.conversation_history = display_history
-                st.success(f"セッション '{title}' を読み込みました")
+        browser = SessionBrowser(st.session_state.memory)
+        if 'session_page_cursors' not in st.session_state:
+            st.session_state.session_page_cursors = [None]
+        sessions, next_cursor = browser.page(st.session_state.session_page_cursors[-1])
+        for session in sessions:
+            session_id, title = session['session_id'], session['title']
+            last_activity = parse_db_timestamp(session['last_activity'])
+            col_open, col_preview = st.columns([5, 1])
+            with col_open:
+                if st.button(f"📋 {title} ({session['turns']})", key=f"session_{session_id}"):
+                    bot.load_session(session_id)
+                    st.success(f"セッション '{title}' を読み込みました")
+                    st.rerun()
+            with col_preview:
+                if st.button("👁", key=f"preview_{session_id}", help="プレビュー"):
+                    st.session_state.preview_session = (
+                        None if st.session_state.get('preview_session') == session_id else session_id
+                    )
+            if last_activity:
+                st.caption(last_activity.strftime('%Y-%m-%d %H:%M'))
+            # Preview is only queried for the session the user asked about
+            if st.session_state.get('preview_session') == session_id:
+                preview = browser.preview(session_id)
+                if preview:
+                    st.caption(f"👤 {preview['user_input']}")
+                    st.caption(f"🤖 {preview['bot_response']}")
+                else:
+                    st.caption("まだ会話がありません")
+        col_prev, col_next = st.columns(2)
+        with col_prev:
+            if len(st.session_state.session_page_cursors) > 1 and st.button("◀ 新しい", key="sessions_prev"):
+                st.session_state.session_page_cursors.pop()
+                st.rerun()
+        with col_next:
+            if next_cursor and st.button("古い ▶", key="sessions_next"):
+                st.session_state.session_page_cursors.append(next_cursor)
                 st.rerun()
-    
-    # Main content area - clean and minimal
-    
-    # Only show chat history if there are conversations (no empty containers)
-    if st.session_state.conversation_history:
-        # Chat history - Instagram/Skype style
-        st.markdown('<div class="chat-container">', unsafe_allow_html=True)
         
-        # Show messages in chronological order (oldest to newest like real chat)
-        for exchange in st.session_state.conversation_history[-10:]:  # Last 10 messages
-            # User message (right side like you send)
-            st.markdown(f"""
-            <div class="user-message">
-                {exchange['user']}
-            </div>
-            """, unsafe_allow_html=True)
-            
-            # Bot message (left side like you receive)
-            st.markdown(f"""
-            <div class="bot-message">
-                {exchange['bot']}
-            </div>
-            """, unsafe_allow_html=True)
+        # Archived sessions (restored when opened)
+        archived_sessions = st.session_state.memory.get_archived_sessions(5)
+        if archived_sessions:
+            with st.expander("アーカイブ済みのセッション"):
+                for session_id, title, last_activity, turn_count in archived_sessions:
+                    if st.button(f"🗄️ {title} ({turn_count})", key=f"archived_{session_id}"):
+                        bot.load_session(session_id)
+                        st.success(f"セッション '{title}' を復元しました")
+                        st.rerun()
         
-        st.markdown('</div>', unsafe_allow_html=True)
-        st.markdown("---")
-    
-    # Voice input (prominent)
-    if st.session_state.stt and st.session_state.stt.available:
-        col1, col2, col3 = st.columns([1, 2, 1])
-        with col2:
-            if st.button("� 音声で話す", type="primary", use_container_width=True):
-                bot.process_voice_input(5)
-    else:
-        st.info("💡 音声入力は利用できません。")
+        # Conversation search
+        st.subheader("会話を検索")
+        query = st.text_input("検索", placeholder="キーワードを入力...", label_visibility="collapsed", key="search_query")
+        if query != st.session_state.get('search_last_query'):
+            st.session_state.search_last_query = query
+            st.session_state.search_page = 0
+        if query.strip():
+            page = st.session_state.get('search_page', 0)
+            page_size = 5
+            # Fetch one extra row to know whether a next page exists
+            results = st.session_state.memory.search_conversations(
+                query, limit=page_size + 1, offset=page * page_size
+            )
+            if not results:
+                st.caption("一致する会話はありません")
+            for result in results[:page_size]:
+                st.caption(f"{result['title'] or result['session_id']} · {result['timestamp']}")
+                st.markdown(result['snippet'])
+                if st.button("開く", key=f"search_open_{result['id']}"):
+                    bot.load_session(result['session_id'])
+                    st.rerun()
+            col_prev, col_next = st.columns(2)
+            with col_prev:
+                if page > 0 and st.button("◀ 前へ", key="search_prev"):
+                    st.session_state.search_page = page - 1
+                    st.rerun()
+            with col_next:
+                if len(results) > page_size and st.button("次へ ▶", key="search_next"):
+                    st.session_state.search_page = page + 1
+                    st.rerun()
     
-    # Text input toggle (centered button)
-    col1, col2, col3 = st.columns([2, 1, 2])
-    with col2:
-        if st.button("💬", help="テキスト入力を表示/非表示", use_container_width=True, key="text_toggle"):
-            st.session_state.show_text_input = not st.session_state.show_text_input
-    
-    # Text input (at bottom like WhatsApp/Discord)
-    if st.session_state.show_text_input:
-        with st.form("text_form", clear_on_submit=True):
-            col1, col2 = st.columns([4, 1])
-            with col1:
-                user_input = st.text_input("メッセージ", placeholder="メッセージを入力してください...", label_visibility="collapsed")
-            with col2:
-                send_clicked = st.form_submit_button("送信", use_container_width=True, type="primary")
-            
-            if send_clicked and user_input:
-                bot.process_text_input(user_input)
-                st.rerun()
+    # Main content area - clean and minimal
+    chat_panel(bot)
     
     # Footer (only show if there are conversations)
     if st.session_state.conversation_history:
@@ -337,4 +634,9 @@ def main():
         )
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    started = time.perf_counter()
+    try:
+        main()
+    finally:
+        # Also runs when st.rerun() interrupts the script
+        get_profiler().record_rerun(time.perf_counter() - started)
\ No newline at end of file
@@ -0,0 +1,55 @@
+#!/usr/bin/env python3
+"""
+Archive idle sessions and compact the conversation database
+
+Run from the project root, e.g. daily from cron / Task Scheduler:
+    python scripts/archive_sessions.py --idle-days 30
+"""
+
+import argparse
+import os
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.extend([ROOT, os.path.join(ROOT, 'components')])
+
+from memory_manager import MemoryManager
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Archive idle Super Kamen Bot sessions")
+    parser.add_argument("--idle-days", type=int, default=None, help="Idle threshold in days (default: Config.ARCHIVE_IDLE_DAYS)")
+    parser.add_argument("--limit", type=int, default=None, help="Maximum sessions to archive in this run")
+    parser.add_argument("--vacuum-only", action="store_true", help="Only run incremental vacuum")
+    parser.add_argument("--restore", metavar="SESSION_ID", help="Restore one archived session")
+    parser.add_argument("--list", action="store_true", help="List archived sessions")
+    args = parser.parse_args()
+
+    memory = MemoryManager()
+    archive = memory.archive
+
+    if args.list:
+        print("🗄️ Archived sessions:")
+        for session_id, title, last_activity, turn_count in archive.list_archived(limit=100):
+            print(f"  {session_id}  {last_activity}  {turn_count:4d} turns  {title}")
+        return
+
+    if args.restore:
+        if archive.rehydrate(args.restore):
+            print(f"✅ Restored {args.restore}")
+        else:
+            print(f"❌ Could not restore {args.restore}")
+        return
+
+    if args.vacuum_only:
+        result = archive.incremental_vacuum()
+        print(f"🧹 Free pages: {result['free_pages_before']} -> {result['free_pages_after']}")
+        return
+
+    # Vacuums after archiving anything
+    archived = archive.archive_idle_sessions(args.idle_days, args.limit)
+    print(f"✅ Archived {archived} sessions")
+
+
+if __name__ == "__main__":
+    main()
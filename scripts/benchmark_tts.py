@@ -0,0 +1,113 @@
+#!/usr/bin/env python3
+"""
+Compare TTS real-time factor (RTF) on the PyTorch and ONNX Runtime backends
+
+RTF = synthesis seconds / audio seconds (below 1.0 is faster than real time).
+Run from the project root:
+    python scripts/benchmark_tts.py --runs 3 --threads 4 --optimization all
+"""
+
+import argparse
+import os
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.extend([ROOT, os.path.join(ROOT, 'components')])
+
+import numpy as np
+
+from config import Config
+
+SENTENCES = [
+    "こんにちは。",
+    "今日はとても良い天気ですね。",
+    "東京の人口は約千四百万人です。",
+    "ご質問ありがとうございます。詳しく説明いたします。",
+    "申し訳ございませんが、もう一度お試しください。",
+]
+
+
+def measure(tts, sentences, runs):
+    """
+    Synthesize every sentence `runs` times after one warm-up pass
+
+    Returns:
+        Tuple (synthesis seconds, audio seconds)
+    """
+    for sentence in sentences:
+        tts.synthesize(sentence)
+    synthesis = audio = 0.0
+    for _ in range(runs):
+        for sentence in sentences:
+            started = time.perf_counter()
+            samples, sample_rate = tts.synthesize(sentence)
+            synthesis += time.perf_counter() - started
+            audio += len(samples) / sample_rate
+    return synthesis, audio
+
+
+def vocoder_difference(synthesizer, onnx_vocoder) -> float:
+    """Largest sample difference between the two vocoders on the same spectrogram"""
+    import torch
+
+    n_mels = synthesizer.vocoder_config['audio']['num_mels']
+    mel = torch.randn(1, n_mels, 200)
+    with torch.no_grad():
+        expected = synthesizer.torch_vocoder_model.inference(mel).squeeze().numpy()
+    actual = onnx_vocoder.inference(mel).squeeze().numpy()
+    return float(np.max(np.abs(expected - actual)))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark PyTorch vs ONNX Runtime TTS")
+    parser.add_argument("--runs", type=int, default=3, help="Measured passes over the sentences")
+    parser.add_argument("--threads", type=int, default=Config.TTS_ONNX_INTRA_THREADS,
+                        help="Intra-op threads for both backends")
+    parser.add_argument("--optimization", default=Config.TTS_ONNX_GRAPH_OPTIMIZATION,
+                        choices=["disable", "basic", "extended", "all"], help="ONNX graph optimization level")
+    parser.add_argument("--sentences", help="Text file with one sentence per line")
+    args = parser.parse_args()
+
+    sentences = SENTENCES
+    if args.sentences:
+        with open(args.sentences, encoding='utf-8') as f:
+            sentences = [line.strip() for line in f if line.strip()]
+
+    import torch
+    torch.set_num_threads(args.threads)
+    Config.TTS_BACKEND = 'pytorch'
+    Config.TTS_ONNX_INTRA_THREADS = args.threads
+    Config.TTS_ONNX_GRAPH_OPTIMIZATION = args.optimization
+
+    from text_to_speach import TextToSpeech
+    from tts_onnx import disable_onnx, enable_onnx
+
+    tts = TextToSpeech()
+    if not tts.is_available():
+        print("❌ TTS model not available")
+        return
+
+    results = {}
+    print(f"🎙️ {len(sentences)} sentences x {args.runs} runs, {args.threads} threads")
+    results['pytorch'] = measure(tts, sentences, args.runs)
+
+    onnx_vocoder = enable_onnx(tts.tts)
+    if onnx_vocoder is None:
+        print("❌ ONNX backend unavailable, only PyTorch measured")
+    else:
+        results['onnx'] = measure(tts, sentences, args.runs)
+        print(f"Max vocoder sample difference (ONNX vs PyTorch): "
+              f"{vocoder_difference(tts.tts.synthesizer, onnx_vocoder):.2e}")
+        disable_onnx(tts.tts)
+
+    print(f"{'backend':<10} {'synthesis s':>12} {'audio s':>10} {'RTF':>8}")
+    for backend, (synthesis, audio) in results.items():
+        print(f"{backend:<10} {synthesis:>12.2f} {audio:>10.2f} {synthesis / audio:>8.3f}")
+    if len(results) == 2:
+        speedup = (results['pytorch'][0] / results['pytorch'][1]) / (results['onnx'][0] / results['onnx'][1])
+        print(f"⚡ ONNX speedup: {speedup:.2f}x")
+
+
+if __name__ == "__main__":
+    main()
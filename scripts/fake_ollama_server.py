@@ -0,0 +1,113 @@
+#!/usr/bin/env python3
+"""
+Minimal stand-in for an Ollama server, for exercising the backend pool
+and the API without GPUs
+
+Start two of them and point the bot at both:
+    python scripts/fake_ollama_server.py --port 11501 &
+    python scripts/fake_ollama_server.py --port 11502 --delay 0.2 &
+    OLLAMA_HOSTS=http://localhost:11501,http://localhost:11502 python api_server.py
+"""
+
+import argparse
+import asyncio
+import hashlib
+import json
+
+from aiohttp import web
+
+REPLY = "こんにちは！今日はいい天気ですね。何かお手伝いしましょうか？"
+
+
+def fake_embedding(text: str, dim: int = 64):
+    """Deterministic pseudo-embedding derived from the text hash"""
+    digest = hashlib.sha256(text.encode('utf-8')).digest()
+    return [(digest[i % len(digest)] - 128) / 128.0 for i in range(dim)]
+
+
+def tagged(name: str) -> str:
+    """Model name as Ollama reports it (untagged means ":latest")"""
+    return name if ':' in name.rsplit('/', 1)[-1] else f"{name}:latest"
+
+
+def create_app(models, delay: float) -> web.Application:
+    models = {tagged(name) for name in models}
+
+    def missing(name):
+        if tagged(name or '') not in models:
+            return web.json_response({'error': f"model '{name}' not found, try pulling it first"}, status=404)
+        return None
+
+    async def tags(request):
+        return web.json_response({'models': [{'name': name, 'model': name} for name in sorted(models)]})
+
+    async def chat(request):
+        body = await request.json()
+        error = missing(body.get('model'))
+        if error:
+            return error
+
+        if not body.get('stream', True):
+            await asyncio.sleep(delay * len(REPLY) / 4)
+            return web.json_response({'model': body['model'], 'done': True,
+                                      'message': {'role': 'assistant', 'content': REPLY}})
+
+        response = web.StreamResponse(headers={'Content-Type': 'application/x-ndjson'})
+        await response.prepare(request)
+        for i in range(0, len(REPLY), 4):
+            await asyncio.sleep(delay)
+            chunk = {'model': body['model'], 'done': False,
+                     'message': {'role': 'assistant', 'content': REPLY[i:i + 4]}}
+            await response.write((json.dumps(chunk) + '\n').encode('utf-8'))
+        done = {'model': body['model'], 'done': True, 'message': {'role': 'assistant', 'content': ''}}
+        await response.write((json.dumps(done) + '\n').encode('utf-8'))
+        await response.write_eof()
+        return response
+
+    async def embed(request):
+        body = await request.json()
+        error = missing(body.get('model'))
+        if error:
+            return error
+        texts = body.get('input') or []
+        if isinstance(texts, str):
+            texts = [texts]
+        return web.json_response({'model': body.get('model'),
+                                  'embeddings': [fake_embedding(text) for text in texts]})
+
+    async def pull(request):
+        body = await request.json()
+        models.add(tagged(body.get('model') or body.get('name')))
+        if not body.get('stream', True):
+            return web.json_response({'status': 'success'})
+        response = web.StreamResponse(headers={'Content-Type': 'application/x-ndjson'})
+        await response.prepare(request)
+        for completed in (0, 50, 100):
+            await asyncio.sleep(delay)
+            status = {'status': 'pulling', 'total': 100, 'completed': completed}
+            await response.write((json.dumps(status) + '\n').encode('utf-8'))
+        await response.write(b'{"status": "success"}\n')
+        await response.write_eof()
+        return response
+
+    app = web.Application()
+    app.router.add_get('/api/tags', tags)
+    app.router.add_post('/api/chat', chat)
+    app.router.add_post('/api/embed', embed)
+    app.router.add_post('/api/pull', pull)
+    return app
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Fake Ollama server for testing")
+    parser.add_argument("--port", type=int, default=11501)
+    parser.add_argument("--delay", type=float, default=0.05, help="Seconds per streamed chunk")
+    parser.add_argument("--models", default="kangyufei/llama2:japanese,nomic-embed-text",
+                        help="Comma-separated models reported as installed")
+    args = parser.parse_args()
+
+    web.run_app(create_app(args.models.split(','), args.delay), port=args.port)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,91 @@
+#!/usr/bin/env python3
+"""
+Load test the API server
+
+Start the server first (python api_server.py), then e.g.:
+    python scripts/load_test_api.py --clients 20 --requests 5 --mode ws
+"""
+
+import argparse
+import asyncio
+import statistics
+import time
+
+import aiohttp
+
+PROMPTS = [
+    "こんにちは",
+    "今日の天気はどうですか？",
+    "日本のおすすめの観光地を教えてください。",
+    "お寿司の種類について説明してください。",
+]
+
+
+async def run_client(session: aiohttp.ClientSession, base_url: str, mode: str,
+                     requests: int, results: dict):
+    """One simulated user sending requests back to back in its own session"""
+    async with session.post(f"{base_url}/sessions") as response:
+        session_id = (await response.json())['session_id']
+
+    for i in range(requests):
+        text = PROMPTS[i % len(PROMPTS)]
+        start = time.perf_counter()
+        try:
+            if mode == "ws":
+                async with session.ws_connect(f"{base_url}/ws/chat") as ws:
+                    await ws.send_json({'type': 'chat', 'session_id': session_id, 'text': text})
+                    first_token = None
+                    async for message in ws:
+                        payload = message.json()
+                        if payload['type'] == 'token' and first_token is None:
+                            first_token = time.perf_counter() - start
+                        elif payload['type'] in ('done', 'error'):
+                            break
+                    if first_token is not None:
+                        results['first_token'].append(first_token)
+            else:
+                async with session.post(f"{base_url}/chat",
+                                        json={'session_id': session_id, 'text': text}) as response:
+                    response.raise_for_status()
+                    await response.json()
+            results['latency'].append(time.perf_counter() - start)
+        except Exception as e:
+            results['errors'] += 1
+            print(f"❌ Request failed: {e}")
+
+
+def percentile(values, fraction):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="Load test the Super Kamen Bot API")
+    parser.add_argument("--url", default="http://localhost:8600")
+    parser.add_argument("--clients", type=int, default=10)
+    parser.add_argument("--requests", type=int, default=3, help="Requests per client")
+    parser.add_argument("--mode", choices=["http", "ws"], default="http")
+    args = parser.parse_args()
+
+    results = {'latency': [], 'first_token': [], 'errors': 0}
+    start = time.perf_counter()
+    async with aiohttp.ClientSession(timeout=aiohttp.ClientTimeout(total=600)) as session:
+        await asyncio.gather(*(
+            run_client(session, args.url, args.mode, args.requests, results)
+            for _ in range(args.clients)
+        ))
+    elapsed = time.perf_counter() - start
+
+    latencies = results['latency']
+    print(f"\n📊 {len(latencies)} ok, {results['errors']} errors in {elapsed:.1f}s "
+          f"({len(latencies) / elapsed:.2f} req/s)")
+    if latencies:
+        print(f"  latency  p50 {percentile(latencies, 0.5):.2f}s  p95 {percentile(latencies, 0.95):.2f}s  "
+              f"mean {statistics.mean(latencies):.2f}s")
+    if results['first_token']:
+        first = results['first_token']
+        print(f"  first token  p50 {percentile(first, 0.5):.2f}s  p95 {percentile(first, 0.95):.2f}s")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
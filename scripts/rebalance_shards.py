@@ -0,0 +1,87 @@
+#!/usr/bin/env python3
+"""
+Move sessions onto their placement shard after changing DATABASE_SHARDS
+
+Safe to run while the bot is serving; sessions are moved one at a time.
+Run from the project root:
+    DATABASE_SHARDS=4 python scripts/rebalance_shards.py --status
+    DATABASE_SHARDS=4 python scripts/rebalance_shards.py --dry-run
+    DATABASE_SHARDS=4 python scripts/rebalance_shards.py --limit 1000
+"""
+
+import argparse
+import os
+import sqlite3
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.extend([ROOT, os.path.join(ROOT, 'components')])
+
+from memory_manager import MemoryManager
+
+
+def make_progress(label: str):
+    """Progress printer that rewrites a single console line"""
+    start = time.time()
+
+    def progress(checked, moved):
+        elapsed = max(time.time() - start, 1e-6)
+        print(f"\r{label}: {moved} moved, {checked} checked ({moved / elapsed:,.1f} sessions/s)",
+              end="", flush=True)
+
+    return progress
+
+
+def print_status(memory: MemoryManager):
+    shards = memory.shards
+    catalogued = shards.catalog_counts()
+    print(f"🗂️ {shards.count} shard(s), catalog: {shards.catalog_path if shards.sharded else 'not used'}")
+    for index, path in enumerate(shards.paths):
+        if not os.path.exists(path):
+            continue
+        with sqlite3.connect(path) as conn:
+            sessions = conn.execute('SELECT COUNT(*) FROM sessions').fetchone()[0]
+            turns = conn.execute('SELECT total_conversations FROM stats_totals WHERE id = 1').fetchone()
+        retired = " (retired, drain with rebalance)" if index >= shards.count else ""
+        print(f"  [{index}] {path}: {sessions} sessions, {turns[0] if turns else 0} turns, "
+              f"{catalogued.get(index, 0)} catalogued{retired}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Rebalance Super Kamen Bot conversation shards")
+    parser.add_argument("--limit", type=int, default=None, help="Stop after moving this many sessions")
+    parser.add_argument("--dry-run", action="store_true", help="Only count sessions that would move")
+    parser.add_argument("--status", action="store_true", help="Show sessions and turns per shard")
+    args = parser.parse_args()
+
+    # Creates missing shard files and the catalog
+    memory = MemoryManager()
+    if args.status:
+        print_status(memory)
+        return
+    if not memory.shards.sharded:
+        print("💡 DATABASE_SHARDS is 1; set it above 1 to spread sessions over several files")
+        return
+
+    try:
+        result = memory.shards.rebalance(args.limit, args.dry_run, make_progress("🔀 Rebalancing"))
+    except KeyboardInterrupt:
+        print("\n⏸️ Interrupted; moves already made are complete, run again to continue")
+        return
+
+    print()
+    if args.dry_run:
+        print(f"🔍 {result['misplaced']} of {result['checked']} sessions would move")
+    else:
+        print(f"✅ Moved {result['moved']} of {result['misplaced']} misplaced sessions "
+              f"({result['checked']} checked)")
+        if result['moved'] < result['misplaced']:
+            print("⏸️ Stopped at the limit; run again to continue")
+    if result['duplicates_removed'] or result['catalog_fixed']:
+        print(f"🧹 {result['duplicates_removed']} leftover copies removed, "
+              f"{result['catalog_fixed']} catalog entries fixed")
+
+
+if __name__ == "__main__":
+    main()
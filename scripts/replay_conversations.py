@@ -0,0 +1,114 @@
+#!/usr/bin/env python3
+"""
+Regenerate stored conversation turns with another model and compare
+
+Results go to data/replay.db; the conversation database is only read.
+Run from the project root:
+    python scripts/replay_conversations.py run --model qwen2.5:7b
+    python scripts/replay_conversations.py resume replay_20250901_120000_ab12cd
+    python scripts/replay_conversations.py summary replay_20250901_120000_ab12cd
+    python scripts/replay_conversations.py list
+"""
+
+import argparse
+import os
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.extend([ROOT, os.path.join(ROOT, 'components')])
+
+from config import Config
+from batch_replay import BatchReplay
+from ollama_pool import NoBackendAvailable
+
+
+def make_progress(label: str):
+    """Progress printer that rewrites a single console line"""
+    start = time.time()
+
+    def progress(done, total):
+        elapsed = max(time.time() - start, 1e-6)
+        if total:
+            print(f"\r{label}: {done}/{total} ({done * 100 // total}%) {done / elapsed:,.1f} turns/s",
+                  end="", flush=True)
+        else:
+            print(f"\r{label}: {done} {done / elapsed:,.1f} turns/s", end="", flush=True)
+
+    return progress
+
+
+def print_summary(replay: BatchReplay, run_id: str):
+    summary = replay.summary(run_id)
+    if not summary:
+        print(f"❌ Unknown run {run_id}")
+        return
+    state = "finished" if summary['finished'] else "incomplete"
+    print(f"📊 {run_id} ({summary['model']}, {state})")
+    print(f"  Turns:       {summary['turns']} ({summary['failed']} failed) in {summary['elapsed']:.0f}s, "
+          f"{summary['turns_per_second']:.2f} turns/s")
+    print(f"  Latency:     avg {summary['avg_latency']:.2f}s, p50 {summary['p50_latency']:.2f}s, "
+          f"p95 {summary['p95_latency']:.2f}s")
+    print(f"  Generation:  {summary['tokens_per_second']:.1f} tokens/s")
+    print(f"  Changed:     {summary['changed']} replies differ from the original")
+    print(f"  Fallbacks:   {summary['fallback_original']} original -> {summary['fallback_replay']} replay")
+    print(f"  Avg length:  {summary['avg_original_length']:.0f} -> {summary['avg_replay_length']:.0f} chars")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Batch replay of Super Kamen Bot conversations")
+    parser.add_argument("command", choices=["run", "resume", "summary", "list"])
+    parser.add_argument("run_id", nargs="?", help="Run to resume or summarize")
+    parser.add_argument("--model", default=Config.LLM_MODEL, help="Model to replay with (run)")
+    parser.add_argument("--temperature", type=float, default=None, help="Sampling temperature (run)")
+    parser.add_argument("--seed", type=int, default=None, help="Sampling seed for reproducible runs (run)")
+    parser.add_argument("--history-turns", type=int, default=None, help="Earlier turns in each prompt (run)")
+    parser.add_argument("--concurrency", type=int, default=None,
+                        help="Generations in flight (default: healthy hosts x REPLAY_PARALLEL_PER_BACKEND)")
+    parser.add_argument("--limit", type=int, default=None, help="Stop after this many turns (resume later)")
+    parser.add_argument("--db", default=None, help="Results database (default: Config.REPLAY_DATABASE_PATH)")
+    args = parser.parse_args()
+
+    replay = BatchReplay(replay_db_path=args.db)
+
+    if args.command == "list":
+        print("🔁 Replay runs:")
+        for run_id, model, done, failed, finished, updated_at in replay.list_runs():
+            state = "finished" if finished else "incomplete"
+            print(f"  {run_id}  {model:<30} {done:6d} turns {failed:4d} failed  {state:<10} {updated_at}")
+        return
+
+    if args.command == "summary":
+        if not args.run_id:
+            parser.error("summary needs a run_id")
+        print_summary(replay, args.run_id)
+        return
+
+    if args.command == "run":
+        run_id = replay.create_run(args.model, args.temperature, args.seed, args.history_turns)
+        print(f"🆕 Run {run_id}")
+    else:
+        if not args.run_id:
+            parser.error("resume needs a run_id")
+        run_id = args.run_id
+
+    try:
+        result = replay.run(run_id, args.concurrency, args.limit, make_progress("🔁 Replaying"))
+    except KeyboardInterrupt:
+        print(f"\n⏸️ Interrupted; continue with: python scripts/replay_conversations.py resume {run_id}")
+        return
+    except NoBackendAvailable as e:
+        print(f"\n❌ {e}; continue later with: python scripts/replay_conversations.py resume {run_id}")
+        sys.exit(1)
+    except ValueError as e:
+        print(f"\n❌ {e}")
+        sys.exit(1)
+
+    print()
+    if not result['finished']:
+        print(f"⏸️ Stopped at the limit; continue with: python scripts/replay_conversations.py resume {run_id}")
+    print_summary(replay, run_id)
+
+
+if __name__ == "__main__":
+    main()
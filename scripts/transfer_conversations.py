@@ -0,0 +1,68 @@
+#!/usr/bin/env python3
+"""
+Export or import conversations in bulk
+
+Run from the project root:
+    python scripts/transfer_conversations.py export backup.jsonl.gz
+    python scripts/transfer_conversations.py export backup.parquet
+    python scripts/transfer_conversations.py import backup.jsonl.gz
+"""
+
+import argparse
+import os
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.extend([ROOT, os.path.join(ROOT, 'components')])
+
+from memory_manager import MemoryManager
+from conversation_transfer import ConversationTransfer
+
+
+def make_progress(label: str):
+    """Progress printer that rewrites a single console line"""
+    start = time.time()
+
+    def progress(done, total):
+        elapsed = max(time.time() - start, 1e-6)
+        rate = done / elapsed
+        if total:
+            print(f"\r{label}: {done}/{total} ({done * 100 // total}%) {rate:,.0f} rows/s", end="", flush=True)
+        else:
+            print(f"\r{label}: {done} {rate:,.0f} rows/s", end="", flush=True)
+
+    return progress
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Bulk export/import of Super Kamen Bot conversations")
+    parser.add_argument("command", choices=["export", "import"])
+    parser.add_argument("path", help="File (.jsonl, .jsonl.gz or .parquet)")
+    parser.add_argument("--batch-size", type=int, default=None, help="Rows per batch")
+    parser.add_argument("--keep-ids", action="store_true", help="Preserve turn ids on import")
+    args = parser.parse_args()
+
+    # Ensure schema (and statistics used for progress totals) exist
+    memory = MemoryManager()
+    transfer = ConversationTransfer(memory.shards, args.batch_size)
+
+    try:
+        if args.command == "export":
+            progress = make_progress("📤 Exporting")
+            if args.path.endswith(".parquet"):
+                count = transfer.export_parquet(args.path, progress)
+            else:
+                count = transfer.export_jsonl(args.path, progress)
+            print(f"\n✅ Exported {count} turns to {args.path}")
+        else:
+            progress = make_progress("📥 Importing")
+            count = transfer.import_file(args.path, keep_ids=args.keep_ids, progress=progress)
+            print(f"\n✅ Imported {count} turns from {args.path}")
+    except Exception as e:
+        print(f"\n❌ Transfer failed: {e}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()